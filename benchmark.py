@@ -0,0 +1,1172 @@
+"""Performance benchmarks for the banking system
+
+Usage: python benchmark.py <benchmark> [count]
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Benchmarks build their own stores, keep the module-level one out of the working directory
+os.environ.setdefault('BANK_DB', ':memory:')
+# and hash passwords cheaply, except where the passwords benchmark sets the cost itself
+os.environ.setdefault('BANK_HASH_ITERATIONS', '1000')
+
+from data_storage import DEFAULT_ACCOUNTS, PersistentDict, open_connection
+import money
+
+
+def make_account(i):
+    """Build a synthetic account record for account number i"""
+    account = dict(DEFAULT_ACCOUNTS["999999"])
+    account['name'] = 'User' + str(i)
+    account['phone_no'] = str(9000000000 + i)
+    account['special_code'] = str(100000 + i % 900000)
+    account['branch_id'] = 'BR' + str(1000 + i % 9000)
+    account['balance'] = 100000
+    account['loans'] = {}
+    return account
+
+
+def make_loan(rng, today=(2026, 10)):
+    """Build a synthetic loan record started within the last year"""
+    import services
+    plan_name, interval_months = services.PAYMENT_PLANS[rng.choice(list(services.PAYMENT_PLANS))]
+    total_installments = services.PLAN_INSTALLMENTS[interval_months]
+    principal = rng.randint(1000, 100000) * money.CENTS_PER_DOLLAR
+    total_payable = principal + money.apply_rate(principal, services.INTEREST_RATE)
+    installments_paid = rng.randint(0, total_installments - 1)
+    paid_amount = total_payable * installments_paid // total_installments
+    months_ago = rng.randint(0, 11)
+    year, month = divmod(today[0] * 12 + today[1] - 1 - months_ago, 12)
+    return {
+        'principal': principal,
+        'interest_rate': services.INTEREST_RATE,
+        'interest_amount': total_payable - principal,
+        'total_payable': total_payable,
+        'paid_amount': paid_amount,
+        'remaining_amount': total_payable - paid_amount,
+        'payment_plan': plan_name,
+        'installment_interval_months': interval_months,
+        'suggested_installment': money.installment(total_payable, total_installments),
+        'total_installments': total_installments,
+        'installments_paid': installments_paid,
+        'start_date': str(rng.randint(1, 28)).zfill(2) + "/" + str(month + 1).zfill(2) + "/" + str(year),
+        'last_payment_date': None
+    }
+
+
+def make_loan_book(count, seed=42):
+    """Build count synthetic (loan_type, loan) pairs"""
+    import services
+    rng = random.Random(seed)
+    loan_types = list(services.LOAN_TYPES.values())
+    return [(rng.choice(loan_types), make_loan(rng)) for i in range(count)]
+
+
+def populate_accounts(conn, count):
+    """Insert count synthetic accounts (addresses 1000000 upwards) straight into the accounts table"""
+    rows = ((str(1000000 + i), json.dumps(make_account(i))) for i in range(count))
+    with conn:
+        conn.executemany("INSERT OR REPLACE INTO accounts (key, value) VALUES (?, ?)", rows)
+
+
+def populate_store(path, count):
+    """Create a SQLite account store holding count synthetic accounts"""
+    conn = open_connection(path)
+    store = PersistentDict(conn, 'accounts')
+    populate_accounts(conn, count)
+    return store
+
+
+def report(name, ops, elapsed):
+    """Print one benchmark result line"""
+    print(name + ": " + str(ops) + " ops in " + str(round(elapsed, 3)) + "s (" +
+          str(int(ops / elapsed)) + " ops/sec)")
+
+
+def bench_storage(count=1000000, ops=100000):
+    """Sustained deposits/withdrawals against a persistent store of count accounts"""
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        store = populate_store(os.path.join(tmp, 'bench.db'), count)
+        report("populate " + str(count) + " accounts", count, time.perf_counter() - start)
+
+        rng = random.Random(42)
+        start = time.perf_counter()
+        for i in range(ops):
+            acc_address = str(1000000 + rng.randrange(count))
+            account = store[acc_address]
+            if i % 2 == 0:
+                account['balance'] += 1000
+            elif account['balance'] >= 1000:
+                account['balance'] -= 1000
+            store.save(acc_address)
+        report("deposit/withdraw", ops, time.perf_counter() - start)
+
+
+def bench_indexes(count=1000000, ops=10000):
+    """Signup-style duplicate detection and linked-account lookups at count accounts"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = populate_store(os.path.join(tmp, 'bench.db'), count)
+        start = time.perf_counter()
+        store.add_index('identity', ('name', 'dob', 'home_address', 'phone_no', 'gender'))
+        store.add_index('special_code', ('special_code',))
+        report("build indexes", count, time.perf_counter() - start)
+
+        rng = random.Random(42)
+        start = time.perf_counter()
+        for i in range(ops):
+            account = make_account(rng.randrange(count))
+            store.find('identity', (account['name'], account['dob'], account['home_address'],
+                                    account['phone_no'], account['gender']))
+        report("find matching account", ops, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for i in range(ops):
+            store.find('special_code', (str(100000 + rng.randrange(900000)),))
+        report("find linked accounts", ops, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for i in range(ops):
+            store[str(5000000 + i)] = make_account(count + i)
+        report("create account with indexes", ops, time.perf_counter() - start)
+
+
+def bench_services(count=10000, ops=100000):
+    """Headless service calls (signups, logins, deposits, withdrawals) per second"""
+    import services
+
+    start = time.perf_counter()
+    addresses = []
+    for i in range(count):
+        success, (acc_address, special_code) = services.create_account(
+            'User' + str(i), '01/01/2000', 'Bench Street 1', 'India', str(9000000000 + i), 'Male', 'bench1234')
+        addresses.append((acc_address, special_code, 'User' + str(i)))
+    report("create_account", count, time.perf_counter() - start)
+
+    rng = random.Random(42)
+    start = time.perf_counter()
+    for i in range(ops):
+        acc_address, special_code, name = rng.choice(addresses)
+        if i % 10 == 0:
+            services.login(name, special_code, acc_address, 'bench1234')
+        elif i % 2 == 0:
+            services.deposit(acc_address, 1000)
+        else:
+            services.withdraw(acc_address, 500)
+    report("login/deposit/withdraw", ops, time.perf_counter() - start)
+
+
+def percentile(sorted_values, fraction):
+    """Return the value at a fraction (0-1) of a sorted list"""
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def report_latencies(name, latencies, elapsed):
+    """Print throughput and p50/p99 latency for a list of per-op latencies in seconds"""
+    latencies.sort()
+    report(name, len(latencies), elapsed)
+    print("  p50: " + str(round(percentile(latencies, 0.50) * 1000, 3)) + "ms" +
+          "  p99: " + str(round(percentile(latencies, 0.99) * 1000, 3)) + "ms")
+
+
+def bench_server(clients=1000, ops=20):
+    """Load generator: many concurrent sessions against the asyncio server"""
+    import asyncio
+    import server
+    import services
+
+    users = []
+    for i in range(clients):
+        success, (acc_address, special_code) = services.create_account(
+            'User' + str(i), '01/01/2000', 'Bench Street 1', 'India', str(9000000000 + i), 'Male', 'bench1234')
+        users.append(('User' + str(i), special_code, acc_address))
+
+    async def run_session(port, user, latencies, rng):
+        client = await server.open_client(port)
+        name, special_code, acc_address = user
+        await server.send_request(client, 'login', name=name, special_code=special_code,
+                                  acc_address=acc_address, password='bench1234')
+        for i in range(ops):
+            op = rng.choice(('deposit', 'withdraw', 'balance'))
+            start = time.perf_counter()
+            if op == 'balance':
+                await server.send_request(client, op)
+            else:
+                await server.send_request(client, op, amount=1000)
+            latencies.append(time.perf_counter() - start)
+        client[1].close()
+
+    async def run():
+        srv = await server.start_server(0)
+        port = srv.sockets[0].getsockname()[1]
+        rng = random.Random(42)
+        latencies = []
+        start = time.perf_counter()
+        await asyncio.gather(*[run_session(port, user, latencies, rng) for user in users])
+        elapsed = time.perf_counter() - start
+        srv.close()
+        await srv.wait_closed()
+        report_latencies("server " + str(clients) + " sessions", latencies, elapsed)
+
+    asyncio.run(run())
+
+
+def bench_stress(threads=16, ops=5000, count=50):
+    """Concurrent deposits, withdrawals and repayments; checks that no money is created or lost"""
+    import threading
+    import services
+
+    addresses = []
+    for i in range(count):
+        success, (acc_address, special_code) = services.create_account(
+            'User' + str(i), '01/01/2000', 'Bench Street 1', 'India', str(9000000000 + i), 'Male', 'bench1234')
+        # Enough balance for the credit score to approve the loan
+        services.deposit(acc_address, 5000000)
+        services.apply_loan(acc_address, 10000000, 'Car Loan', 'Monthly', special_code, 'bench1234')
+        addresses.append(acc_address)
+    initial_total = sum(services.get_balance(acc_address)[1] for acc_address in addresses)
+
+    # Switch threads as often as possible to expose check-then-act races
+    old_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    flows = []
+
+    def worker(seed):
+        rng = random.Random(seed)
+        net = 0
+        for i in range(ops):
+            acc_address = rng.choice(addresses)
+            amount = rng.randint(1, 100) * money.CENTS_PER_DOLLAR
+            op = rng.randrange(3)
+            if op == 0:
+                if services.deposit(acc_address, amount)[0]:
+                    net += amount
+            elif op == 1:
+                if services.withdraw(acc_address, amount)[0]:
+                    net -= amount
+            elif services.repay_loan(acc_address, 'Car Loan', 1, amount)[0]:
+                net -= amount
+        flows.append(net)
+
+    workers = [threading.Thread(target=worker, args=(seed,)) for seed in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    sys.setswitchinterval(old_interval)
+    report("stress " + str(threads) + " threads", threads * ops, elapsed)
+
+    final_total = sum(services.get_balance(acc_address)[1] for acc_address in addresses)
+    expected_total = initial_total + sum(flows)
+    overdrawn = [acc_address for acc_address in addresses if services.get_balance(acc_address)[1] < 0]
+    print("  expected total: $" + money.format_amount(expected_total) + "  actual total: $" +
+          money.format_amount(final_total))
+    if final_total != expected_total or overdrawn:
+        print("FAILED: balances not conserved (" + str(len(overdrawn)) + " overdrawn accounts)")
+        sys.exit(1)
+    print("  balances conserved")
+
+
+def bench_settlement(count=100000, transfers=1000000):
+    """Bulk settlement of a payroll-style file of transfer instructions"""
+    import data_storage
+    import settlement
+
+    populate_accounts(data_storage.connection, count)
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'transfers.csv')
+        with open(path, 'w') as instructions:
+            for i in range(transfers):
+                from_address = str(1000000 + rng.randrange(count))
+                to_address = str(1000000 + rng.randrange(count))
+                instructions.write(from_address + "," + to_address + "," + str(rng.randint(1, 200)) + "\n")
+
+        start = time.perf_counter()
+        summary = settlement.settle_file(path, os.path.join(tmp, 'rejects.csv'))
+        report("settle " + str(transfers) + " transfers", transfers, time.perf_counter() - start)
+        print("  accepted: " + str(summary['accepted']) + "  rejected: " + str(summary['rejected']))
+
+
+def bench_journal(ops=20000):
+    """Journal appends with an fsync per operation against grouped commits"""
+    import journal
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for level in journal.DURABILITY_LEVELS:
+            journal.open_journal(os.path.join(tmp, level + '.log'), level)
+            # fsync-per-op is slow enough that a smaller sample gives the same rate
+            level_ops = ops // 20 if level == 'sync' else ops
+            start = time.perf_counter()
+            for i in range(level_ops):
+                journal.record('deposit', str(1000000 + i), amount=1000, balance=100000 + i)
+            journal.close_journal()
+            report("journal durability=" + level, level_ops, time.perf_counter() - start)
+
+
+def bench_loan_engine(count=300000):
+    """Portfolio cash-flow projection against expanding every loan's schedule one by one"""
+    import loan_engine
+
+    loans = make_loan_book(count)
+    start = time.perf_counter()
+    for loan_type, loan in loans:
+        loan_engine.amortization_schedule(loan)
+    report("per-loan schedules", count, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    projections = loan_engine.project_portfolio(loans, today="18/10/2026")
+    report("portfolio projection", count, time.perf_counter() - start)
+    print("  outstanding now: $" + money.format_amount(projections[loan_engine.ALL_LOANS][0]['outstanding']
+                                                       + projections[loan_engine.ALL_LOANS][0]['cash_in']))
+
+
+def bench_loan_book(count=300000):
+    """Memory and scan time of the columnar loan book against lists of loan dictionaries"""
+    import tracemalloc
+    import loan_book
+    import loan_engine
+
+    pairs = make_loan_book(count)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    accounts = {}
+    for i, (loan_type, loan) in enumerate(pairs):
+        accounts.setdefault(str(1000000 + i // 3), {'loans': {}})['loans'].setdefault(loan_type, []).append(dict(loan))
+    dict_bytes = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    book = loan_book.build_loan_book(accounts)
+    print("dicts: " + str(dict_bytes // count) + " bytes/loan  columns: " +
+          str(book.memory_bytes() // count) + " bytes/loan")
+
+    start = time.perf_counter()
+    totals = {}
+    for account in accounts.values():
+        for loan_type, loans in account['loans'].items():
+            for loan in loans:
+                totals[loan_type] = totals.get(loan_type, 0) + loan['remaining_amount']
+    report("outstanding by type (dicts)", count, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    book.outstanding_by_type()
+    report("outstanding by type (columns)", count, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    book.total_outstanding()
+    report("total outstanding (columns)", count, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    loan_engine.project_loan_book(book, today="18/10/2026")
+    report("portfolio projection (columns)", count, time.perf_counter() - start)
+
+
+def bench_passwords(count=20, workers=0):
+    """Logins per second per core at several hashing costs, in-process and through the process pool"""
+    import threading
+    import passwords
+
+    workers = workers or os.cpu_count()
+    for iterations in (10000, 100000, 200000, 600000):
+        stored = [passwords.hash_password('bench' + str(i) + 'pass', iterations) for i in range(count)]
+
+        start = time.perf_counter()
+        for i in range(count):
+            passwords.verify_password('bench' + str(i) + 'pass', stored[i], use_cache=False)
+        report("login hash, " + str(iterations) + " iterations, 1 core", count, time.perf_counter() - start)
+
+        def verify_share(first, stored=stored):
+            for i in range(first, count, workers * 2):
+                passwords.verify_password('bench' + str(i) + 'pass', stored[i], use_cache=False)
+
+        passwords.start_pool(workers)
+        threads = [threading.Thread(target=verify_share, args=(first,)) for first in range(workers * 2)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        passwords.stop_pool()
+        report("login hash, " + str(iterations) + " iterations, pool of " + str(workers), count, elapsed)
+        print("  per core: " + str(round(count / elapsed / workers, 1)) + " logins/sec")
+
+    start = time.perf_counter()
+    for i in range(count * 1000):
+        passwords.verify_password('bench' + str(i % count) + 'pass', stored[i % count])
+    report("cached re-verification", count * 1000, time.perf_counter() - start)
+
+
+def bench_bulk_accounts(count=100000, workers=0):
+    """Streaming import of a CSV of new accounts through the process pool, then export to CSV and JSON lines"""
+    import resource
+    import bulk_accounts
+
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'accounts.csv')
+        with open(path, 'w') as output:
+            output.write("name,dob,home_address,country,phone_no,gender,password\n")
+            for i in range(count):
+                # Every tenth row repeats an earlier person (a link), every twentieth has a bad date
+                person = rng.randrange(i) if i % 10 == 9 else i
+                day = 32 if i % 20 == 19 else 1 + person % 28
+                output.write("User" + str(person) + "," + str(day) + "/06/1990,Bench Street " + str(person) +
+                             ",India," + str(9000000000 + person) + ",Male,bench" + str(person) + "pass\n")
+
+        start = time.perf_counter()
+        summary = bulk_accounts.import_file(path, os.path.join(directory, 'rejects.csv'), workers or None)
+        report("import", count, time.perf_counter() - start)
+        print("  created: " + str(summary['created']) + "  linked: " + str(summary['linked']) +
+              "  rejected: " + str(summary['rejected']))
+
+        for name in ('export.csv', 'export.jsonl'):
+            start = time.perf_counter()
+            exported = bulk_accounts.export_file(os.path.join(directory, name))
+            report("export " + name.split('.')[1], exported, time.perf_counter() - start)
+    print("  peak RSS: " + str(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024) + " MB")
+
+
+def legacy_validate_date(date_str):
+    """validate_date before precompiled patterns (reference for the validation benchmark)"""
+    import re
+    try:
+        parts = re.sub(r'[.,-/\s]', '/', date_str).split('/')
+        if len(parts) != 3:
+            return False
+        day, month, year = int(parts[0]), int(parts[1]), int(parts[2])
+        return 1 <= day <= 31 and 1 <= month <= 12 and 1900 <= year <= 2100
+    except ValueError:
+        return False
+
+
+def legacy_validate_home_address(address):
+    """validate_home_address before precompiled patterns"""
+    if len(address) <= 5:
+        return False
+    has_alphabet = False
+    for char in address:
+        if char.isalpha():
+            has_alphabet = True
+        elif not (char.isdigit() or char in ' ,-./'):
+            return False
+    return has_alphabet
+
+
+def legacy_validate_phone(phone, min_digits=7, max_digits=15):
+    """validate_phone before precompiled patterns"""
+    phone_clean = phone.replace(' ', '').replace('-', '')
+    if len(phone_clean) < min_digits or len(phone_clean) > max_digits:
+        return False
+    for char in phone_clean:
+        if not char.isdigit():
+            return False
+    return True
+
+
+def legacy_validate_password(password):
+    """validate_password before precompiled patterns"""
+    if len(password) < 8:
+        return False
+    has_number = False
+    has_alphabet = False
+    for char in password:
+        if char.isdigit():
+            has_number = True
+        if char.isalpha():
+            has_alphabet = True
+    return has_number and has_alphabet
+
+
+def bench_validation(count=10000000):
+    """Per-character validators against precompiled patterns, one call per value and in batches"""
+    import validation
+
+    rng = random.Random(42)
+    samples = {
+        'date': [str(rng.randint(1, 31)) + rng.choice('/-.') + str(rng.randint(1, 12)) + rng.choice('/-.') +
+                 str(rng.randint(1890, 2110)) for i in range(1000)],
+        'address': [str(rng.randint(1, 999)) + rng.choice([' High Street', ' Park Road, Flat 2', ' MG Road #4', 'ab',
+                                                                 'B, Green Park Extension, New Delhi-110016'])
+                    for i in range(1000)],
+        'phone': [rng.choice(['', '+']) + str(rng.randint(10 ** 6, 10 ** 12)) for i in range(1000)],
+        'password': ['pass' + rng.choice(['', 'word', '1', 'word123']) + str(rng.randint(0, 99)) for i in range(1000)]
+    }
+    validators = {
+        'date': (legacy_validate_date, validation.validate_date, validation.validate_dates),
+        'address': (legacy_validate_home_address, validation.validate_home_address, validation.validate_home_addresses),
+        'phone': (legacy_validate_phone, validation.validate_phone, validation.validate_phones),
+        'password': (legacy_validate_password, validation.validate_password, validation.validate_passwords)
+    }
+    for name, (legacy, single, batch) in validators.items():
+        values = samples[name] * (count // 1000)
+        start = time.perf_counter()
+        [legacy(value) for value in values]
+        legacy_elapsed = time.perf_counter() - start
+        report(name + " per-char loop", len(values), legacy_elapsed)
+
+        start = time.perf_counter()
+        [single(value) for value in values]
+        single_elapsed = time.perf_counter() - start
+        report(name + " compiled, one call per value", len(values), single_elapsed)
+
+        start = time.perf_counter()
+        batch(values)
+        elapsed = time.perf_counter() - start
+        report(name + " compiled, batch", len(values), elapsed)
+        print("  batch speedup: " + str(round(legacy_elapsed / elapsed, 2)) + "x over the per-char loop, " +
+              str(round(single_elapsed / elapsed, 2)) + "x over one call per value")
+
+
+def bench_allocator(digits=6, occupancy=99):
+    """Address allocation up to occupancy percent of the address space, against random draws with retries"""
+    import allocator
+
+    low, high = 10 ** (digits - 1), 10 ** digits
+    size = high - low
+    filled = size * occupancy // 100
+
+    addresses = allocator.Allocator({}, 'bench', low, high)
+    start = time.perf_counter()
+    for i in range(filled):
+        addresses.allocate()
+    report("allocator to " + str(occupancy) + "% full", filled, time.perf_counter() - start)
+    start = time.perf_counter()
+    remaining = addresses.remaining()
+    while addresses.allocate() is not None:
+        pass
+    report("allocator last " + str(100 - occupancy) + "%", remaining, time.perf_counter() - start)
+
+    rng = random.Random(42)
+    taken = set(rng.sample(range(low, high), filled))
+    ops = min(1000, size - filled)
+    tries = 0
+    start = time.perf_counter()
+    for i in range(ops):
+        address = rng.randint(low, high - 1)
+        tries += 1
+        while address in taken:
+            address = rng.randint(low, high - 1)
+            tries += 1
+        taken.add(address)
+    report("random retry at " + str(occupancy) + "% full", ops, time.perf_counter() - start)
+    print("  draws per address: " + str(round(tries / ops, 1)))
+
+
+def bench_lockout(count=100000, ops=1000000):
+    """Failed logins across random accounts: attempts per second and how many entries stay tracked"""
+    import data_storage
+    import lockout
+    import services
+
+    populate_accounts(data_storage.connection, count)
+    rng = random.Random(42)
+    start = time.perf_counter()
+    for i in range(ops):
+        services.attempt_password(str(1000000 + rng.randrange(count)), 'wrong-password')
+    report("failed logins (services)", ops, time.perf_counter() - start)
+    print("  tracked accounts: " + str(len(services.lockouts)) + "  heap items: " + str(len(services.lockouts.expiry_heap)))
+
+    # Simulated clock: one attempt per millisecond, so every lockout period sees 60,000 attempts
+    now = [0.0]
+    manager = lockout.LockoutManager(services.MAX_LOGIN_ATTEMPTS, services.LOCKOUT_SECONDS, clock=lambda: now[0])
+    peak = 0
+    start = time.perf_counter()
+    for i in range(ops * 5):
+        now[0] += 0.001
+        acc_address = rng.randrange(10000000)
+        manager.check(acc_address)
+        manager.record_failure(acc_address)
+        if i % 1000 == 0:
+            peak = max(peak, len(manager.expiry_heap))
+    report("failed logins (manager, simulated clock)", ops * 5, time.perf_counter() - start)
+    print("  tracked accounts: " + str(len(manager)) + "  peak heap items: " + str(peak))
+
+
+def bench_reporting(count=300000, ops=20000):
+    """Dashboard reads from trigger-maintained totals against scanning every account, and write overhead"""
+    import data_storage
+    import services
+
+    rng = random.Random(42)
+    loan_types = list(services.LOAN_TYPES.values())
+    rows = []
+    for i in range(count):
+        account = make_account(i)
+        if i % 3 == 0:
+            account['loans'][rng.choice(loan_types)] = [make_loan(rng)]
+        rows.append((str(1000000 + i), json.dumps(account)))
+    with data_storage.connection:
+        data_storage.connection.executemany("INSERT INTO accounts (key, value) VALUES (?, ?)", rows)
+
+    start = time.perf_counter()
+    import reporting
+    report("backfill totals", count, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    data_storage.connection.execute("SELECT json_extract(value, '$.branch_id'), COUNT(*), "
+                                    "SUM(json_extract(value, '$.balance')) FROM accounts GROUP BY 1").fetchall()
+    report("branch table (scan accounts)", 1, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for i in range(100):
+        reporting.branch_table()
+    report("branch table (totals tables)", 100, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for i in range(ops):
+        reporting.bank_totals()
+        reporting.loan_type_totals()
+    report("bank totals (totals tables)", ops, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for i in range(ops):
+        reporting.branch_summary('BR' + str(1000 + rng.randrange(9000)))
+    report("branch dashboard (totals tables)", ops, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for i in range(ops):
+        services.deposit(str(1000000 + rng.randrange(count)), 1000)
+    report("deposits with totals triggers", ops, time.perf_counter() - start)
+
+
+def bench_snapshot(count=1000000, tail=10000):
+    """Cold start from a snapshot plus journal tail, against parsing the whole journal"""
+    import subprocess
+    import journal
+    import snapshot
+
+    with tempfile.TemporaryDirectory() as tmp:
+        journal_path = os.path.join(tmp, 'bench_journal.log')
+        snapshot_path = os.path.join(tmp, 'bench.snap')
+        db_path = os.path.join(tmp, 'bench.db')
+        # Addresses of one width, so numeric order is also the sorted order a snapshot needs
+        base = 10 ** len(str(count))
+
+        # The journal of creating every account, then a tail of deposits after the snapshot
+        with open(journal_path, 'w') as output:
+            for i in range(count):
+                output.write(json.dumps({'op': 'create', 'acc': str(base + i), 'account': make_account(i)}) + "\n")
+        journal_offset = os.path.getsize(journal_path)
+
+        start = time.perf_counter()
+        rows = ((str(base + i), make_account(i)) for i in range(count))
+        # The small tables as a database already in cents holds them
+        tables = {'meta': [('money', json.dumps('cents'))], 'locked_accounts': []}
+        snapshot.write_snapshot(snapshot_path, rows, journal_offset, tables)
+        report("write snapshot of " + str(count) + " accounts", count, time.perf_counter() - start)
+        print("  snapshot: " + str(os.path.getsize(snapshot_path) // 2 ** 20) + " MB, journal: " +
+              str(journal_offset // 2 ** 20) + " MB")
+
+        rng = random.Random(42)
+        with open(journal_path, 'a') as output:
+            for i in range(tail):
+                output.write(json.dumps({'op': 'deposit', 'acc': str(base + rng.randrange(count)),
+                                         'amount': 1000, 'balance': 101000}) + "\n")
+
+        start = time.perf_counter()
+        accounts = snapshot.Snapshot(snapshot_path)
+        print("open snapshot: " + str(round((time.perf_counter() - start) * 1000, 3)) + " ms")
+        accounts.close()
+
+        start = time.perf_counter()
+        accounts, replayed = snapshot.open_accounts(snapshot_path, journal_path)
+        elapsed = time.perf_counter() - start
+        print("open snapshot + replay " + str(replayed) + " tail entries: " + str(round(elapsed * 1000, 3)) + " ms")
+
+        start = time.perf_counter()
+        for i in range(10000):
+            accounts[str(base + rng.randrange(count))]['balance']
+        report("first access of random accounts", 10000, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        entries = sum(1 for entry in journal.read_journal(journal_path))
+        report("parse whole journal (no snapshot)", entries, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        store = PersistentDict(open_connection(db_path), 'accounts')
+        snapshot.restore(accounts, store, tables=dict((name, PersistentDict(store.conn, name))
+                                                      for name in snapshot.TABLES))
+        store.conn.close()
+        report("restore snapshot into SQLite", count, time.perf_counter() - start)
+        accounts.close()
+
+        # Restarting main.py: the first start also builds the reporting totals, later ones only open the store
+        env = dict(os.environ, BANK_DB=db_path, BANK_JOURNAL=os.path.join(tmp, 'startup.log'))
+        for run in ('first', 'second'):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, '-c', 'import services, reporting'], env=env, check=True)
+            print("main.py start (" + run + "): " + str(round(time.perf_counter() - start, 3)) + "s")
+
+
+def bench_loan_batch(count=1000000, nights=30, store_count=100000):
+    """Nightly loan batch over count loans in a loan book and store_count in SQLite: a full run, then each night"""
+    import datetime
+    import loan_batch
+    import loan_book
+    from loan_engine import installment_due_day
+
+    first_night = datetime.date(2026, 10, 18)
+
+    # A loan that is up to date is not fined when an installment falls due, only once it is behind
+    check = loan_book.LoanBook()
+    loan = make_loan(random.Random(42))
+    loan.update(payment_plan='Monthly', total_installments=12, installments_paid=0, paid_amount=0,
+                remaining_amount=loan['total_payable'], start_date=first_night.strftime("%d/%m/%Y"),
+                suggested_installment=money.installment(loan['total_payable'], 12))
+    row = check.add('999999', 'Car Loan', loan)
+    for installment in (1, 2):
+        loan_batch.update_row(check, row, installment_due_day(first_night.toordinal(), installment, 12))
+        fined = check.penalty_amount[row] > 0
+        if fined != (installment == 2):
+            print("FAILED: late fee " + ("charged" if fined else "not charged") + " when installment " +
+                  str(installment) + " fell due")
+            sys.exit(1)
+    print("  late fees only once behind: ok")
+
+    pairs = make_loan_book(count)
+    book = loan_book.LoanBook()
+    for i, (loan_type, loan) in enumerate(pairs):
+        book.add(str(1000000 + i // 3), loan_type, loan)
+    balances = dict((acc_address, 100000) for acc_address, loan_type in book.owners)
+
+    # Columns only: pick out and update the due rows of the whole book
+    for night in range(nights + 1):
+        today = (first_night + datetime.timedelta(days=night)).toordinal()
+        start = time.perf_counter()
+        rows = loan_batch.select_rows(book, today)
+        for row in rows:
+            loan_batch.update_row(book, row, today, balances)
+        if night == 0:
+            report("loan book first run (" + str(len(rows)) + " loans due)", count, time.perf_counter() - start)
+        elif night == nights:
+            report("loan book night " + str(night) + " (" + str(len(rows)) + " loans due)", count,
+                   time.perf_counter() - start)
+
+    # End to end against SQLite: only the accounts due each night are read and written
+    with tempfile.TemporaryDirectory() as tmp:
+        store = PersistentDict(open_connection(os.path.join(tmp, 'bench.db')), 'accounts')
+        store.add_index('loan_due', ('loan_due_day',))
+        rows = []
+        for i in range(0, store_count, 3):
+            account = make_account(i // 3)
+            for loan_type, loan in pairs[i:i + 3]:
+                account['loans'].setdefault(loan_type, []).append(loan)
+            rows.append((str(1000000 + i // 3), json.dumps(account)))
+        store.write_json(rows)
+
+        for night in range(nights + 1):
+            today = (first_night + datetime.timedelta(days=night)).strftime("%d/%m/%Y")
+            start = time.perf_counter()
+            summary = loan_batch.run_batch(store, today, auto_debit=True, full=night == 0)
+            elapsed = time.perf_counter() - start
+            if night == 0 or night == nights or night % 10 == 0:
+                print("store night " + str(night) + ": " + str(summary['loans']) + " loans in " +
+                      str(summary['accounts']) + " accounts in " + str(round(elapsed, 3)) + "s")
+
+
+def bench_events(count=200000, subscribers=4):
+    """Events per second through the bus with sync, background and dropping subscribers attached"""
+    import events
+    import services
+
+    def handle(event):
+        totals[event.acc_address] = event.fields.get('balance')
+
+    fields = {'amount': 1000, 'balance': 100000}
+    for mode in ('none', 'sync', 'background', 'background, dropping'):
+        bus = events.EventBus()
+        totals = {}
+        subscriptions = []
+        if mode != 'none':
+            for i in range(subscribers):
+                subscriptions.append(bus.subscribe(handle, background=mode != 'sync', queue_size=1000,
+                                                   block=mode == 'background'))
+        start = time.perf_counter()
+        for i in range(count):
+            bus.publish('deposit', str(1000000 + i % 1000), fields)
+        bus.wait()
+        elapsed = time.perf_counter() - start
+        label = "no subscribers" if mode == 'none' else str(subscribers) + " " + mode + " subscribers"
+        report("publish, " + label, count, elapsed)
+        if mode == 'background, dropping':
+            print("  dropped: " + str(sum(s.dropped for s in subscriptions)) + " of " + str(count * subscribers))
+        for subscription in subscriptions:
+            bus.unsubscribe(subscription)
+
+    # The same subscribers on the real bus, fed by service operations
+    populate_accounts(services.accounts.conn, 1000)
+    ops = count // 10
+    for mode in ('none', 'sync', 'background'):
+        totals = {}
+        subscriptions = []
+        if mode != 'none':
+            for i in range(subscribers):
+                subscriptions.append(events.bus.subscribe(handle, ops=('deposit',), background=mode == 'background'))
+        start = time.perf_counter()
+        for i in range(ops):
+            services.deposit(str(1000000 + i % 1000), 1000)
+        events.bus.wait()
+        label = "no subscribers" if mode == 'none' else str(subscribers) + " " + mode + " subscribers"
+        report("deposits, " + label, ops, time.perf_counter() - start)
+        for subscription in subscriptions:
+            events.bus.unsubscribe(subscription)
+
+
+def bench_shards(count=100000, ops=100000, transfers=5000, threads=8):
+    """Operations per second with the accounts split over 1, 2, 4 and 8 shard processes"""
+    import threading
+    from sharding import ShardedBank, shard_of
+
+    rng = random.Random(42)
+    addresses = [str(1000000 + i) for i in range(count)]
+    for shards in (1, 2, 4, 8):
+        with tempfile.TemporaryDirectory() as directory:
+            for shard in range(shards):
+                conn = open_connection(os.path.join(directory, 'shard' + str(shard) + '.db'))
+                PersistentDict(conn, 'accounts').write_json(
+                    [(acc_address, json.dumps(make_account(int(acc_address)))) for acc_address in addresses
+                     if shard_of(acc_address, shards) == shard])
+                conn.close()
+            bank = ShardedBank(shards, directory)
+
+            # Deposits, withdrawals and balance checks, sent 1000 at a time
+            requests = []
+            for i in range(ops):
+                acc_address = rng.choice(addresses)
+                op = ('deposit', 'withdraw', 'get_balance')[i % 3]
+                args = (acc_address,) if op == 'get_balance' else (acc_address, 100)
+                requests.append((shard_of(acc_address, shards), op, args))
+            start = time.perf_counter()
+            for i in range(0, ops, 1000):
+                bank.call_many(requests[i:i + 1000])
+            report(str(shards) + " shards, batched deposit/withdraw/balance", ops, time.perf_counter() - start)
+
+            # Transfers between random accounts from several threads; across shards they take five round trips
+            pairs = [(rng.choice(addresses), rng.choice(addresses)) for i in range(transfers)]
+            pairs = [(a, b) for a, b in pairs if a != b]
+            crossing = sum(1 for a, b in pairs if shard_of(a, shards) != shard_of(b, shards))
+
+            def run(part):
+                for acc_address, target_acc_address in part:
+                    bank.transfer(acc_address, target_acc_address, 100)
+
+            workers = [threading.Thread(target=run, args=(pairs[i::threads],)) for i in range(threads)]
+            start = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            report(str(shards) + " shards, transfers (" + str(crossing) + " cross-shard)", len(pairs),
+                   time.perf_counter() - start)
+
+            total = sum(result[1] for result in bank.call_many(
+                [(shard_of(acc_address, shards), 'get_balance', (acc_address,)) for acc_address in addresses]))
+            print("  total balance: $" + money.format_amount(total) + " (" + str(os.cpu_count()) + " CPU cores)")
+            bank.close()
+
+
+def bench_metrics(ops=100000, rounds=3):
+    """Deposits and balance checks per second with and without metrics, and the cost of one histogram record"""
+    import metrics
+    import services
+
+    populate_accounts(services.accounts.conn, 1000)
+    addresses = [str(1000000 + i % 1000) for i in range(ops)]
+
+    def best(operation, amount=None):
+        """Best of rounds timings of operation over every address"""
+        timings = []
+        for i in range(rounds):
+            start = time.perf_counter()
+            if amount is None:
+                for acc_address in addresses:
+                    operation(acc_address)
+            else:
+                for acc_address in addresses:
+                    operation(acc_address, amount)
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    # Unless BANK_METRICS was set the services functions are undecorated; decorate them here
+    deposit = getattr(services.deposit, '__wrapped__', services.deposit)
+    get_balance = getattr(services.get_balance, '__wrapped__', services.get_balance)
+    plain = (best(deposit, 100), best(get_balance))
+    metrics.ENABLED = True
+    metrics.watch_storage(PersistentDict)
+    measured = (best(metrics.timed('deposit')(deposit), 100), best(metrics.timed('get_balance')(get_balance)))
+    for name, off, on in zip(("deposits", "balance checks"), plain, measured):
+        report(name + ", metrics off", ops, off)
+        report(name + ", metrics on", ops, on)
+        print("  overhead: " + str(round((on - off) / off * 100, 1)) + "% (" +
+              str(round((on - off) / ops * 1000000, 2)) + " microseconds per call)")
+
+    histogram = metrics.Histogram()
+    rng = random.Random(42)
+    values = [int(rng.lognormvariate(4, 1.5)) for i in range(ops)]
+    start = time.perf_counter()
+    for value in values:
+        histogram.record(value)
+    report("histogram records", ops, time.perf_counter() - start)
+    exact = sorted(values)
+    for fraction in metrics.PERCENTILES:
+        print("  p" + str(fraction * 100) + ": " + str(histogram.percentile(fraction)) + " (exact " +
+              str(exact[min(int(fraction * ops), ops - 1)]) + ")")
+    print(metrics.format_report(), end='')
+
+
+def bench_workload(ops=100000, users=1000, seed=42):
+    """Replay a generated workload of signups, logins, deposits, withdrawals and loans against services"""
+    import services
+    import workload
+
+    start = time.perf_counter()
+    header, operations = workload.generate(ops, users, seed)
+    report("generate workload", len(operations), time.perf_counter() - start)
+    results = workload.replay(services, header, operations)
+    results['peak_rss_kb'] = workload.peak_rss_kb()
+    workload.print_results(results)
+
+
+def bench_script(count=30000):
+    """Scripted-mode commands per second: a login, then deposits, withdrawals and balance checks"""
+    import io
+    import scripting
+
+    # The deposit keeps the loan within what the credit score approves
+    lines = ["login Testuser 111111 999999 test1234", "deposit 100000"]
+    for i in range(count):
+        lines.append(("deposit 10", "withdraw 5", "balance", "repay Car Loan 1 5")[i % 4] if i else
+                     "apply_loan 100000 Car Loan Monthly 111111 test1234")
+    out = io.StringIO()
+    start = time.perf_counter()
+    commands, failures = scripting.run_script(lines, out)
+    report("script commands", commands, time.perf_counter() - start)
+    print("  failed: " + str(failures) + ", output: " + str(len(out.getvalue()) // 1024) + " KB")
+
+
+def bench_views(loans=500, redraws=10000):
+    """Loan and account screen redraws per second for an account with hundreds of loans, cached and uncached"""
+    import io
+    import services
+    import views
+
+    rng = random.Random(42)
+    services.accounts['999999']['loans'] = {}
+    for loan_type, loan in make_loan_book(loans):
+        services.accounts['999999']['loans'].setdefault(loan_type, []).append(loan)
+    views.forget('999999')
+    out = io.StringIO()
+
+    def full_render():
+        """What check_loans did before the cache: every loan rendered, one print per line"""
+        account = services.accounts['999999']
+        for line in views.render_account_info('999999').split("\n"):
+            print(line, file=out)
+        for loan_type in services.LOAN_TYPES.values():
+            for line in views.render_loan_type(loan_type, account['loans'].get(loan_type)).split("\n"):
+                print(line, file=out)
+
+    start = time.perf_counter()
+    for i in range(redraws // 100):
+        full_render()
+    report("uncached redraws, " + str(loans) + " loans", redraws // 100, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for i in range(redraws):
+        views.write_screen(views.account_info_view('999999') + views.loans_view('999999'), out)
+    report("cached redraws", redraws, time.perf_counter() - start)
+
+    # A repayment drops one loan type's block and the account screen; the redraw renders only those
+    loan_types = list(services.accounts['999999']['loans'])
+    ops = redraws // 100
+    start = time.perf_counter()
+    for i in range(ops):
+        loan_type = rng.choice(loan_types)
+        services.repay_loan('999999', loan_type, 1, 1)
+        views.write_screen(views.account_info_view('999999') + views.loans_view('999999'), out)
+    elapsed = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(ops):
+        services.repay_loan('999999', rng.choice(loan_types), 1, 1)
+    report("repayment + redraw", ops, elapsed)
+    report("repayment alone", ops, time.perf_counter() - start)
+
+
+def bench_money(count=100000):
+    """Float dollars against integer cents: loans left open by rounding, record size, encoding and column sums"""
+    from array import array
+    from data_storage import LOAN_MONEY_FIELDS
+
+    rng = random.Random(42)
+    pairs = make_loan_book(count)
+    # Each loan is repaid in 2-12 random pieces that add up to exactly what it owes
+    pieces = []
+    for loan_type, loan in pairs:
+        remaining = loan['remaining_amount']
+        cuts = sorted(rng.sample(range(1, remaining), rng.randint(1, 11)))
+        pieces.append([end - begin for begin, end in zip([0] + cuts, cuts + [remaining])])
+
+    def repay_all(loans, amounts):
+        """Pay every piece off its loan as repay_loan does; returns the loans left open"""
+        left_open = 0
+        for loan, loan_pieces in zip(loans, amounts):
+            for amount in loan_pieces:
+                loan['paid_amount'] += amount
+                loan['remaining_amount'] -= amount
+            if loan['remaining_amount'] > 0:
+                left_open += 1
+        return left_open
+
+    dollar_loans = [dict((field, loan[field] / 100 if field in LOAN_MONEY_FIELDS else loan[field]) for field in loan)
+                    for loan_type, loan in pairs]
+    dollar_pieces = [[amount / 100 for amount in loan_pieces] for loan_pieces in pieces]
+    cent_loans = [dict(loan) for loan_type, loan in pairs]
+
+    # Account records holding three loans each with one piece paid, as accounts.save() writes them
+    for name, loans, amounts, balance in (("float dollars", dollar_loans, dollar_pieces, 1000.1 + 0.2),
+                                          ("integer cents", cent_loans, pieces, 100030)):
+        paid = [dict(loan, paid_amount=loan['paid_amount'] + loan_pieces[0],
+                     remaining_amount=loan['remaining_amount'] - loan_pieces[0])
+                for loan, loan_pieces in zip(loans, amounts)]
+        records = [{'balance': balance, 'loans': {'Car Loan': paid[i:i + 3]}} for i in range(0, count, 3)]
+        start = time.perf_counter()
+        texts = [json.dumps(record) for record in records]
+        report("encode records (" + name + ")", len(records), time.perf_counter() - start)
+        start = time.perf_counter()
+        for text in texts:
+            json.loads(text)
+        report("decode records (" + name + ")", len(records), time.perf_counter() - start)
+        print("  " + str(sum(len(text) for text in texts) // len(texts)) + " bytes/record")
+
+    repayments = sum(len(loan_pieces) for loan_pieces in pieces)
+    start = time.perf_counter()
+    dollar_open = repay_all(dollar_loans, dollar_pieces)
+    report("repayments (float dollars)", repayments, time.perf_counter() - start)
+    print("  loans left open after being repaid in full: " + str(dollar_open) + " of " + str(count))
+    start = time.perf_counter()
+    cent_open = repay_all(cent_loans, pieces)
+    report("repayments (integer cents)", repayments, time.perf_counter() - start)
+    print("  loans left open after being repaid in full: " + str(cent_open) + " of " + str(count))
+
+    # Loan book columns: total outstanding
+    dollar_column = array('d', [loan['remaining_amount'] for loan in dollar_loans])
+    cent_column = array('q', [loan['remaining_amount'] for loan in cent_loans])
+    for name, column in (("float dollars", dollar_column), ("integer cents", cent_column)):
+        start = time.perf_counter()
+        for i in range(10):
+            total = sum(column)
+        report("column sum (" + name + ")", 10 * count, time.perf_counter() - start)
+        print("  total: " + repr(total) + ", " + str(column.itemsize) + " bytes/loan")
+
+
+def bench_scoring(count=100000, ops=100000, loans=30):
+    """Loan applications scored from kept features against recomputing them, and re-scoring the whole book"""
+    import data_storage
+    import scoring
+    import services
+    from events import Event
+
+    rng = random.Random(42)
+    loan_types = list(services.LOAN_TYPES.values())
+
+    def scored_loan():
+        """A synthetic loan the nightly batch has seen, some of them behind"""
+        loan = make_loan(rng)
+        loan['installments_due'] = min(loan['installments_paid'] + rng.choice((0, 0, 0, 1, 2)),
+                                       loan['total_installments'])
+        return loan
+
+    rows = []
+    for i in range(count):
+        account = make_account(i)
+        account['balance'] = rng.randint(1000, 100000) * money.CENTS_PER_DOLLAR
+        for j in range(rng.randint(0, 3)):
+            account['loans'].setdefault(rng.choice(loan_types), []).append(scored_loan())
+        rows.append((str(1000000 + i), json.dumps(account)))
+    with data_storage.connection:
+        data_storage.connection.executemany("INSERT INTO accounts (key, value) VALUES (?, ?)", rows)
+
+    # Applications from up to a thousand busy borrowers holding many loans each
+    borrowers = [str(1000000 + i) for i in range(min(count, 1000))]
+    for acc_address in borrowers:
+        account = services.accounts[acc_address]
+        account['balance'] = rng.randint(100000, 1000000) * money.CENTS_PER_DOLLAR
+        account['loans'] = {}
+        for j in range(loans):
+            account['loans'].setdefault(rng.choice(loan_types), []).append(scored_loan())
+    picks = [rng.choice(borrowers) for i in range(ops)]
+
+    start = time.perf_counter()
+    for acc_address in picks:
+        scoring.score_features(scoring.account_features(services.accounts[acc_address]), 100000, 'Home Loan')
+    report("score application (features recomputed, " + str(loans) + " loans)", ops, time.perf_counter() - start)
+    start = time.perf_counter()
+    approved = 0
+    for acc_address in picks:
+        approved += scoring.evaluate(acc_address, 100000, 'Home Loan')[0]
+    report("score application (features kept)", ops, time.perf_counter() - start)
+    print("  approved: " + str(approved) + " of " + str(ops))
+
+    # What keeping the features costs a repayment: one loan type recomputed
+    events = []
+    for acc_address in picks[:ops // 10]:
+        loan_type = rng.choice(list(services.accounts[acc_address]['loans']))
+        events.append(Event('repay_loan', acc_address, {'loan_type': loan_type, 'amount': 100, 'balance': 100000,
+                                                        'loans': services.accounts[acc_address]['loans'][loan_type]},
+                            0))
+    start = time.perf_counter()
+    for event in events:
+        scoring.on_change(event)
+    report("feature updates (loan change)", len(events), time.perf_counter() - start)
+
+    for workers in (0, None):
+        start = time.perf_counter()
+        summary = scoring.score_book(services.accounts, None, workers)
+        report("re-score book (" + ("in process" if workers == 0 else str(os.cpu_count()) + " workers") + ")",
+               count, time.perf_counter() - start)
+        print("  accounts with loans: " + str(summary['accounts']) + ", bands: " +
+              ", ".join(str(band) + "+: " + str(summary[band]) for band in scoring.SCORE_BANDS + (0,)))
+
+
+BENCHMARKS = {
+    'storage': bench_storage,
+    'indexes': bench_indexes,
+    'services': bench_services,
+    'server': bench_server,
+    'stress': bench_stress,
+    'settlement': bench_settlement,
+    'journal': bench_journal,
+    'loan_engine': bench_loan_engine,
+    'loan_book': bench_loan_book,
+    'reporting': bench_reporting,
+    'lockout': bench_lockout,
+    'passwords': bench_passwords,
+    'bulk_accounts': bench_bulk_accounts,
+    'validation': bench_validation,
+    'allocator': bench_allocator,
+    'snapshot': bench_snapshot,
+    'loan_batch': bench_loan_batch,
+    'events': bench_events,
+    'shards': bench_shards,
+    'metrics': bench_metrics,
+    'workload': bench_workload,
+    'script': bench_script,
+    'views': bench_views,
+    'money': bench_money,
+    'scoring': bench_scoring,
+}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print("Available benchmarks: " + ", ".join(BENCHMARKS))
+        sys.exit(1)
+    args = [int(arg) for arg in sys.argv[2:]]
+    BENCHMARKS[sys.argv[1]](*args)
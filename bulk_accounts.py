@@ -0,0 +1,231 @@
+"""Bulk account import and export
+
+Imports read CSV (with a header line) or JSON lines (.jsonl) holding the
+fields name, dob, home_address, country, phone_no, gender and password,
+plus an optional special_code. Lines are streamed in chunks: worker
+processes parse, validate and hash the passwords of a chunk, and the main
+process links each account to any existing account with the same
+personal details (giving it the same special code), assigns a free
+address and writes the chunk in one transaction. A special_code given
+for an account without a match becomes its code, so exported files can
+be imported again; one that differs from the matching account's code,
+or that another person's accounts already use, is rejected. Only a few
+chunks are in memory at any time, and rejected lines go to a rejects
+file as
+    line_no,line,reason
+
+Exports stream every account to CSV or JSON lines without loading them
+all into memory. CSV exports leave out passwords and loans. Balances and
+loan amounts are exported in cents, as they are stored.
+
+Usage: python bulk_accounts.py import <accounts.csv|.jsonl> [rejects.csv]
+       python bulk_accounts.py export <accounts.csv|.jsonl>
+"""
+import csv
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import journal
+import passwords
+import services
+from data_storage import accounts
+
+CHUNK_SIZE = 1000
+IMPORT_FIELDS = ('name', 'dob', 'home_address', 'country', 'phone_no', 'gender', 'password')
+EXPORT_FIELDS = ('acc_address', 'name', 'dob', 'home_address', 'country', 'phone_no', 'gender',
+                 'special_code', 'branch_id', 'balance')
+
+
+def is_jsonl(path):
+    """Check whether a file name calls for JSON lines rather than CSV"""
+    return path.endswith('.jsonl') or path.endswith('.json')
+
+
+def parse_line(line, columns):
+    """Parse one CSV line (columns from the header) or JSON line (columns is None) into a dictionary"""
+    if columns is None:
+        try:
+            fields = json.loads(line)
+        except ValueError:
+            return False, "Invalid JSON!"
+        if not isinstance(fields, dict):
+            return False, "Invalid JSON!"
+    else:
+        values = next(csv.reader([line]))
+        if len(values) != len(columns):
+            return False, "Expected " + str(len(columns)) + " fields, got " + str(len(values))
+        fields = dict(zip(columns, values))
+    for field in IMPORT_FIELDS:
+        if not isinstance(fields.get(field), str):
+            return False, "Missing field: " + field
+    # Optional, but a number here would fail later on in the chunk
+    if fields.get('special_code') is not None and not isinstance(fields['special_code'], str):
+        return False, "Invalid special code!"
+    return True, fields
+
+
+def prepare_chunk(chunk, columns, iterations):
+    """Parse, validate and hash one chunk of (line_no, line) pairs (runs in a worker process)
+
+    Returns (line_no, line, fields, reason) tuples: fields is None for a
+    rejected line, else it holds the details with the password hashed.
+    """
+    prepared = []
+    parsed = []
+    for line_no, line in chunk:
+        success, fields = parse_line(line, columns)
+        if success:
+            fields['name'] = fields['name'].strip().capitalize()
+            parsed.append((line_no, line, fields))
+        else:
+            prepared.append((line_no, line, None, fields))
+
+    checks = services.check_many_account_details([fields for line_no, line, fields in parsed])
+    for (line_no, line, fields), (success, reason) in zip(parsed, checks):
+        if not success:
+            prepared.append((line_no, line, None, reason))
+            continue
+        fields['password'] = passwords.hash_password(fields['password'], iterations)
+        prepared.append((line_no, line, fields, None))
+    # Back into file order so rejects are written in order
+    prepared.sort(key=lambda item: item[0])
+    return prepared
+
+
+def create_chunk(prepared, summary, rejects_file):
+    """Link, address and write one prepared chunk, counting the results into summary"""
+    created = {}
+    # Personal details -> special code of accounts created earlier in this chunk (not yet written)
+    chunk_links = {}
+    chunk_codes = set()
+    for line_no, line, fields, reason in prepared:
+        if fields is not None:
+            identity = (fields['name'], fields['dob'], fields['home_address'], fields['phone_no'], fields['gender'])
+            special_code = chunk_links.get(identity)
+            if special_code is None:
+                special_code = services.find_matching_account(*identity)[1]
+            linked = special_code is not None
+            requested_code = fields.get('special_code') or None
+            if requested_code is not None and linked and requested_code != special_code:
+                reason = "Incorrect special code!"
+            elif requested_code is not None and not (len(requested_code) == 6 and requested_code.isdigit()):
+                reason = "Invalid special code!"
+            elif requested_code is not None and not linked and (
+                    requested_code in chunk_codes or services.find_linked_accounts(requested_code)):
+                # A code belongs to one person's accounts; never link a stranger to them
+                reason = "Special code already in use!"
+            elif not linked:
+                special_code = requested_code or services.generate_special_code()
+                if special_code is None:
+                    reason = "No free special codes left!"
+            if reason is None:
+                acc_address = services.find_free_account_address(created)
+                if acc_address is None:
+                    reason = "No free account addresses left!"
+        if reason is not None:
+            summary['rejected'] += 1
+            if rejects_file is not None:
+                rejects_file.write(str(line_no) + "," + line + "," + reason + "\n")
+            continue
+
+        if linked:
+            summary['linked'] += 1
+        chunk_links[identity] = special_code
+        chunk_codes.add(special_code)
+        created[acc_address] = services.new_account_record(
+            fields['name'], fields['dob'], fields['home_address'], fields['country'], fields['phone_no'],
+            fields['gender'], fields['password'], special_code)
+
+    accounts.write_many(created)
+    for acc_address, account in created.items():
+        journal.record('create', acc_address, account=account)
+    summary['created'] += len(created)
+
+
+def read_chunks(lines, chunk_size, first_line_no=1):
+    """Group non-empty lines into lists of (line_no, line) pairs"""
+    chunk = []
+    for line_no, line in enumerate(lines, start=first_line_no):
+        line = line.strip()
+        if not line:
+            continue
+        chunk.append((line_no, line))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def import_lines(lines, columns, rejects_file=None, workers=None, chunk_size=CHUNK_SIZE, first_line_no=1):
+    """Import an iterable of account lines and return a summary dictionary
+
+    columns are the CSV header fields, or None for JSON lines. With
+    workers=0 every chunk is prepared in this process.
+    """
+    summary = {'created': 0, 'linked': 0, 'rejected': 0}
+    if workers == 0:
+        for chunk in read_chunks(lines, chunk_size, first_line_no):
+            create_chunk(prepare_chunk(chunk, columns, passwords.HASH_ITERATIONS), summary, rejects_file)
+        return summary
+
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(workers) as pool:
+        # Chunks are finished in file order, with at most two per worker in flight
+        pending = deque()
+        for chunk in read_chunks(lines, chunk_size, first_line_no):
+            pending.append(pool.submit(prepare_chunk, chunk, columns, passwords.HASH_ITERATIONS))
+            if len(pending) >= workers * 2:
+                create_chunk(pending.popleft().result(), summary, rejects_file)
+        while pending:
+            create_chunk(pending.popleft().result(), summary, rejects_file)
+    return summary
+
+
+def import_file(path, rejects_path=None, workers=None, chunk_size=CHUNK_SIZE):
+    """Import every account in a CSV or JSON lines file, writing rejected lines to rejects_path"""
+    with open(path, newline='') as lines:
+        columns = None
+        first_line_no = 1
+        if not is_jsonl(path):
+            columns = [column.strip() for column in next(csv.reader([lines.readline()]))]
+            first_line_no = 2
+        if rejects_path is None:
+            return import_lines(lines, columns, None, workers, chunk_size, first_line_no)
+        with open(rejects_path, 'w') as rejects_file:
+            return import_lines(lines, columns, rejects_file, workers, chunk_size, first_line_no)
+
+
+def export_file(path):
+    """Write every account to a CSV or JSON lines file and return the number written"""
+    count = 0
+    with open(path, 'w', newline='') as output:
+        if is_jsonl(path):
+            for acc_address, account in accounts.iter_records():
+                record = dict(account)
+                record['acc_address'] = acc_address
+                output.write(json.dumps(record) + "\n")
+                count += 1
+        else:
+            writer = csv.writer(output, lineterminator='\n')
+            writer.writerow(EXPORT_FIELDS)
+            for acc_address, account in accounts.iter_records():
+                writer.writerow([acc_address] + [account.get(field, '') for field in EXPORT_FIELDS[1:]])
+                count += 1
+    return count
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ('import', 'export'):
+        print("Usage: python bulk_accounts.py import <accounts.csv|.jsonl> [rejects.csv]")
+        print("       python bulk_accounts.py export <accounts.csv|.jsonl>")
+        sys.exit(1)
+    if sys.argv[1] == 'import':
+        journal.open_journal()
+        summary = import_file(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None)
+        print("Created: " + str(summary['created']) + " (" + str(summary['linked']) + " linked to existing accounts)")
+        print("Rejected: " + str(summary['rejected']))
+    else:
+        print("Exported: " + str(export_file(sys.argv[2])))
@@ -1,18 +1,349 @@
-accounts = {
-    "999999": {
-        "name": "Testuser",
-        "dob": "01/01/2000",
-        "home_address": "Test Street 123",
-        "phone_no": "9999999999",
-        "password": "test1234",
-        "gender": "Male",
-        "country": "India",
-        "special_code": "111111",
-        "branch_id": "BR0001",
-        "balance": 10000.0,
-        "loans": {}
-    }
-}
-
-login_attempts = {}
-locked_accounts = {}
+import copy
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+import metrics
+from events import bus
+from money import to_cents
+from transactions import held_accounts, on_hold
+
+# Database file used for all persistent data (set BANK_DB=:memory: for a throwaway store)
+DB_PATH = os.environ.get('BANK_DB', 'bank.db')
+# Account records kept in memory; the least recently used are dropped beyond this
+MAX_CACHED_ACCOUNTS = int(os.environ.get('BANK_CACHE_ACCOUNTS', '100000'))
+MAX_PINNED_SKIPS = 8
+
+DEFAULT_ACCOUNTS = {
+    "999999": {
+        "name": "Testuser",
+        "dob": "01/01/2000",
+        "home_address": "Test Street 123",
+        "phone_no": "9999999999",
+        "password": "test1234",
+        "gender": "Male",
+        "country": "India",
+        "special_code": "111111",
+        "branch_id": "BR0001",
+        "balance": 1000000,
+        "loans": {}
+    }
+}
+
+# Money fields of a loan, in cents (dollars as floats before records were kept in cents)
+LOAN_MONEY_FIELDS = ('principal', 'interest_amount', 'total_payable', 'paid_amount', 'remaining_amount',
+                     'suggested_installment', 'penalty_amount')
+
+
+def open_connection(path):
+    """Open a SQLite connection in WAL mode so committed writes survive a crash"""
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # NORMAL is safe against process crashes in WAL mode, only power loss can drop the last commits
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class PersistentDict(MutableMapping):
+    """Dictionary backed by a SQLite table, records are loaded lazily on first access
+
+    With max_cached set, at most that many records stay cached: loading
+    another drops the least recently used one. Records whose key is in
+    pinned (e.g. accounts locked by a transaction, which may be changed in
+    place and not saved yet) are never dropped.
+
+    Other processes (the nightly loan batch, settlement, bulk imports) may
+    write the same database. refresh() re-reads cached records they
+    changed; SQLite's data_version tells when any other connection has
+    committed, so in a single process it costs one PRAGMA. on_reload is
+    called with the key of every cached record re-read or dropped, so
+    anything worked out from the old record can be dropped too.
+    """
+
+    def __init__(self, conn, table, lock=None, max_cached=None, pinned=(), on_reload=None):
+        self.conn = conn
+        self.table = table
+        # Serializes cache fills and transactions; share one lock between tables on one connection
+        self.lock = lock or threading.RLock()
+        # Least recently used first
+        self.cache = OrderedDict()
+        self.max_cached = max_cached
+        self.pinned = pinned
+        self.on_reload = on_reload
+        # key -> hash of a cached record's JSON text as last read or written
+        self.hashes = {}
+        # Cached keys that matched the database since data_version was last seen
+        self.verified = set()
+        self.data_version = None
+        self.indexes = {}
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS " + table +
+                         " (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    def __getitem__(self, key):
+        value = self.cache.get(key)
+        if value is not None:
+            if self.max_cached is not None:
+                try:
+                    self.cache.move_to_end(key)
+                except KeyError:
+                    # Dropped by another thread just now; the caller still gets the record it asked for
+                    pass
+            return value
+        with self.lock:
+            # Another thread may have loaded the record while we waited
+            value = self.cache.get(key)
+            if value is not None:
+                return value
+            row = self.conn.execute("SELECT value FROM " + self.table + " WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                raise KeyError(key)
+            value = json.loads(row[0])
+            self.cache[key] = value
+            self.hashes[key] = hash(row[0])
+            self.verified.add(key)
+            self.make_room()
+            return value
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            self.cache[key] = value
+            self.save(key)
+            self.make_room()
+
+    def make_room(self):
+        """Drop the least recently used records beyond max_cached, keeping the pinned ones (call holding the lock)"""
+        if self.max_cached is None:
+            return
+        kept = 0
+        # Looking at only a few pinned records per call keeps a transaction over many accounts (a settlement
+        # batch) from rescanning them on every load; the cache shrinks back once they are released
+        while len(self.cache) > self.max_cached and kept < MAX_PINNED_SKIPS:
+            key, value = self.cache.popitem(last=False)
+            if key in self.pinned:
+                # Possibly changed in place and not saved yet: back to the most recently used end
+                self.cache[key] = value
+                kept += 1
+            else:
+                self.forget(key)
+                if self.on_reload is not None:
+                    # Whatever it is read back as later may hold another process's changes
+                    self.on_reload(key)
+
+    def forget(self, key):
+        """Drop what is known about a record that left the cache (call holding the lock)"""
+        self.hashes.pop(key, None)
+        self.verified.discard(key)
+
+    def refresh(self, keys):
+        """Re-read cached records another process changed, updating them in place; returns the changed keys
+
+        Call it before changing the records, holding their account locks.
+        """
+        with self.lock:
+            version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            if version != self.data_version:
+                # Something else committed: every cached record has to be checked again
+                self.data_version = version
+                self.verified.clear()
+            stale = [key for key in keys if key in self.cache and key not in self.verified]
+            changed = []
+            for i in range(0, len(stale), 500):
+                batch = stale[i:i + 500]
+                rows = self.conn.execute("SELECT key, value FROM " + self.table + " WHERE key IN (" +
+                                         ", ".join("?" * len(batch)) + ")", batch)
+                for key, value in rows:
+                    if hash(value) != self.hashes.get(key):
+                        record = self.cache[key]
+                        record.clear()
+                        record.update(json.loads(value))
+                        self.hashes[key] = hash(value)
+                        changed.append(key)
+                        if self.on_reload is not None:
+                            self.on_reload(key)
+            self.verified.update(stale)
+            return changed
+
+    def __delitem__(self, key):
+        with self.lock:
+            if key not in self:
+                raise KeyError(key)
+            self.cache.pop(key, None)
+            self.forget(key)
+            with self.conn:
+                self.conn.execute("DELETE FROM " + self.table + " WHERE key = ?", (key,))
+
+    def __contains__(self, key):
+        if key in self.cache:
+            return True
+        with self.lock:
+            row = self.conn.execute("SELECT 1 FROM " + self.table + " WHERE key = ?", (key,)).fetchone()
+        return row is not None
+
+    def __iter__(self):
+        with self.lock:
+            cursor = self.conn.execute("SELECT key FROM " + self.table)
+        while True:
+            with self.lock:
+                rows = cursor.fetchmany(1000)
+            if not rows:
+                break
+            for row in rows:
+                yield row[0]
+
+    def iter_records(self, batch_size=1000):
+        """Yield (key, record) for every record without loading them into the cache"""
+        with self.lock:
+            cursor = self.conn.execute("SELECT key, value FROM " + self.table)
+        while True:
+            with self.lock:
+                rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for key, value in rows:
+                cached = self.cache.get(key)
+                yield key, cached if cached is not None else json.loads(value)
+
+    def iter_json(self, batch_size=1000):
+        """Yield (key, JSON text) for every record as stored, leaving the decoding to the caller"""
+        with self.lock:
+            cursor = self.conn.execute("SELECT key, value FROM " + self.table)
+        while True:
+            with self.lock:
+                rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for key, value in rows:
+                yield key, value
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM " + self.table).fetchone()[0]
+
+    def add_index(self, name, fields):
+        """Maintain a SQLite index over fields of the stored records"""
+        self.indexes[name] = fields
+        columns = ", ".join(["json_extract(value, '$." + field + "')" for field in fields])
+        with self.conn:
+            self.conn.execute("CREATE INDEX IF NOT EXISTS " + self.table + "_" + name +
+                              " ON " + self.table + " (" + columns + ")")
+
+    def find(self, name, values):
+        """Return the keys of records whose indexed fields equal values"""
+        conditions = " AND ".join(["json_extract(value, '$." + field + "') = ?" for field in self.indexes[name]])
+        with self.lock:
+            rows = self.conn.execute("SELECT key FROM " + self.table + " WHERE " + conditions, tuple(values))
+            return [row[0] for row in rows]
+
+    def find_up_to(self, name, value):
+        """Return the keys of records whose field in a one-field index is at most value (missing fields never match)"""
+        field = self.indexes[name][0]
+        with self.lock:
+            rows = self.conn.execute("SELECT key FROM " + self.table + " WHERE json_extract(value, '$." + field +
+                                     "') <= ?", (value,))
+            return [row[0] for row in rows]
+
+    def is_empty(self):
+        """Check for an empty table without counting every row"""
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM " + self.table + " LIMIT 1").fetchone() is None
+
+    def save(self, key):
+        """Write one record back after it was changed in place"""
+        self.save_many([key])
+
+    def save_many(self, keys):
+        """Write several changed records in a single transaction"""
+        rows = [(key, json.dumps(self.cache[key])) for key in keys]
+        with self.lock, self.conn:
+            # An upsert (not INSERT OR REPLACE) so update triggers on the table see the old and new record
+            self.conn.executemany("INSERT INTO " + self.table + " (key, value) VALUES (?, ?) "
+                                  "ON CONFLICT (key) DO UPDATE SET value = excluded.value", rows)
+            for key, value in rows:
+                self.hashes[key] = hash(value)
+
+    def write_many(self, records):
+        """Write a dictionary of records in a single transaction without caching them (bulk loads)"""
+        self.write_json([(key, json.dumps(value)) for key, value in records.items()])
+
+    def write_json(self, rows):
+        """Write (key, JSON text) rows in a single transaction without decoding them (snapshot restores)"""
+        with self.lock, self.conn:
+            for key, value in rows:
+                self.cache.pop(key, None)
+                self.forget(key)
+            self.conn.executemany("INSERT INTO " + self.table + " (key, value) VALUES (?, ?) "
+                                  "ON CONFLICT (key) DO UPDATE SET value = excluded.value", rows)
+
+
+def record_to_cents(account):
+    """Convert the dollar amounts of a record written before amounts were kept in cents; returns whether it changed"""
+    changed = False
+    if isinstance(account.get('balance'), float):
+        account['balance'] = to_cents(account['balance'])
+        # Holds and notes of cross-shard transfers
+        for field in ('pending_transfers', 'incoming_transfers'):
+            for entry in account.get(field, {}).values():
+                entry['amount'] = to_cents(entry['amount'])
+        changed = True
+    for loans in account.get('loans', {}).values():
+        for loan in loans:
+            # total_payable was always a float in dollars, never a whole number of cents
+            if isinstance(loan['total_payable'], float):
+                for field in LOAN_MONEY_FIELDS:
+                    if field in loan:
+                        loan[field] = to_cents(loan[field])
+                changed = True
+    return changed
+
+
+def upgrade_to_cents(store, meta_store, batch_size=10000):
+    """Rewrite every record still holding dollar floats in cents, once per database"""
+    if meta_store.get('money') == 'cents':
+        return
+    changed = {}
+    for key, record in store.iter_records():
+        if record_to_cents(record):
+            changed[key] = record
+        if len(changed) >= batch_size:
+            store.write_many(changed)
+            changed = {}
+    store.write_many(changed)
+    meta_store['money'] = 'cents'
+
+
+def publish_reload(acc_address):
+    """Tell subscribers a cached account was read again from the database or dropped from the cache"""
+    bus.publish('reload', acc_address, {})
+
+
+def reload_accounts(addresses):
+    """Pick up changes other processes made to cached accounts, publishing a 'reload' event for each"""
+    accounts.refresh(addresses)
+
+
+metrics.watch_storage(PersistentDict)
+
+connection = open_connection(DB_PATH)
+storage_lock = threading.RLock()
+
+# Records of accounts inside an account_transaction are never dropped from the cache
+accounts = PersistentDict(connection, 'accounts', storage_lock, MAX_CACHED_ACCOUNTS, held_accounts, publish_reload)
+# Every account transaction starts from the stored record, even if another process changed it
+on_hold.append(reload_accounts)
+locked_accounts = PersistentDict(connection, 'locked_accounts', storage_lock)
+# Small bookkeeping records, e.g. the state of the address allocators
+meta = PersistentDict(connection, 'meta', storage_lock)
+
+# Lookups used by account linking and switching, kept up to date by SQLite on every write
+accounts.add_index('identity', ('name', 'dob', 'home_address', 'phone_no', 'gender'))
+accounts.add_index('special_code', ('special_code',))
+# Day number of the next due installment or overdue charge on any loan (see loan_batch)
+accounts.add_index('loan_due', ('loan_due_day',))
+
+if accounts.is_empty():
+    for acc_address, account in DEFAULT_ACCOUNTS.items():
+        accounts[acc_address] = copy.deepcopy(account)
+upgrade_to_cents(accounts, meta)
@@ -0,0 +1,194 @@
+"""In-process publish/subscribe bus for account and loan changes
+
+Every change that is journaled is also published as an Event:
+    Event(op, acc_address, fields, time)
+op is the journal operation ('create', 'deposit', 'withdraw', 'transfer',
+'apply_loan', 'repay_loan', 'settle', 'password', 'loan_batch') and
+fields holds the values after the change, as in the journal. 'reload'
+(with no fields) means another process changed the account and its
+cached record was read again, or the record was dropped from the cache
+and may have changed by the time it is read back; it is not journaled.
+EVENT_KINDS groups the operations into 'account', 'balance' and 'loan'
+changes. Subscribers must treat events as read-only.
+
+A subscriber runs either synchronously, inside the operation that made
+the change (while the account is still locked, so it sees an account's
+events in order), or on its own background thread fed by a bounded
+queue, with its own copy of the event. When a background subscriber's
+queue is full the publisher either waits for room (back-pressure, the
+default) or the event is dropped and counted. Exceptions raised by a handler are counted, never
+passed back to the operation that published the event.
+
+Publishing with no subscribers costs one attribute check.
+"""
+import copy
+import threading
+import time
+from collections import deque, namedtuple
+
+Event = namedtuple('Event', 'op acc_address fields time')
+
+EVENT_KINDS = {
+    'create': 'account',
+    'password': 'account',
+    'deposit': 'balance',
+    'withdraw': 'balance',
+    'transfer': 'balance',
+    'settle': 'balance',
+    'apply_loan': 'loan',
+    'repay_loan': 'loan',
+    'loan_batch': 'loan',
+    'reload': 'account'
+}
+
+QUEUE_SIZE = 10000
+BATCH_SIZE = 256         # queued events that wake a background subscriber at once
+BATCH_INTERVAL = 0.01    # seconds before a background subscriber looks at a partial batch anyway
+
+
+def copy_fields(fields):
+    """Copy event fields for another thread, deep-copying only the lists and dictionaries"""
+    return dict((name, copy.deepcopy(value) if isinstance(value, (list, dict)) else value)
+                for name, value in fields.items())
+
+
+class Subscription:
+    """One handler attached to the bus, run inline or on a background thread"""
+
+    def __init__(self, handler, ops=None, background=False, queue_size=QUEUE_SIZE, block=True):
+        self.handler = handler
+        self.ops = None if ops is None else frozenset(ops)
+        self.background = background
+        self.queue_size = queue_size
+        self.block = block
+        self.delivered = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_error = None
+        # Background delivery: events waiting for the thread, and how many were queued and finished
+        self.pending = deque()
+        self.queued = 0
+        self.finished = 0
+        self.condition = threading.Condition(threading.Lock())
+        self.closing = False
+        self.thread = None
+        if background:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def wants(self, event):
+        """Check whether this subscription listens to an event's operation"""
+        return self.ops is None or event.op in self.ops
+
+    def deliver(self, event):
+        """Run the handler now, or queue the event for the background thread"""
+        if not self.background:
+            self._handle(event)
+            return
+        with self.condition:
+            while len(self.pending) >= self.queue_size:
+                if not self.block:
+                    self.dropped += 1
+                    return
+                self.condition.wait()
+            self.pending.append(event)
+            self.queued += 1
+            if len(self.pending) == BATCH_SIZE:
+                self.condition.notify_all()
+
+    def _handle(self, event):
+        """Call the handler, counting rather than raising its errors"""
+        try:
+            self.handler(event)
+            self.delivered += 1
+        except Exception as e:
+            self.errors += 1
+            self.last_error = e
+
+    def _run(self):
+        """Background thread: take everything queued at once and handle it, until closed"""
+        while True:
+            with self.condition:
+                while not self.pending and not self.closing:
+                    self.condition.wait(BATCH_INTERVAL)
+                if len(self.pending) < BATCH_SIZE and not self.closing:
+                    # Let a partial batch grow instead of waking for every event
+                    self.condition.wait(BATCH_INTERVAL)
+                if not self.pending:
+                    return
+                batch = list(self.pending)
+                self.pending.clear()
+                # Wake publishers waiting for room
+                self.condition.notify_all()
+            for event in batch:
+                self._handle(event)
+            with self.condition:
+                self.finished += len(batch)
+                self.condition.notify_all()
+
+    def wait(self):
+        """Block until every queued event has been handled"""
+        with self.condition:
+            while self.finished < self.queued:
+                self.condition.notify_all()
+                self.condition.wait()
+
+    def close(self):
+        """Handle what is queued, then stop the background thread"""
+        if self.thread is not None:
+            with self.condition:
+                self.closing = True
+                self.condition.notify_all()
+            self.thread.join()
+            self.thread = None
+
+
+class EventBus:
+    """Delivers published events to every subscription that wants them"""
+
+    def __init__(self):
+        # Replaced, never changed in place, so publish() can read it without a lock
+        self.subscriptions = ()
+        self.lock = threading.Lock()
+
+    def subscribe(self, handler, ops=None, background=False, queue_size=QUEUE_SIZE, block=True):
+        """Call handler(event) for events of the given operations (all by default); returns the Subscription
+
+        With background=True the handler runs on its own thread behind a
+        queue of queue_size events; block=False drops events when it is full.
+        """
+        subscription = Subscription(handler, ops, background, queue_size, block)
+        with self.lock:
+            self.subscriptions = self.subscriptions + (subscription,)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Detach a subscription, letting a background one finish its queue first"""
+        with self.lock:
+            self.subscriptions = tuple(s for s in self.subscriptions if s is not subscription)
+        subscription.close()
+
+    def publish(self, op, acc_address, fields):
+        """Send one change to the subscribers"""
+        if not self.subscriptions:
+            return
+        event = Event(op, acc_address, fields, time.time())
+        copied = None
+        for subscription in self.subscriptions:
+            if not subscription.wants(event):
+                continue
+            if subscription.background:
+                # fields may be the account's own data (e.g. its loan list), which later operations change
+                if copied is None:
+                    copied = Event(op, acc_address, copy_fields(fields), event.time)
+                subscription.deliver(copied)
+            else:
+                subscription.deliver(event)
+
+    def wait(self):
+        """Block until every background subscriber has caught up"""
+        for subscription in self.subscriptions:
+            subscription.wait()
+
+
+bus = EventBus()
@@ -0,0 +1,176 @@
+"""Append-only journal of every account, balance and loan change
+
+Each change is one JSON line holding the values after the change, so the
+journal alone can rebuild the accounts. Entries are buffered and written
+in groups; how often they reach the disk depends on the durability level:
+- 'none'  - groups are written to the OS but never fsync'd
+- 'group' - each group is fsync'd once (group commit, the default)
+- 'sync'  - every entry is fsync'd before the operation returns
+
+Usage: python journal.py <journal_path> <db_path>  (rebuild a database from a journal)
+"""
+import atexit
+import copy
+import json
+import os
+import sys
+import threading
+import time
+import events
+
+JOURNAL_PATH = os.environ.get('BANK_JOURNAL', 'bank_journal.log')
+DURABILITY = os.environ.get('BANK_JOURNAL_DURABILITY', 'group')
+DURABILITY_LEVELS = ('none', 'group', 'sync')
+
+GROUP_SIZE = 256         # entries written together
+GROUP_INTERVAL = 0.05    # seconds before a partial group is written anyway
+
+journal_file = None
+durability = DURABILITY
+_buffer = []
+_lock = threading.Lock()
+_flusher = None
+
+
+def open_journal(path=JOURNAL_PATH, level=DURABILITY):
+    """Start appending entries to the journal at path"""
+    global journal_file, durability, _flusher
+    if level not in DURABILITY_LEVELS:
+        raise ValueError("Unknown durability level: " + level)
+    close_journal()
+    with _lock:
+        journal_file = open(path, 'a')
+        durability = level
+    if level != 'sync':
+        _flusher = threading.Thread(target=_flush_periodically, args=(journal_file,), daemon=True)
+        _flusher.start()
+
+
+def close_journal():
+    """Write any buffered entries and stop journaling"""
+    global journal_file
+    with _lock:
+        if journal_file is None:
+            return
+        _write_buffer()
+        journal_file.close()
+        journal_file = None
+
+
+def record(op, acc_address, **fields):
+    """Publish one change on the event bus and append it to the journal (while one is open)"""
+    events.bus.publish(op, acc_address, fields)
+    if journal_file is None:
+        return
+    line = json.dumps(dict(fields, op=op, acc=acc_address, time=time.time()))
+    with _lock:
+        if journal_file is None:
+            return
+        _buffer.append(line)
+        if durability == 'sync' or len(_buffer) >= GROUP_SIZE:
+            _write_buffer()
+
+
+def flush():
+    """Write buffered entries now, honouring the durability level"""
+    with _lock:
+        if journal_file is not None:
+            _write_buffer()
+
+
+def _write_buffer():
+    """Write the buffered group to the journal file (caller holds _lock)"""
+    if not _buffer:
+        return
+    journal_file.write("\n".join(_buffer) + "\n")
+    del _buffer[:]
+    journal_file.flush()
+    if durability != 'none':
+        os.fsync(journal_file.fileno())
+
+
+def _flush_periodically(file):
+    """Background thread writing partial groups so no entry waits longer than GROUP_INTERVAL"""
+    while journal_file is file:
+        time.sleep(GROUP_INTERVAL)
+        flush()
+
+
+atexit.register(close_journal)
+
+
+def read_journal(path, start=0):
+    """Yield the entries of a journal file in order, from byte offset start"""
+    with open(path, 'rb') as lines:
+        lines.seek(start)
+        for line in lines:
+            line = line.strip()
+            if line:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # A torn final line from a crash mid-write
+                    break
+
+
+def apply_entry(accounts, entry):
+    """Apply one journal entry to an accounts mapping and return the addresses it changed"""
+    op = entry['op']
+    acc_address = entry['acc']
+
+    if op == 'create':
+        accounts[acc_address] = entry['account']
+        return [acc_address]
+    elif op == 'settle':
+        for address, balance in entry['balances'].items():
+            accounts[address]['balance'] = balance
+        return list(entry['balances'])
+
+    account = accounts[acc_address]
+    if 'balance' in entry:
+        account['balance'] = entry['balance']
+    if 'password' in entry:
+        account['password'] = entry['password']
+    if 'loan_due_day' in entry:
+        account['loan_due_day'] = entry['loan_due_day']
+    # Holds and notes of cross-shard transfers (see shard_worker)
+    for field in ('pending_transfers', 'incoming_transfers'):
+        if field in entry:
+            if entry[field]:
+                account[field] = entry[field]
+            else:
+                account.pop(field, None)
+    if op == 'transfer':
+        accounts[entry['to']]['balance'] = entry['to_balance']
+        return [acc_address, entry['to']]
+    elif 'loan_type' in entry and op in ('apply_loan', 'repay_loan', 'loan_batch'):
+        account.setdefault('loans', {})[entry['loan_type']] = entry['loans']
+    return [acc_address]
+
+
+def replay(path, accounts, initial_accounts=None, start=0):
+    """Rebuild accounts from a journal (from byte offset start) on top of initial_accounts; returns the entry count"""
+    for acc_address, account in (initial_accounts or {}).items():
+        accounts[acc_address] = copy.deepcopy(account)
+    count = 0
+    for entry in read_journal(path, start):
+        apply_entry(accounts, entry)
+        count += 1
+    return count
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python journal.py <journal_path> <db_path>")
+        sys.exit(1)
+    if os.path.exists(sys.argv[2]):
+        print("Refusing to overwrite existing database " + sys.argv[2])
+        sys.exit(1)
+    os.environ['BANK_DB'] = ':memory:'
+    from data_storage import DEFAULT_ACCOUNTS, PersistentDict, open_connection
+    rebuilt = {}
+    count = replay(sys.argv[1], rebuilt, DEFAULT_ACCOUNTS)
+    store = PersistentDict(open_connection(sys.argv[2]), 'accounts')
+    store.cache.update(rebuilt)
+    store.save_many(rebuilt)
+    print("Replayed " + str(count) + " entries into " + sys.argv[2])
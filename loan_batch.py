@@ -0,0 +1,201 @@
+"""Nightly loan batch: due installments, overdue interest, late fees and auto-debit
+
+Installment k of a loan falls due on the start date plus the months
+loan_engine.due_month() gives. Each night every loan with an installment
+falling due, or with an amount already overdue, is brought up to date:
+- OVERDUE_INTEREST_RATE a year is charged on the overdue amount for each
+  day since the last run
+- with auto-debit, the overdue amount is taken from the account balance
+  (as much as the balance covers)
+- a late fee of LATE_FEE_RATE of the installment is charged for each
+  installment that falls due while the loan is already behind (an
+  installment falling due on a loan that is up to date is not fined)
+Charges go into penalty_amount and remaining_amount, rounded to the cent
+once per charge; the flat interest in total_payable is unchanged.
+
+The batch is incremental. Every account keeps loan_due_day, the day
+number (date.toordinal()) of the next event on any of its loans, in an
+index, so a night only reads the accounts due that night and only
+rewrites the loans that changed. Accounts are processed in batches: a
+batch is locked, loaded into a loan_book.LoanBook, and its due rows are
+picked out in one pass over the columns. The first run (or --full) looks
+at every account with loans.
+
+Usage: python loan_batch.py [dd/mm/yyyy] [--auto-debit] [--full]
+"""
+import sys
+import time
+import journal
+import money
+from loan_book import NO_DATE, build_loan_book, date_to_day
+from loan_engine import installment_due_day, installments_due_by
+from transactions import account_transaction
+
+LATE_FEE_RATE = 0.02          # of the installment, for each installment missed
+OVERDUE_INTEREST_RATE = 0.18  # a year, accrued daily on the overdue amount
+BATCH_SIZE = 10000
+
+
+def overdue_amount(book, row):
+    """Amount of the installments already due, plus charges, that is still unpaid"""
+    overdue = (book.installments_due[row] * book.suggested_installment[row] + book.penalty_amount[row] -
+               book.paid_amount[row])
+    return max(min(overdue, book.remaining_amount[row]), 0)
+
+
+def select_rows(book, today):
+    """Rows with an installment falling due by today, or an overdue amount to charge interest on"""
+    rows = []
+    for row, (remaining, next_due, accrued, due, installment, penalty, paid) in enumerate(zip(
+            book.remaining_amount, book.next_due_day, book.accrued_day, book.installments_due,
+            book.suggested_installment, book.penalty_amount, book.paid_amount)):
+        if remaining <= 0:
+            continue
+        if (next_due != NO_DATE and next_due <= today) or (accrued < today and due * installment + penalty - paid > 0):
+            rows.append(row)
+    return rows
+
+
+def charge(book, row, amount):
+    """Add a late fee or overdue interest to a loan"""
+    book.penalty_amount[row] += amount
+    book.remaining_amount[row] += amount
+
+
+def update_row(book, row, today, balances=None):
+    """Bring one loan up to today; returns (amount debited, amount charged)
+
+    balances maps account addresses to the balances to auto-debit from;
+    with None nothing is debited.
+    """
+    charged = 0
+    days = today - book.accrued_day[row]
+    if days > 0:
+        overdue = overdue_amount(book, row)
+        if overdue > 0:
+            charged = money.apply_rate(overdue, OVERDUE_INTEREST_RATE, days, 365)
+            charge(book, row, charged)
+        book.accrued_day[row] = today
+
+    # Whether the loan was already behind before today's installments fell due
+    behind = overdue_amount(book, row) > 0
+    newly_due = 0
+    if book.next_due_day[row] != NO_DATE and book.next_due_day[row] <= today:
+        total_installments = book.total_installments[row]
+        due = installments_due_by(book.start_day[row], today, total_installments)
+        newly_due = due - book.installments_due[row]
+        book.installments_due[row] = due
+        if due < total_installments:
+            book.next_due_day[row] = installment_due_day(book.start_day[row], due + 1, total_installments)
+        else:
+            book.next_due_day[row] = NO_DATE
+
+    debited = 0
+    if balances is not None:
+        acc_address = book.owners[row][0]
+        debited = min(overdue_amount(book, row), balances[acc_address])
+        if debited > 0:
+            balances[acc_address] -= debited
+            book.paid_amount[row] += debited
+            book.remaining_amount[row] -= debited
+            book.last_payment_day[row] = today
+            if overdue_amount(book, row) == 0:
+                book.installments_paid[row] = max(book.installments_paid[row], book.installments_due[row])
+        else:
+            debited = 0
+
+    # An installment falling due on a current loan is not late yet
+    if newly_due and behind and overdue_amount(book, row) > 0:
+        fee = money.apply_rate(book.suggested_installment[row] * newly_due, LATE_FEE_RATE)
+        charge(book, row, fee)
+        charged += fee
+    return debited, charged
+
+
+def next_event_day(book, row, today):
+    """Day the batch next needs to look at a loan (None once it is repaid)"""
+    if book.remaining_amount[row] <= 0:
+        return None
+    if overdue_amount(book, row) > 0:
+        return today + 1
+    if book.next_due_day[row] == NO_DATE:
+        return None
+    return book.next_due_day[row]
+
+
+def run_chunk(accounts, addresses, today, auto_debit, summary):
+    """Run the batch for one group of accounts under their locks"""
+    with account_transaction(*addresses):
+        book = build_loan_book(dict((acc_address, accounts[acc_address]) for acc_address in addresses))
+        balances = None
+        if auto_debit:
+            balances = dict((acc_address, accounts[acc_address]['balance']) for acc_address in addresses)
+
+        changed = {}
+        for row in select_rows(book, today):
+            debited, charged = update_row(book, row, today, balances)
+            acc_address, loan_type = book.owners[row]
+            changed.setdefault(acc_address, set()).add(loan_type)
+            summary['loans'] += 1
+            summary['debited'] += debited
+            summary['charged'] += charged
+
+        saved = []
+        for acc_address in addresses:
+            account = accounts[acc_address]
+            days = [next_event_day(book, row, today) for loan_type in account.get('loans', {})
+                    for row in book.rows.get((acc_address, loan_type), [])]
+            days = [day for day in days if day is not None]
+            due_day = min(days) if days else None
+            loan_types = changed.get(acc_address, ())
+            if not loan_types and account.get('loan_due_day') == due_day:
+                continue
+            for loan_type in loan_types:
+                # Loans the auto-debit paid off are dropped, as repay_loan does
+                account['loans'][loan_type] = [book.loan(row) for row in book.rows[(acc_address, loan_type)]
+                                               if book.remaining_amount[row] > 0]
+            if balances is not None:
+                account['balance'] = balances[acc_address]
+            account['loan_due_day'] = due_day
+            saved.append(acc_address)
+
+        accounts.save_many(saved)
+        for acc_address in saved:
+            account = accounts[acc_address]
+            if not changed.get(acc_address):
+                journal.record('loan_batch', acc_address, loan_due_day=account['loan_due_day'])
+            for loan_type in changed.get(acc_address, ()):
+                journal.record('loan_batch', acc_address, loan_type=loan_type, loans=account['loans'][loan_type],
+                               balance=account['balance'], loan_due_day=account['loan_due_day'])
+        summary['accounts'] += len(saved)
+
+
+def run_batch(accounts, today=None, auto_debit=False, full=False, batch_size=BATCH_SIZE):
+    """Bring every loan due by today (dd/mm/yyyy, default today) up to date and return a summary
+
+    Only accounts whose loan_due_day has come are read, unless full is set.
+    """
+    today = date_to_day(today or time.strftime("%d/%m/%Y", time.localtime()))
+    if full:
+        addresses = [acc_address for acc_address, account in accounts.iter_records() if account.get('loans')]
+    else:
+        addresses = accounts.find_up_to('loan_due', today)
+    summary = {'accounts': 0, 'loans': 0, 'debited': 0, 'charged': 0}
+    for i in range(0, len(addresses), batch_size):
+        run_chunk(accounts, addresses[i:i + batch_size], today, auto_debit, summary)
+    return summary
+
+
+if __name__ == "__main__":
+    from data_storage import accounts, meta
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    today = args[0] if args else time.strftime("%d/%m/%Y", time.localtime())
+    journal.open_journal()
+    # The first run looks at every loan, later ones only at the accounts due
+    full = '--full' in sys.argv or meta.get('loan_batch') is None
+    summary = run_batch(accounts, today, '--auto-debit' in sys.argv, full)
+    meta['loan_batch'] = {'last_run': today}
+    print("Loan batch for " + today + ": " + str(summary['loans']) + " loans in " + str(summary['accounts']) +
+          " accounts updated")
+    print("Auto-debited: $" + money.format_amount(summary['debited']) + "  Late fees and interest: $" +
+          money.format_amount(summary['charged']))
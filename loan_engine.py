@@ -0,0 +1,182 @@
+"""Amortization schedules and cash-flow projections for the whole loan book
+
+Loans charge flat interest: total_payable is split into total_installments
+equal installments over a one-year term, installment k falling due
+k * 12 / total_installments months after the start date (rounded up to a
+whole month). Whatever is still remaining is spread evenly over the
+installments not yet paid, in whole cents that add up to it exactly.
+
+Every loan with the same loan type, number of installments, installments
+paid and start month shares one schedule shape, so project_portfolio()
+first sums the remaining amounts per shape (one dictionary update per
+loan) and then expands each shape's schedule once. Risk reports over
+hundreds of thousands of loans take a fraction of a second this way,
+without needing NumPy.
+
+Usage: python loan_engine.py [months]
+"""
+import calendar
+import datetime
+import sys
+import time
+from money import format_amount, split
+
+TERM_MONTHS = 12
+ALL_LOANS = 'All Loans'
+
+
+def due_month(installment_no, total_installments):
+    """Months after the start date at which an installment falls due"""
+    return -(-installment_no * TERM_MONTHS // total_installments)
+
+
+def add_months(day, months):
+    """Move a day number (date.toordinal()) forward by whole months, keeping the day of the month where it exists"""
+    date = datetime.date.fromordinal(day)
+    year, month = divmod(date.month - 1 + months, 12)
+    year += date.year
+    return datetime.date(year, month + 1, min(date.day, calendar.monthrange(year, month + 1)[1])).toordinal()
+
+
+def months_between(start_day, day):
+    """Whole months from start_day to day (day numbers), counting a month once its day of the month is reached"""
+    start, end = datetime.date.fromordinal(start_day), datetime.date.fromordinal(day)
+    months = (end.year - start.year) * 12 + end.month - start.month
+    if months > 0 and add_months(start_day, months) > day:
+        months -= 1
+    return months
+
+
+def installments_due_by(start_day, day, total_installments):
+    """How many installments of a loan started on start_day have fallen due by day"""
+    # due_month(k) <= months exactly when k <= months * total_installments / TERM_MONTHS
+    return min(max(months_between(start_day, day), 0) * total_installments // TERM_MONTHS, total_installments)
+
+
+def installment_due_day(start_day, installment_no, total_installments):
+    """Day number on which an installment of a loan started on start_day falls due"""
+    return add_months(start_day, due_month(installment_no, total_installments))
+
+
+def month_number(date_str):
+    """Convert a dd/mm/yyyy date into a running month count"""
+    day, month, year = date_str.split('/')
+    return int(year) * 12 + int(month) - 1
+
+
+def first_unpaid_installment(total_installments, installments_paid):
+    """Return the number of the next installment due (the last one if all were paid early)"""
+    return min(installments_paid + 1, total_installments)
+
+
+def amortization_schedule(loan):
+    """Return (installment_no, months_after_start, payment, remaining_after) for each unpaid installment"""
+    total_installments = loan['total_installments']
+    first = first_unpaid_installment(total_installments, loan['installments_paid'])
+    payments = split(loan['remaining_amount'], total_installments - first + 1)
+
+    schedule = []
+    remaining = loan['remaining_amount']
+    for installment_no, payment in zip(range(first, total_installments + 1), payments):
+        remaining -= payment
+        schedule.append((installment_no, due_month(installment_no, total_installments), payment, remaining))
+    return schedule
+
+
+def iter_loans(accounts):
+    """Yield (loan_type, loan) for every active loan of every account"""
+    for account in accounts.values():
+        for loan_type, loans in account.get('loans', {}).items():
+            for loan in loans:
+                if loan['remaining_amount'] > 0:
+                    yield loan_type, loan
+
+
+def project_portfolio(loans, months=TERM_MONTHS, today=None):
+    """Project monthly cash in and outstanding balance per loan type and for all loans
+
+    loans is an iterable of (loan_type, loan) pairs. Returns a dictionary from
+    loan type (and ALL_LOANS) to a list of {'month', 'cash_in', 'outstanding'}
+    rows; month 0 holds installments that are already overdue.
+    """
+    current = month_number(today or time.strftime("%d/%m/%Y", time.localtime()))
+
+    # Sum remaining amounts per schedule shape
+    shapes = {}
+    start_months = {}
+    for loan_type, loan in loans:
+        start = start_months.get(loan['start_date'])
+        if start is None:
+            start = start_months[loan['start_date']] = month_number(loan['start_date'])
+        key = (loan_type, loan['total_installments'], loan['installments_paid'], current - start)
+        shapes[key] = shapes.get(key, 0) + loan['remaining_amount']
+    return expand_shapes(shapes, months)
+
+
+def project_loan_book(book, months=TERM_MONTHS, today=None):
+    """Same projection as project_portfolio, read straight from a loan_book.LoanBook's columns"""
+    from loan_book import LOAN_TYPE_NAMES
+    current = month_number(today or time.strftime("%d/%m/%Y", time.localtime()))
+
+    shapes = {}
+    start_months = {}
+    for type_code, total_installments, installments_paid, start_day, remaining in zip(
+            book.loan_type, book.total_installments, book.installments_paid, book.start_day, book.remaining_amount):
+        if remaining <= 0:
+            continue
+        start = start_months.get(start_day)
+        if start is None:
+            start_date = datetime.date.fromordinal(start_day)
+            start = start_months[start_day] = start_date.year * 12 + start_date.month - 1
+        key = (LOAN_TYPE_NAMES[type_code], total_installments, installments_paid, current - start)
+        shapes[key] = shapes.get(key, 0) + remaining
+    return expand_shapes(shapes, months)
+
+
+def expand_shapes(shapes, months):
+    """Turn remaining amounts per schedule shape into monthly projection rows"""
+    cash_in = {ALL_LOANS: [0] * (months + 1)}
+    outstanding = {ALL_LOANS: 0}
+    for (loan_type, total_installments, installments_paid, elapsed), remaining in shapes.items():
+        if loan_type not in cash_in:
+            cash_in[loan_type] = [0] * (months + 1)
+            outstanding[loan_type] = 0
+        outstanding[loan_type] += remaining
+        outstanding[ALL_LOANS] += remaining
+
+        first = first_unpaid_installment(total_installments, installments_paid)
+        payments = split(remaining, total_installments - first + 1)
+        for installment_no, payment in zip(range(first, total_installments + 1), payments):
+            month = max(due_month(installment_no, total_installments) - elapsed, 0)
+            if month <= months:
+                cash_in[loan_type][month] += payment
+                cash_in[ALL_LOANS][month] += payment
+
+    projections = {}
+    for loan_type, flows in cash_in.items():
+        balance = outstanding[loan_type]
+        rows = []
+        for month, amount in enumerate(flows):
+            balance -= amount
+            rows.append({'month': month, 'cash_in': amount, 'outstanding': max(balance, 0)})
+        projections[loan_type] = rows
+    return projections
+
+
+def print_risk_report(projections):
+    """Print a month-by-month cash-flow table for each loan type"""
+    for loan_type in sorted(projections):
+        print("\n" + "="*50)
+        print(loan_type.upper())
+        print("="*50)
+        print("Month".ljust(10) + "Cash In".rjust(18) + "Outstanding".rjust(22))
+        for row in projections[loan_type]:
+            label = "Overdue" if row['month'] == 0 else str(row['month'])
+            print(label.ljust(10) + ("$" + format_amount(row['cash_in'])).rjust(18) +
+                  ("$" + format_amount(row['outstanding'])).rjust(22))
+
+
+if __name__ == "__main__":
+    from data_storage import accounts
+    horizon = int(sys.argv[1]) if len(sys.argv) > 1 else TERM_MONTHS
+    print_risk_report(project_portfolio(iter_loans(accounts), horizon))
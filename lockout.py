@@ -0,0 +1,112 @@
+"""Failed-login tracking and account lockouts that expire on their own
+
+Each tracked account has one entry [attempts_left, expires_at]:
+- while attempts_left > 0 it counts failed passwords, and is forgotten
+  window_seconds after the first failure
+- once attempts_left reaches 0 the account is locked until expires_at
+
+Every entry's expiry time also sits in a heap, so expired entries are
+dropped oldest-first by expire() (run on every call) instead of waiting
+for the same account to log in again. If more than max_entries accounts
+are tracked at once, the entries closest to expiring are dropped early,
+so memory stays bounded under any amount of failed-login traffic.
+Nothing here ever sleeps.
+"""
+import heapq
+import threading
+import time
+
+
+class LockoutManager:
+    """Failed attempt counters and lockouts with automatic expiry"""
+
+    def __init__(self, max_attempts=3, lockout_seconds=60, window_seconds=None, max_entries=1000000, clock=time.time):
+        self.max_attempts = max_attempts
+        self.lockout_seconds = lockout_seconds
+        self.window_seconds = window_seconds if window_seconds is not None else lockout_seconds
+        self.max_entries = max_entries
+        self.clock = clock
+        # acc_address -> [attempts_left, expires_at]
+        self.entries = {}
+        # (expires_at, acc_address); entries whose expiry changed since leave stale items behind
+        self.expiry_heap = []
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _set_entry(self, acc_address, attempts_left, expires_at):
+        """Store an entry and schedule its expiry (caller holds self.lock)"""
+        entry = self.entries[acc_address] = [attempts_left, expires_at]
+        heapq.heappush(self.expiry_heap, (expires_at, acc_address))
+        if len(self.expiry_heap) > 2 * self.max_entries:
+            # Too many stale items: rebuild the heap from the current entries
+            self.expiry_heap = [(entry_expires_at, address) for address, (attempts, entry_expires_at) in self.entries.items()]
+            heapq.heapify(self.expiry_heap)
+        return entry
+
+    def _drop_earliest(self):
+        """Pop the earliest heap item, removing its entry if still current (caller holds self.lock)"""
+        expires_at, acc_address = heapq.heappop(self.expiry_heap)
+        entry = self.entries.get(acc_address)
+        if entry is not None and entry[1] == expires_at:
+            del self.entries[acc_address]
+
+    def _expire(self, now):
+        """Drop every entry that has expired by now (caller holds self.lock)"""
+        while self.expiry_heap and self.expiry_heap[0][0] <= now:
+            self._drop_earliest()
+
+    def expire(self, now=None):
+        """Drop every expired entry and return how many accounts are still tracked"""
+        with self.lock:
+            self._expire(self.clock() if now is None else now)
+            return len(self.entries)
+
+    def check(self, acc_address):
+        """Return (True, seconds_remaining) if the account is locked, else (False, 0)"""
+        now = self.clock()
+        with self.lock:
+            self._expire(now)
+            entry = self.entries.get(acc_address)
+            if entry is not None and entry[0] == 0:
+                return True, max(int(entry[1] - now), 1)
+        return False, 0
+
+    def attempts_left(self, acc_address):
+        """Password attempts left before the account is locked"""
+        with self.lock:
+            self._expire(self.clock())
+            entry = self.entries.get(acc_address)
+            return self.max_attempts if entry is None else entry[0]
+
+    def record_failure(self, acc_address):
+        """Count a wrong password and return the attempts left (0 means the account is now locked)"""
+        now = self.clock()
+        with self.lock:
+            self._expire(now)
+            entry = self.entries.get(acc_address)
+            if entry is None:
+                while len(self.entries) >= self.max_entries:
+                    self._drop_earliest()
+                entry = self._set_entry(acc_address, self.max_attempts, now + self.window_seconds)
+            if entry[0] == 0:
+                return 0
+            if entry[0] == 1:
+                self._set_entry(acc_address, 0, now + self.lockout_seconds)
+                return 0
+            entry[0] -= 1
+            return entry[0]
+
+    def record_success(self, acc_address):
+        """Forget the failed attempts of an account that logged in"""
+        with self.lock:
+            entry = self.entries.get(acc_address)
+            if entry is not None and entry[0] > 0:
+                del self.entries[acc_address]
+
+    def lock_until(self, acc_address, unlock_time):
+        """Lock an account until unlock_time (used to restore saved lockouts)"""
+        with self.lock:
+            if unlock_time > self.clock():
+                self._set_entry(acc_address, 0, unlock_time)
@@ -0,0 +1,414 @@
+"""Per-operation counters, latency histograms and storage-access counts
+
+Metrics are off unless the BANK_METRICS environment variable names a file
+when the program starts. Then every function decorated with @timed(name)
+counts its calls, failures (a (False, message) result) and exceptions,
+records its latency in a Histogram, and counts the SQLite reads, writes,
+index lookups and scans it makes; measure(name) does the same for a
+block of code. Time spent waiting at input() is left out, so menu
+screens measure their own work only.
+When metrics are off, timed() hands back the undecorated function and
+measure() an empty context, so they cost nothing.
+
+Results are written when the program exits, or whenever the process gets
+SIGUSR1:
+- BANK_METRICS             text report
+- BANK_METRICS_PROMETHEUS  Prometheus text exposition format
+- BANK_PROFILE             cProfile dump of the main thread (read it with pstats)
+
+Usage: python metrics.py <cprofile_dump> [lines]  (print the slowest functions in a dump)
+"""
+import atexit
+import builtins
+import cProfile
+import os
+import signal
+import sys
+import threading
+import time
+from contextlib import nullcontext
+
+REPORT_PATH = os.environ.get('BANK_METRICS', '')
+PROMETHEUS_PATH = os.environ.get('BANK_METRICS_PROMETHEUS', '')
+PROFILE_PATH = os.environ.get('BANK_PROFILE', '')
+ENABLED = bool(REPORT_PATH or PROMETHEUS_PATH)
+
+SIGNIFICANT_BITS = 6   # 64 sub-buckets per power of two, so a recorded latency is within about 3%
+PERCENTILES = (0.5, 0.9, 0.99, 0.999)
+# Upper bounds (seconds) of the Prometheus histogram buckets
+PROMETHEUS_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                      2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """HDR-style histogram of whole microseconds in log-linear buckets"""
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value):
+        """Add one value (microseconds)"""
+        shift = value.bit_length() - SIGNIFICANT_BITS
+        if shift < 0:
+            shift = 0
+        # Values below 2 ** SIGNIFICANT_BITS get a bucket each; above that a bucket keeps the top bits
+        bucket = (shift << SIGNIFICANT_BITS) + (value >> shift)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def bucket_bounds(self, bucket):
+        """Lowest and highest value a bucket holds"""
+        shift = bucket >> SIGNIFICANT_BITS
+        low = (bucket & ((1 << SIGNIFICANT_BITS) - 1)) << shift
+        return low, low + (1 << shift) - 1
+
+    def percentile(self, fraction):
+        """Value (microseconds) that fraction of the recorded values are at or below"""
+        rank = fraction * self.count
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return min(self.bucket_bounds(bucket)[1], self.max)
+        return self.max
+
+    def count_up_to(self, value):
+        """How many recorded values are at or below value (to bucket precision)"""
+        return sum(count for bucket, count in self.counts.items() if self.bucket_bounds(bucket)[1] <= value)
+
+    def mean(self):
+        """Average value in microseconds"""
+        return self.total / self.count if self.count else 0.0
+
+    def merge(self, other):
+        """Add the values recorded in another histogram"""
+        for bucket, count in list(other.counts.items()):
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+
+class OperationStats:
+    """Calls, outcomes, latencies and storage accesses of one operation"""
+
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.errors = 0
+        self.latency = Histogram()
+        self.storage = {}
+
+    def record(self, elapsed, result, raised):
+        """Count one call that took elapsed nanoseconds"""
+        self.calls += 1
+        if raised:
+            self.errors += 1
+        elif type(result) is tuple and len(result) == 2 and result[0] is False:
+            self.failures += 1
+        self.latency.record(elapsed // 1000 if elapsed > 0 else 0)
+
+    def count_storage(self, kind, count=1):
+        """Count accesses of one kind to the SQLite store"""
+        self.storage[kind] = self.storage.get(kind, 0) + count
+
+    def merge(self, other):
+        """Add another thread's counts for the same operation"""
+        self.calls += other.calls
+        self.failures += other.failures
+        self.errors += other.errors
+        self.latency.merge(other.latency)
+        for kind, count in list(other.storage.items()):
+            self.count_storage(kind, count)
+
+
+# Every thread records into its own stats (so recording needs no lock); reports add them up
+thread_stats = []
+stats_lock = threading.Lock()
+
+
+class ThreadState(threading.local):
+    """The running operation of a thread, how long it has waited at input() in all, and its stats"""
+    operation = None
+    waited = 0
+
+    def __init__(self):
+        self.stats = {}
+        with stats_lock:
+            thread_stats.append(self.stats)
+
+
+_state = ThreadState()
+_profiler = None
+
+
+def get_stats(name):
+    """This thread's stats of an operation, created on first use"""
+    stats = _state.stats
+    operation = stats.get(name)
+    if operation is None:
+        operation = stats[name] = OperationStats()
+    return operation
+
+
+def collect():
+    """Every operation's stats, added up over all threads"""
+    collected = {}
+    with stats_lock:
+        every_thread = list(thread_stats)
+    for stats in every_thread:
+        for name, operation in list(stats.items()):
+            collected.setdefault(name, OperationStats()).merge(operation)
+    return collected
+
+
+def timed(name):
+    """Decorator recording the calls and latency of a function as operation name (no-op when disabled)"""
+    def decorate(function):
+        if not ENABLED:
+            return function
+
+        def wrapper(*args, **kwargs):
+            state = _state
+            outer = state.operation
+            waited = state.waited
+            state.operation = name
+            start = time.perf_counter_ns()
+            try:
+                result = function(*args, **kwargs)
+            except BaseException:
+                get_stats(name).record(time.perf_counter_ns() - start - state.waited + waited, None, True)
+                raise
+            finally:
+                state.operation = outer
+            operation = state.stats.get(name) or get_stats(name)
+            operation.record(time.perf_counter_ns() - start - state.waited + waited, result, False)
+            return result
+        wrapper.__name__ = function.__name__
+        wrapper.__doc__ = function.__doc__
+        wrapper.__wrapped__ = function
+        return wrapper
+    return decorate
+
+
+class _Measure:
+    """Context manager form of timed()"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        state = _state
+        self.outer = state.operation
+        self.waited = state.waited
+        state.operation = self.name
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        state = _state
+        get_stats(self.name).record(time.perf_counter_ns() - self.start - state.waited + self.waited, None,
+                                    exc_type is not None)
+        state.operation = self.outer
+        return False
+
+
+_NOTHING = nullcontext()
+
+
+def measure(name):
+    """Context manager recording a block of code as operation name (does nothing when disabled)"""
+    if not ENABLED:
+        return _NOTHING
+    return _Measure(name)
+
+
+def count_storage(kind, count=1):
+    """Count accesses to the store against the running operation"""
+    get_stats(_state.operation or '(outside operations)').count_storage(kind, count)
+
+
+# PersistentDict methods that reach SQLite, and the kind of access each one counts as
+STORAGE_METHODS = {
+    '__delitem__': 'deletes',
+    'save_many': 'writes',
+    'write_json': 'writes',
+    'find': 'index lookups',
+    'find_up_to': 'index lookups',
+    '__iter__': 'scans',
+    'iter_records': 'scans',
+    '__len__': 'scans'
+}
+
+
+def watch_storage(store_class):
+    """Count the SQLite accesses of a PersistentDict-like class per operation (does nothing when disabled)"""
+    if not ENABLED or getattr(store_class, 'watched', False):
+        return
+    load = store_class.__getitem__
+    contains = store_class.__contains__
+
+    # Records already in the cache never reach SQLite
+    def getitem(self, key):
+        if key not in self.cache:
+            count_storage('reads')
+        return load(self, key)
+
+    def has_key(self, key):
+        if key not in self.cache:
+            count_storage('reads')
+        return contains(self, key)
+    store_class.__getitem__ = getitem
+    store_class.__contains__ = has_key
+
+    for method_name, kind in STORAGE_METHODS.items():
+        method = getattr(store_class, method_name, None)
+        if method is not None:
+            setattr(store_class, method_name, counting(method, kind))
+    store_class.watched = True
+
+
+def counting(method, kind):
+    """Wrap a store method so each call counts as one access of kind (one per row for writes)"""
+    if kind == 'writes':
+        def wrapper(self, rows, *args):
+            rows = list(rows)
+            count_storage(kind, len(rows))
+            return method(self, rows, *args)
+    else:
+        def wrapper(self, *args):
+            count_storage(kind)
+            return method(self, *args)
+    wrapper.__name__ = method.__name__
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+
+def _input(prompt=''):
+    """builtins.input, keeping count of how long this thread waited for the user"""
+    start = time.perf_counter_ns()
+    try:
+        return _original_input(prompt)
+    finally:
+        _state.waited += time.perf_counter_ns() - start
+
+
+def start_profile():
+    """Start profiling this thread with cProfile"""
+    global _profiler
+    if _profiler is None:
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+
+
+def dump_profile(path):
+    """Write what has been profiled so far to path, and carry on profiling"""
+    if _profiler is not None:
+        _profiler.disable()
+        _profiler.dump_stats(path)
+        _profiler.enable()
+
+
+def format_report():
+    """Text report: one block per operation with calls, outcomes, latency percentiles and storage accesses"""
+    lines = ["OPERATION METRICS (latencies in microseconds)", "=" * 50]
+    stats = collect()
+    for name in sorted(stats):
+        operation = stats[name]
+        lines.append(name)
+        if operation.calls:
+            latency = operation.latency
+            lines.append("  calls: " + str(operation.calls) + "  failures: " + str(operation.failures) +
+                         "  errors: " + str(operation.errors))
+            lines.append("  mean: " + str(round(latency.mean(), 1)) + "  " +
+                         "  ".join("p" + str(fraction * 100).rstrip('0').rstrip('.') + ": " +
+                                   str(latency.percentile(fraction)) for fraction in PERCENTILES) +
+                         "  max: " + str(latency.max))
+        if operation.storage:
+            lines.append("  storage: " + ", ".join(
+                kind + " " + str(count) for kind, count in sorted(operation.storage.items())))
+    return "\n".join(lines) + "\n"
+
+
+def format_prometheus():
+    """The metrics in Prometheus text exposition format"""
+    lines = ["# HELP bank_operation_seconds Latency of banking operations",
+             "# TYPE bank_operation_seconds histogram"]
+    outcomes = []
+    storage = []
+    stats = collect()
+    for name in sorted(stats):
+        operation = stats[name]
+        label = 'op="' + name.replace('\\', '\\\\').replace('"', '\\"') + '"'
+        latency = operation.latency
+        if operation.calls:
+            for bound in PROMETHEUS_BUCKETS:
+                lines.append("bank_operation_seconds_bucket{" + label + ',le="' + str(bound) + '"} ' +
+                             str(latency.count_up_to(int(bound * 1000000))))
+            lines.append("bank_operation_seconds_bucket{" + label + ',le="+Inf"} ' + str(latency.count))
+            lines.append("bank_operation_seconds_sum{" + label + "} " + str(latency.total / 1000000))
+            lines.append("bank_operation_seconds_count{" + label + "} " + str(latency.count))
+            outcomes.append("bank_operation_failures_total{" + label + "} " + str(operation.failures))
+            outcomes.append("bank_operation_errors_total{" + label + "} " + str(operation.errors))
+        for kind, count in sorted(operation.storage.items()):
+            storage.append("bank_storage_accesses_total{" + label + ',kind="' + kind.replace(' ', '_') + '"} ' +
+                           str(count))
+    lines.append("# HELP bank_operation_failures_total Operations that returned a failure")
+    lines.append("# TYPE bank_operation_failures_total counter")
+    lines.extend(line for line in outcomes if line.startswith("bank_operation_failures"))
+    lines.append("# HELP bank_operation_errors_total Operations that raised an exception")
+    lines.append("# TYPE bank_operation_errors_total counter")
+    lines.extend(line for line in outcomes if line.startswith("bank_operation_errors"))
+    lines.append("# HELP bank_storage_accesses_total SQLite reads, writes, lookups and scans by each operation")
+    lines.append("# TYPE bank_storage_accesses_total counter")
+    lines.extend(storage)
+    return "\n".join(lines) + "\n"
+
+
+def write_file(path, text):
+    """Replace a file in one step, so a scraper never reads half of it"""
+    with open(path + '.tmp', 'w') as f:
+        f.write(text)
+    os.replace(path + '.tmp', path)
+
+
+def write_all(*args):
+    """Write every configured output now (also the SIGUSR1 handler)"""
+    if REPORT_PATH:
+        write_file(REPORT_PATH, format_report())
+    if PROMETHEUS_PATH:
+        write_file(PROMETHEUS_PATH, format_prometheus())
+    if PROFILE_PATH:
+        dump_profile(PROFILE_PATH)
+
+
+def reset():
+    """Forget everything recorded so far"""
+    with stats_lock:
+        for stats in thread_stats:
+            stats.clear()
+
+
+if ENABLED or PROFILE_PATH:
+    _original_input = builtins.input
+    if ENABLED:
+        builtins.input = _input
+    if PROFILE_PATH:
+        start_profile()
+    atexit.register(write_all)
+    if hasattr(signal, 'SIGUSR1') and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGUSR1, write_all)
+
+
+if __name__ == "__main__":
+    import pstats
+    if len(sys.argv) < 2:
+        print("Usage: python metrics.py <cprofile_dump> [lines]")
+        sys.exit(1)
+    pstats.Stats(sys.argv[1]).sort_stats('cumulative').print_stats(int(sys.argv[2]) if len(sys.argv) > 2 else 30)
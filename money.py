@@ -0,0 +1,67 @@
+"""Money as whole cents
+
+Every balance and loan amount is an int number of cents, in the stored
+records, in the journal, in the loan book arrays and in the (success,
+result) tuples of services. Adding and subtracting cents is exact, so a
+loan repaid in any number of pieces ends at exactly 0 remaining, and the
+stored JSON holds short integers instead of floats like
+1049.9999999999998.
+
+Amounts only turn into dollars at the edges: to_cents() reads what the
+user typed (or a dollar amount from a file), format_amount() shows cents
+as dollars. Interest and fees are worked out in integers and rounded
+half up to the cent once.
+"""
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from functools import lru_cache
+
+CENTS_PER_DOLLAR = 100
+ONE_CENT = Decimal('0.01')
+
+
+def to_cents(amount):
+    """Convert a dollar amount (text, int or float) to cents, rounding half up; ValueError if it is not a number"""
+    try:
+        # str() first so a float like 0.1 means the 0.1 it prints as, not its binary value
+        cents = Decimal(str(amount).strip()).quantize(ONE_CENT, rounding=ROUND_HALF_UP) * CENTS_PER_DOLLAR
+    except InvalidOperation:
+        raise ValueError("Invalid amount: " + str(amount))
+    return int(cents)
+
+
+def to_dollars(cents):
+    """Convert cents to a float dollar amount (for figures that are only shown or compared, never stored)"""
+    return cents / CENTS_PER_DOLLAR
+
+
+def format_amount(cents):
+    """Show cents as dollars with two decimals, e.g. 123456 -> '1234.56'"""
+    cents = int(round(cents))
+    sign = "-" if cents < 0 else ""
+    dollars, cents = divmod(abs(cents), CENTS_PER_DOLLAR)
+    return sign + str(dollars) + "." + str(cents).zfill(2)
+
+
+@lru_cache(maxsize=64)
+def rate_parts(rate):
+    """Turn a rate such as 0.05 into an exact fraction (numerator, denominator) of whole numbers"""
+    return Decimal(str(rate)).as_integer_ratio()
+
+
+def apply_rate(cents, rate, periods=1, periods_per_rate=1):
+    """cents * rate * periods / periods_per_rate, rounded half up to the cent (e.g. daily interest on a yearly rate)"""
+    numerator, denominator = rate_parts(rate)
+    numerator *= cents * periods
+    denominator *= periods_per_rate
+    return (2 * numerator + denominator) // (2 * denominator)
+
+
+def split(cents, parts):
+    """Split cents into parts whole-cent amounts that add up to cents exactly, the larger ones first"""
+    size, extra = divmod(cents, parts)
+    return [size + 1] * extra + [size] * (parts - extra)
+
+
+def installment(cents, parts):
+    """Amount of each of parts equal installments covering cents (rounded up, so they never fall short)"""
+    return -(-cents // parts)
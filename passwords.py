@@ -0,0 +1,128 @@
+"""Salted password hashing with a cache of recently verified passwords
+
+Passwords are stored as
+    pbkdf2_sha256$<iterations>$<salt hex>$<hash hex>
+HASH_ITERATIONS (or the BANK_HASH_ITERATIONS environment variable) sets
+the cost; hashes made at an older cost still verify, and
+needs_rehash() tells when one should be replaced. Passwords stored in
+plain text before hashing was added also still verify.
+
+Each hash costs tens of milliseconds of CPU. After start_pool() hashes
+run in a pool of worker processes, so a login only blocks the thread
+that asked for it. Successful verifications are remembered for
+CACHE_SECONDS (at most CACHE_SIZE of them), so asking for the same
+password again, e.g. when applying for a loan, does not hash again.
+"""
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+HASH_ALGORITHM = 'pbkdf2_sha256'
+HASH_ITERATIONS = int(os.environ.get('BANK_HASH_ITERATIONS', '200000'))
+SALT_BYTES = 16
+
+CACHE_SIZE = 10000
+CACHE_SECONDS = 300
+
+_pool = None
+# Verified (stored hash, password) pairs, keyed by a keyed digest so the cache never holds passwords
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_cache_secret = secrets.token_bytes(32)
+
+
+def derive(password, salt, iterations):
+    """PBKDF2-SHA256 of a password (runs in a worker process when the pool is started)"""
+    return hashlib.pbkdf2_hmac('sha256', password.encode(), salt, iterations)
+
+
+def start_pool(workers=None):
+    """Hash in a pool of worker processes (one per CPU by default)"""
+    global _pool
+    stop_pool()
+    _pool = ProcessPoolExecutor(workers or os.cpu_count())
+
+
+def stop_pool():
+    """Go back to hashing in the calling thread"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
+
+def run_derive(password, salt, iterations):
+    """Derive a hash in the pool if one is started, else in this thread"""
+    pool = _pool
+    if pool is not None:
+        return pool.submit(derive, password, salt, iterations).result()
+    return derive(password, salt, iterations)
+
+
+def hash_password(password, iterations=None):
+    """Return the stored form of a new password"""
+    iterations = iterations or HASH_ITERATIONS
+    salt = secrets.token_bytes(SALT_BYTES)
+    digest = run_derive(password, salt, iterations)
+    return HASH_ALGORITHM + '$' + str(iterations) + '$' + salt.hex() + '$' + digest.hex()
+
+
+def is_hashed(stored):
+    """Check whether a stored password is a hash rather than plain text"""
+    return stored.startswith(HASH_ALGORITHM + '$')
+
+
+def needs_rehash(stored):
+    """Check whether a stored password is plain text or hashed at a different cost"""
+    return not is_hashed(stored) or int(stored.split('$')[1]) != HASH_ITERATIONS
+
+
+def cache_key(stored, password):
+    """Keyed digest identifying one verified (stored hash, password) pair"""
+    return hmac.new(_cache_secret, (stored + '\0' + password).encode(), 'sha256').digest()
+
+
+def is_cached(key):
+    """Check whether a pair was verified within the last CACHE_SECONDS"""
+    with _cache_lock:
+        expires_at = _cache.get(key)
+        if expires_at is None:
+            return False
+        if expires_at <= time.monotonic():
+            del _cache[key]
+            return False
+        return True
+
+
+def remember(key):
+    """Cache a verified pair, dropping the oldest ones past CACHE_SIZE"""
+    with _cache_lock:
+        _cache[key] = time.monotonic() + CACHE_SECONDS
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def verify_password(password, stored, use_cache=True):
+    """Check a password against its stored form
+
+    With use_cache=False the hash is always recomputed (a fresh login), but
+    a successful check is still cached for later prompts.
+    """
+    key = cache_key(stored, password)
+    if use_cache and is_cached(key):
+        return True
+    if is_hashed(stored):
+        algorithm, iterations, salt, digest = stored.split('$')
+        correct = hmac.compare_digest(run_derive(password, bytes.fromhex(salt), int(iterations)).hex(), digest)
+    else:
+        # Accounts created before passwords were hashed
+        correct = hmac.compare_digest(stored.encode(), password.encode())
+    if correct:
+        remember(key)
+    return correct
@@ -0,0 +1,196 @@
+"""Incrementally maintained bank-wide and per-branch figures
+
+SQLite triggers on the accounts table keep two summary tables up to date:
+- branch_totals    - accounts, total balance, active loans and outstanding amount per branch_id
+- loan_type_totals - active loans and outstanding amount per (branch_id, loan type)
+Both also hold a bank-wide row under the branch_id ALL_BRANCHES.
+
+Every write of an account record (deposit, withdraw, transfer, loan
+application or repayment) subtracts the old record's contribution and
+adds the new one inside the same transaction, so the figures are always
+consistent with the accounts and reading them never scans accounts.
+Amounts are summed in cents, like the records they come from.
+
+Usage: python reporting.py [branch_id]
+"""
+import sys
+from data_storage import accounts, connection, storage_lock
+from money import format_amount
+from services import LOAN_TYPES
+
+ALL_BRANCHES = '*'
+
+# Active loans and outstanding amount of one record, from its nested loans object
+LOAN_ROWS = ("FROM json_each(REC, '$.loans') AS t, json_each(t.value) AS l "
+             "WHERE json_extract(l.value, '$.remaining_amount') > 0")
+
+ADD_RECORD_SQL = """
+INSERT INTO branch_totals (branch_id, accounts, balance, loans, outstanding)
+VALUES (BRANCH, SIGN, SIGN * json_extract(REC, '$.balance'),
+        SIGN * (SELECT COUNT(*) """ + LOAN_ROWS + """),
+        SIGN * (SELECT COALESCE(SUM(json_extract(l.value, '$.remaining_amount')), 0) """ + LOAN_ROWS + """))
+ON CONFLICT (branch_id) DO UPDATE SET
+    accounts = accounts + excluded.accounts,
+    balance = balance + excluded.balance,
+    loans = loans + excluded.loans,
+    outstanding = outstanding + excluded.outstanding;
+INSERT INTO loan_type_totals (branch_id, loan_type, loans, outstanding)
+SELECT BRANCH, t.key, SIGN * COUNT(*), SIGN * SUM(json_extract(l.value, '$.remaining_amount'))
+""" + LOAN_ROWS + """
+GROUP BY t.key
+ON CONFLICT (branch_id, loan_type) DO UPDATE SET
+    loans = loans + excluded.loans,
+    outstanding = outstanding + excluded.outstanding;
+"""
+
+FILL_BRANCH_TOTALS_SQL = """
+INSERT INTO branch_totals (branch_id, accounts, balance, loans, outstanding)
+SELECT BRANCH, COUNT(*), SUM(json_extract(a.value, '$.balance')),
+       SUM((SELECT COUNT(*) """ + LOAN_ROWS.replace('REC', 'a.value') + """)),
+       SUM((SELECT COALESCE(SUM(json_extract(l.value, '$.remaining_amount')), 0) """ + LOAN_ROWS.replace('REC', 'a.value') + """))
+FROM accounts AS a
+GROUP BY 1
+"""
+
+FILL_LOAN_TYPE_TOTALS_SQL = """
+INSERT INTO loan_type_totals (branch_id, loan_type, loans, outstanding)
+SELECT BRANCH, t.key, COUNT(*), SUM(json_extract(l.value, '$.remaining_amount'))
+FROM accounts AS a, json_each(a.value, '$.loans') AS t, json_each(t.value) AS l
+WHERE json_extract(l.value, '$.remaining_amount') > 0
+GROUP BY 1, 2
+"""
+
+
+def record_sql(record, sign):
+    """Trigger statements adding (sign 1) or removing (sign -1) one record's contribution"""
+    statements = ""
+    for branch in ("json_extract(REC, '$.branch_id')", "'" + ALL_BRANCHES + "'"):
+        statements += ADD_RECORD_SQL.replace('BRANCH', branch).replace('REC', record).replace('SIGN', str(sign))
+    return statements
+
+
+def install_totals(conn):
+    """Create the summary tables and triggers, filling the tables from existing accounts"""
+    with conn:
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'branch_totals'").fetchone()
+        if exists:
+            return
+        conn.execute("CREATE TABLE branch_totals (branch_id TEXT PRIMARY KEY, accounts INTEGER NOT NULL, "
+                     "balance INTEGER NOT NULL, loans INTEGER NOT NULL, outstanding INTEGER NOT NULL)")
+        conn.execute("CREATE TABLE loan_type_totals (branch_id TEXT NOT NULL, loan_type TEXT NOT NULL, "
+                     "loans INTEGER NOT NULL, outstanding INTEGER NOT NULL, PRIMARY KEY (branch_id, loan_type))")
+        conn.execute("CREATE TRIGGER accounts_totals_insert AFTER INSERT ON accounts BEGIN " +
+                     record_sql('new.value', 1) + " END")
+        conn.execute("CREATE TRIGGER accounts_totals_update AFTER UPDATE ON accounts BEGIN " +
+                     record_sql('old.value', -1) + record_sql('new.value', 1) + " END")
+        conn.execute("CREATE TRIGGER accounts_totals_delete AFTER DELETE ON accounts BEGIN " +
+                     record_sql('old.value', -1) + " END")
+        # Existing accounts: one pass, after which the triggers keep the tables current
+        for branch in ("json_extract(a.value, '$.branch_id')", "'" + ALL_BRANCHES + "'"):
+            conn.execute(FILL_BRANCH_TOTALS_SQL.replace('BRANCH', branch))
+            conn.execute(FILL_LOAN_TYPE_TOTALS_SQL.replace('BRANCH', branch))
+
+
+def bank_totals():
+    """Accounts, total balance, active loans and outstanding amount across the bank"""
+    with storage_lock:
+        row = connection.execute("SELECT accounts, balance, loans, outstanding FROM branch_totals "
+                                 "WHERE branch_id = ?", (ALL_BRANCHES,)).fetchone()
+    if row is None:
+        return {'accounts': 0, 'balance': 0, 'loans': 0, 'outstanding': 0}
+    return {'accounts': row[0], 'balance': row[1], 'loans': row[2], 'outstanding': row[3]}
+
+
+def branch_summary(branch_id):
+    """Figures for one branch, with outstanding loans per loan type"""
+    with storage_lock:
+        row = connection.execute("SELECT accounts, balance, loans, outstanding FROM branch_totals "
+                                 "WHERE branch_id = ?", (branch_id,)).fetchone()
+        by_type = connection.execute("SELECT loan_type, loans, outstanding FROM loan_type_totals "
+                                     "WHERE branch_id = ?", (branch_id,)).fetchall()
+    if row is None:
+        return None
+    return {'accounts': row[0], 'balance': row[1], 'loans': row[2], 'outstanding': row[3],
+            'loan_types': dict((loan_type, (loans, outstanding)) for loan_type, loans, outstanding in by_type)}
+
+
+def branch_table():
+    """Figures for every branch, as (branch_id, accounts, balance, loans, outstanding) rows"""
+    with storage_lock:
+        return connection.execute("SELECT branch_id, accounts, balance, loans, outstanding FROM branch_totals "
+                                  "WHERE accounts > 0 AND branch_id != ? ORDER BY branch_id", (ALL_BRANCHES,)).fetchall()
+
+
+def loan_type_totals():
+    """Active loans and outstanding amount per loan type across the bank"""
+    with storage_lock:
+        rows = connection.execute("SELECT loan_type, loans, outstanding FROM loan_type_totals "
+                                  "WHERE branch_id = ?", (ALL_BRANCHES,)).fetchall()
+    totals = dict((loan_type, (0, 0)) for loan_type in LOAN_TYPES.values())
+    for loan_type, loans, outstanding in rows:
+        totals[loan_type] = (loans, outstanding)
+    return totals
+
+
+def account_summary(acc_address):
+    """Balance and active loan count of one account (fully repaid loans are removed, so no loan scan)"""
+    account = accounts[acc_address]
+    active_loans = 0
+    for loan_list in account.get('loans', {}).values():
+        active_loans += len(loan_list)
+    return {'balance': account['balance'], 'active_loans': active_loans}
+
+
+def format_dollars(amount):
+    """Format an amount in cents for the dashboards"""
+    return "$" + format_amount(amount)
+
+
+def print_bank_dashboard():
+    """Print bank-wide figures, loan types and the per-branch table"""
+    totals = bank_totals()
+    print("\n" + "="*50)
+    print("BANK DASHBOARD")
+    print("="*50)
+    print("Accounts: " + str(totals['accounts']))
+    print("Total Deposits: " + format_dollars(totals['balance']))
+    print("Active Loans: " + str(totals['loans']))
+    print("Outstanding Loans: " + format_dollars(totals['outstanding']))
+    print("\nOutstanding by Loan Type:")
+    for loan_type, (loans, outstanding) in loan_type_totals().items():
+        print("  " + loan_type + ": " + str(loans) + " loans, " + format_dollars(outstanding))
+    print("\n" + "Branch".ljust(10) + "Accounts".rjust(10) + "Deposits".rjust(18) + "Loans".rjust(8) + "Outstanding".rjust(18))
+    for branch_id, branch_accounts, balance, loans, outstanding in branch_table():
+        print(branch_id.ljust(10) + str(branch_accounts).rjust(10) + format_dollars(balance).rjust(18) +
+              str(loans).rjust(8) + format_dollars(outstanding).rjust(18))
+    print("="*50)
+
+
+def print_branch_dashboard(branch_id):
+    """Print the figures of one branch"""
+    summary = branch_summary(branch_id)
+    print("\n" + "="*50)
+    print("BRANCH " + branch_id)
+    print("="*50)
+    if summary is None:
+        print("No accounts at this branch.")
+        return
+    print("Accounts: " + str(summary['accounts']))
+    print("Total Deposits: " + format_dollars(summary['balance']))
+    print("Active Loans: " + str(summary['loans']))
+    print("Outstanding Loans: " + format_dollars(summary['outstanding']))
+    print("\nOutstanding by Loan Type:")
+    for loan_type in LOAN_TYPES.values():
+        loans, outstanding = summary['loan_types'].get(loan_type, (0, 0))
+        print("  " + loan_type + ": " + str(loans) + " loans, " + format_dollars(outstanding))
+    print("="*50)
+
+
+install_totals(connection)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        print_branch_dashboard(sys.argv[1])
+    else:
+        print_bank_dashboard()
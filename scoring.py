@@ -0,0 +1,321 @@
+"""Credit scoring of loan applications from features kept per account
+
+apply_loan asks evaluate() before it adds a loan. The score starts at
+BASE_SCORE and moves by a few points tables:
+- debt: what the account would owe on all its loans with the new one,
+  as a multiple of its balance (DEBT_POINTS)
+- repayment: the share of the installments already due that has been
+  paid (REPAYMENT_POINTS), once anything has fallen due
+- lateness: with an overdue amount, the days since the last payment
+  (LATE_PAYMENT_POINTS); with loans and nothing overdue, CURRENT_POINTS
+- another loan of a type the account already owes on (SAME_TYPE_POINTS)
+An application is approved when the score is at least MIN_SCORE and the
+account's exposure to the loan type stays within LOAN_TYPE_LIMITS.
+
+The features (balance, and per loan type the exposure, paid and due
+amounts, overdue amount and last payment day) are worked out once per
+account and then kept up to date from the event bus: a balance change
+only replaces the balance and a loan change only recomputes the loans of
+its type, so scoring an application never walks the account's loans.
+Changes by other processes (the nightly loan batch) come as 'reload'
+events when the account transaction re-reads the record, and drop the
+account's features so they are worked out again from the stored record.
+
+Re-scoring the whole book reads the stored records in chunks and scores
+them in worker processes, as bulk_accounts imports, writing one CSV line
+per account with loans and printing how many fall in each score band.
+
+Usage: python scoring.py [scores.csv] [--workers N]
+"""
+import csv
+import datetime
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import metrics
+from data_storage import accounts
+from events import bus
+from loan_book import date_to_day
+from money import CENTS_PER_DOLLAR, format_amount
+
+BASE_SCORE = 600
+MIN_SCORE = 600
+# (highest debt to balance ratio, points); a higher ratio gets DEBT_POINTS_OVER
+DEBT_POINTS = ((2, 100), (5, 50), (10, 0), (20, -100))
+DEBT_POINTS_OVER = -250
+# (lowest share of the due amount paid, points); a lower share gets REPAYMENT_POINTS_UNDER
+REPAYMENT_POINTS = ((0.99, 100), (0.9, 40), (0.75, 0))
+REPAYMENT_POINTS_UNDER = -150
+# (most days since the last payment, points) while an amount is overdue; longer gets LATE_PAYMENT_POINTS_OVER
+LATE_PAYMENT_POINTS = ((30, 0), (90, -100))
+LATE_PAYMENT_POINTS_OVER = -200
+CURRENT_POINTS = 50
+SAME_TYPE_POINTS = -50
+# Most an account may owe on one loan type, new loan included
+LOAN_TYPE_LIMITS = {
+    'Home Loan': 1000000 * CENTS_PER_DOLLAR,
+    'Car Loan': 200000 * CENTS_PER_DOLLAR,
+    'Education Loan': 200000 * CENTS_PER_DOLLAR,
+    'Personal Loan': 100000 * CENTS_PER_DOLLAR,
+    'Gold Loan': 100000 * CENTS_PER_DOLLAR
+}
+SCORE_BANDS = (700, 600, 500)   # lower edges of the bands in the re-scoring summary; the last band is below 500
+MAX_CACHED_ACCOUNTS = 100000    # accounts with kept features; the cache is emptied when it fills up
+CHUNK_SIZE = 1000
+
+# acc_address -> {'balance': cents, 'types': {loan_type: type features}}
+features = {}
+
+
+def loan_overdue(loan):
+    """Amount of a loan's installments already due, plus charges, that is still unpaid"""
+    overdue = (loan.get('installments_due', 0) * loan['suggested_installment'] + loan.get('penalty_amount', 0) -
+               loan['paid_amount'])
+    return max(min(overdue, loan['remaining_amount']), 0)
+
+
+def type_features(loans):
+    """Features of one loan type's loans: (exposure, paid, due, overdue, last payment day, count)"""
+    exposure = paid = due = overdue = 0
+    last_payment_day = None
+    count = 0
+    for loan in loans:
+        if loan['remaining_amount'] <= 0:
+            continue
+        count += 1
+        exposure += loan['remaining_amount']
+        paid += loan['paid_amount']
+        due += min(loan.get('installments_due', 0) * loan['suggested_installment'] + loan.get('penalty_amount', 0),
+                   loan['total_payable'] + loan.get('penalty_amount', 0))
+        overdue += loan_overdue(loan)
+        # A loan never paid counts from its start
+        day = date_to_day(loan['last_payment_date'] or loan['start_date'])
+        if last_payment_day is None or day > last_payment_day:
+            last_payment_day = day
+    return exposure, paid, due, overdue, last_payment_day, count
+
+
+def account_features(account):
+    """Work out the scoring features of an account record"""
+    return {
+        'balance': account['balance'],
+        'types': dict((loan_type, type_features(loans)) for loan_type, loans in account.get('loans', {}).items())
+    }
+
+
+def make_room():
+    """Keep the cache from growing without limit in a long-running process"""
+    if len(features) >= MAX_CACHED_ACCOUNTS:
+        features.clear()
+
+
+def get_features(acc_address):
+    """The features of an account, worked out from its record the first time they are needed"""
+    kept = features.get(acc_address)
+    if kept is None:
+        make_room()
+        kept = features[acc_address] = account_features(accounts[acc_address])
+    return kept
+
+
+def on_change(event):
+    """Event bus handler: bring the kept features of a changed account up to date"""
+    fields = event.fields
+    if event.op in ('create', 'reload'):
+        features.pop(event.acc_address, None)
+        return
+    if event.op == 'settle':
+        for acc_address, balance in fields['balances'].items():
+            kept = features.get(acc_address)
+            if kept is not None:
+                kept['balance'] = balance
+        return
+    if event.op == 'transfer':
+        kept = features.get(fields['to'])
+        if kept is not None:
+            kept['balance'] = fields['to_balance']
+    kept = features.get(event.acc_address)
+    if kept is None:
+        return
+    if 'balance' in fields:
+        kept['balance'] = fields['balance']
+    if 'loan_type' in fields and 'loans' in fields:
+        kept['types'][fields['loan_type']] = type_features(fields['loans'])
+
+
+# Every operation, as journal.apply_entry: shard transfers change balances too
+subscription = bus.subscribe(on_change)
+
+
+def points_for(value, table, otherwise, higher_is_better=False):
+    """Points of the first (limit, points) row of a table that value falls within"""
+    for limit, points in table:
+        if (value >= limit) if higher_is_better else (value <= limit):
+            return points
+    return otherwise
+
+
+def totals(kept):
+    """Sum the per-type features of an account: (exposure, paid, due, overdue, last payment day, count)"""
+    exposure = paid = due = overdue = count = 0
+    last_payment_day = None
+    for type_exposure, type_paid, type_due, type_overdue, type_last_payment_day, type_count in kept['types'].values():
+        exposure += type_exposure
+        paid += type_paid
+        due += type_due
+        overdue += type_overdue
+        count += type_count
+        if type_last_payment_day is not None and (last_payment_day is None or type_last_payment_day > last_payment_day):
+            last_payment_day = type_last_payment_day
+    return exposure, paid, due, overdue, last_payment_day, count
+
+
+def score_features(kept, amount_due=0, loan_type=None, today=None):
+    """Score an account's features, with a new loan of amount_due if given; returns (score, reasons)
+
+    reasons lists (points, reason) for every factor that moved the score.
+    today is a day number (default today).
+    """
+    if today is None:
+        today = datetime.date.today().toordinal()
+    exposure, paid, due, overdue, last_payment_day, count = totals(kept)
+    reasons = []
+
+    debt_ratio = (exposure + amount_due) / max(kept['balance'], 1)
+    points = points_for(debt_ratio, DEBT_POINTS, DEBT_POINTS_OVER)
+    if points:
+        reasons.append((points, "Debt is " + str(round(debt_ratio, 1)) + " times the balance"))
+    if due > 0:
+        repaid = paid / due
+        points = points_for(repaid, REPAYMENT_POINTS, REPAYMENT_POINTS_UNDER, higher_is_better=True)
+        if points:
+            reasons.append((points, str(int(min(repaid, 1) * 100)) + "% of the installments due are paid"))
+    if overdue > 0:
+        days = today - last_payment_day
+        points = points_for(days, LATE_PAYMENT_POINTS, LATE_PAYMENT_POINTS_OVER)
+        if points:
+            reasons.append((points, "$" + format_amount(overdue) + " overdue, last payment " + str(days) +
+                            " days ago"))
+    elif count:
+        reasons.append((CURRENT_POINTS, "Loans are paid up to date"))
+    if loan_type is not None and kept['types'].get(loan_type, (0,))[0] > 0:
+        reasons.append((SAME_TYPE_POINTS, "Already has a " + loan_type + " outstanding"))
+
+    return BASE_SCORE + sum(points for points, reason in reasons), reasons
+
+
+@metrics.timed('credit_score')
+def evaluate(acc_address, amount_due, loan_type):
+    """Decide a loan application of amount_due (cents, interest included); returns (approved, score, reason)
+
+    Call it inside an account_transaction, so the features cannot change
+    underneath and changes by other processes have been read.
+    """
+    kept = get_features(acc_address)
+    score, reasons = score_features(kept, amount_due, loan_type)
+    limit = LOAN_TYPE_LIMITS.get(loan_type)
+    if limit is not None and kept['types'].get(loan_type, (0,))[0] + amount_due > limit:
+        return False, score, "Total " + loan_type + " debt would exceed $" + format_amount(limit) + "."
+    if score < MIN_SCORE:
+        worst = min(reasons)[1]
+        return False, score, "Credit score " + str(score) + " is below " + str(MIN_SCORE) + ": " + worst + "."
+    return True, score, None
+
+
+def score_chunk(chunk, today):
+    """Score one chunk of (acc_address, stored JSON) pairs (runs in a worker process)
+
+    Returns (acc_address, score, exposure, share repaid, days since last
+    payment) for every account with loans outstanding.
+    """
+    scored = []
+    for acc_address, value in chunk:
+        kept = account_features(json.loads(value))
+        exposure, paid, due, overdue, last_payment_day, count = totals(kept)
+        if not count:
+            continue
+        score, reasons = score_features(kept, today=today)
+        scored.append((acc_address, score, exposure, paid / due if due else 1.0, today - last_payment_day))
+    return scored
+
+
+def read_chunks(store, chunk_size):
+    """Group the stored records into lists of (acc_address, stored JSON) pairs"""
+    chunk = []
+    for acc_address, value in store.iter_json(chunk_size):
+        chunk.append((acc_address, value))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def write_chunk(scored, writer, summary):
+    """Write one chunk of scores and count them into their bands"""
+    for acc_address, score, exposure, repaid, days in scored:
+        if writer is not None:
+            writer.writerow([acc_address, score, format_amount(exposure), round(repaid, 3), days])
+        for band in SCORE_BANDS:
+            if score >= band:
+                break
+        else:
+            band = 0
+        summary[band] += 1
+    summary['accounts'] += len(scored)
+
+
+def score_book(store, output=None, workers=None, chunk_size=CHUNK_SIZE, today=None):
+    """Re-score every account with loans, writing CSV lines to output; returns a summary dictionary
+
+    The summary counts the accounts scored and, keyed by the lower edge
+    of each band (0 for the lowest), the accounts in that band. With
+    workers=0 every chunk is scored in this process.
+    """
+    if today is None:
+        today = datetime.date.today().toordinal()
+    summary = dict((band, 0) for band in SCORE_BANDS + (0,))
+    summary['accounts'] = 0
+    writer = None
+    if output is not None:
+        writer = csv.writer(output, lineterminator='\n')
+        writer.writerow(('acc_address', 'score', 'exposure', 'repaid', 'days_since_payment'))
+    if workers == 0:
+        for chunk in read_chunks(store, chunk_size):
+            write_chunk(score_chunk(chunk, today), writer, summary)
+        return summary
+
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(workers) as pool:
+        # Chunks are written in the order they were read, with at most two per worker in flight
+        pending = deque()
+        for chunk in read_chunks(store, chunk_size):
+            pending.append(pool.submit(score_chunk, chunk, today))
+            if len(pending) >= workers * 2:
+                write_chunk(pending.popleft().result(), writer, summary)
+        while pending:
+            write_chunk(pending.popleft().result(), writer, summary)
+    return summary
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    workers = None
+    if '--workers' in sys.argv:
+        position = sys.argv.index('--workers') + 1
+        if position >= len(sys.argv) or not sys.argv[position].isdigit():
+            print("Usage: python scoring.py [scores.csv] [--workers N]")
+            sys.exit(1)
+        workers = int(sys.argv[position])
+        args.remove(sys.argv[position])
+    if args:
+        with open(args[0], 'w', newline='') as output:
+            summary = score_book(accounts, output, workers)
+    else:
+        summary = score_book(accounts, None, workers)
+    print("Accounts scored: " + str(summary['accounts']))
+    for band, upper in zip(SCORE_BANDS + (0,), (None,) + SCORE_BANDS):
+        label = str(band) + "+" if upper is None else str(band) + "-" + str(upper - 1)
+        print("  " + label + ": " + str(summary[band]))
@@ -0,0 +1,223 @@
+"""Scripted (batch) mode: run banking commands from a file or stdin without the menus
+
+Each line is one command, with quotes around values that contain spaces;
+blank lines and lines starting with # are skipped. A # starts a comment
+only at the beginning of a word, so pa#ss is a password, not pa:
+    login Testuser 111111 999999 test1234
+    deposit 100
+    repay Car Loan 1 50
+Commands after login act on the logged-in account, as in the menus:
+    create <name> <dob> <home address> <country> <phone> <gender> <password> [special code]
+    login <name> <special code> <account address> <password>
+    logout
+    switch <account address> <password>
+    deposit <amount>
+    withdraw <amount>
+    transfer <account address> <amount>
+    balance
+    info
+    loans
+    apply_loan <amount> <loan type> <payment plan> <special code> <password>
+    repay <loan type> <loan number> <amount>
+Every command prints one JSON line, e.g.
+    {"line": 2, "op": "deposit", "ok": true, "result": 1010000}
+with result holding the new balance, loan or account details, or the
+error message when ok is false. Amounts in commands are dollars (12.50),
+amounts in results are cents, as services returns them. Nothing waits for Enter and no screen is
+redrawn.
+
+Usage: python main.py --script [script_path] [--strict]  (stdin without a path; --strict stops at the first failure)
+"""
+import json
+import shlex
+import sys
+import reporting
+import services
+from data_storage import accounts
+from money import to_cents
+
+
+def parse_amount(text):
+    """Turn a command argument in dollars into a positive amount in cents"""
+    amount = to_cents(text)
+    if amount <= 0:
+        raise ValueError(text)
+    return amount
+
+
+def split_loan_words(words):
+    """Split the words of '<loan type> <payment plan>' into the two names (None, None if no loan type matches)"""
+    text = " ".join(words)
+    for loan_type in services.LOAN_TYPES.values():
+        if text.lower().startswith(loan_type.lower() + " "):
+            return loan_type, text[len(loan_type) + 1:]
+    return None, None
+
+
+def run_create(session, args):
+    """create <name> <dob> <home address> <country> <phone> <gender> <password> [special code]"""
+    if len(args) not in (7, 8):
+        return False, "Usage: create <name> <dob> <home address> <country> <phone> <gender> <password> [special code]"
+    return services.create_account(*args)
+
+
+def run_login(session, args):
+    """login <name> <special code> <account address> <password>"""
+    if len(args) != 4:
+        return False, "Usage: login <name> <special code> <account address> <password>"
+    success, result = services.login(*args)
+    if success:
+        session['acc_address'] = result
+    return success, result
+
+
+def run_logout(session, args):
+    """logout"""
+    session.pop('acc_address', None)
+    return True, None
+
+
+def run_switch(session, args):
+    """switch <account address> <password>"""
+    if len(args) != 2:
+        return False, "Usage: switch <account address> <password>"
+    success, result = services.switch_account(session['acc_address'], args[0], args[1])
+    if success:
+        session['acc_address'] = result
+    return success, result
+
+
+def run_deposit(session, args):
+    """deposit <amount>"""
+    if len(args) != 1:
+        return False, "Usage: deposit <amount>"
+    return services.deposit(session['acc_address'], parse_amount(args[0]))
+
+
+def run_withdraw(session, args):
+    """withdraw <amount>"""
+    if len(args) != 1:
+        return False, "Usage: withdraw <amount>"
+    return services.withdraw(session['acc_address'], parse_amount(args[0]))
+
+
+def run_transfer(session, args):
+    """transfer <account address> <amount>"""
+    if len(args) != 2:
+        return False, "Usage: transfer <account address> <amount>"
+    return services.transfer(session['acc_address'], args[0], parse_amount(args[1]))
+
+
+def run_balance(session, args):
+    """balance"""
+    return services.get_balance(session['acc_address'])
+
+
+def run_info(session, args):
+    """info: name, branch, balance and active loan count, as on the main menu"""
+    account = accounts[session['acc_address']]
+    summary = reporting.account_summary(session['acc_address'])
+    return True, {'name': account['name'], 'branch_id': account['branch_id'], 'acc_address': session['acc_address'],
+                  'balance': summary['balance'], 'active_loans': summary['active_loans']}
+
+
+def run_loans(session, args):
+    """loans: every loan of the account, as check_loans shows them"""
+    return True, accounts[session['acc_address']].get('loans', {})
+
+
+def run_apply_loan(session, args):
+    """apply_loan <amount> <loan type> <payment plan> <special code> <password>"""
+    if len(args) < 5:
+        return False, "Usage: apply_loan <amount> <loan type> <payment plan> <special code> <password>"
+    loan_type, plan_name = split_loan_words(args[1:-2])
+    if loan_type is None:
+        return False, "Invalid loan type!"
+    return services.apply_loan(session['acc_address'], parse_amount(args[0]), loan_type, plan_name, args[-2],
+                               args[-1])
+
+
+def run_repay(session, args):
+    """repay <loan type> <loan number> <amount>"""
+    if len(args) < 3:
+        return False, "Usage: repay <loan type> <loan number> <amount>"
+    return services.repay_loan(session['acc_address'], " ".join(args[:-2]), int(args[-2]), parse_amount(args[-1]))
+
+
+COMMANDS = {
+    'create': run_create,
+    'login': run_login,
+    'logout': run_logout,
+    'switch': run_switch,
+    'deposit': run_deposit,
+    'withdraw': run_withdraw,
+    'transfer': run_transfer,
+    'balance': run_balance,
+    'info': run_info,
+    'loans': run_loans,
+    'apply_loan': run_apply_loan,
+    'repay': run_repay
+}
+
+# Commands that work without a logged-in account
+NO_LOGIN_COMMANDS = ('create', 'login', 'logout')
+
+
+def strip_comment(line):
+    """Cut the comment off a line: a # outside quotes at the beginning of a word and the rest of the line"""
+    quote = None
+    for i, char in enumerate(line):
+        if quote is not None:
+            if char == quote:
+                quote = None
+        elif char in '"\'':
+            quote = char
+        elif char == '#' and (i == 0 or line[i - 1].isspace()):
+            return line[:i]
+    return line
+
+
+def run_command(session, line):
+    """Run one script line; returns (op, success, result), or None for blank and comment lines"""
+    if '#' in line:
+        line = strip_comment(line)
+    if '"' in line or "'" in line:
+        try:
+            words = shlex.split(line)
+        except ValueError:
+            return None, False, "Unbalanced quotes!"
+    else:
+        # Most lines need no quote handling, and str.split is far quicker than shlex
+        words = line.split()
+    if not words:
+        return None
+    op = words[0].lower()
+    if op not in COMMANDS:
+        return op, False, "Unknown command!"
+    if op not in NO_LOGIN_COMMANDS and session.get('acc_address') is None:
+        return op, False, "Not logged in!"
+    try:
+        success, result = COMMANDS[op](session, words[1:])
+    except ValueError:
+        return op, False, "Invalid number!"
+    return op, success, result
+
+
+def run_script(lines, out=sys.stdout, strict=False):
+    """Run script lines, writing one JSON result line each; returns (commands run, failures)"""
+    session = {}
+    count = 0
+    failures = 0
+    for number, line in enumerate(lines, start=1):
+        outcome = run_command(session, line)
+        if outcome is None:
+            continue
+        op, success, result = outcome
+        count += 1
+        out.write(json.dumps({'line': number, 'op': op, 'ok': success, 'result': result}) + '\n')
+        if not success:
+            failures += 1
+            if strict:
+                break
+    out.flush()
+    return count, failures
@@ -0,0 +1,146 @@
+"""Asyncio TCP front end for the banking operations
+
+Clients send one JSON object per line, for example
+    {"op": "login", "name": "Testuser", "special_code": "111111", "acc_address": "999999", "password": "test1234"}
+and get one JSON object per line back:
+    {"ok": true, "result": "999999"}
+Amounts are whole cents both ways, e.g. {"op": "deposit", "amount": 1250}
+deposits $12.50.
+
+Each connection is its own session; every operation except login acts on
+the account the session is logged in to. The server only listens on the
+local machine.
+
+Usage: python server.py [port]
+"""
+import asyncio
+import json
+import sys
+import journal
+import passwords
+import services
+
+HOST = '127.0.0.1'
+PORT = 8765
+
+# Operations that hash a password; they run in a worker thread so other sessions are not stalled
+PASSWORD_OPS = ('login', 'apply_loan', 'switch')
+# Request fields the operations treat as text
+TEXT_FIELDS = ('name', 'special_code', 'acc_address', 'password', 'loan_type', 'plan', 'target')
+
+# Runs the operations: the services module, or a sharding.ShardedBank with the same functions
+bank = services
+
+
+def handle_request(session, request):
+    """Run one request for a session and return the (success, result) tuple"""
+    for field in TEXT_FIELDS:
+        if field in request and not isinstance(request[field], str):
+            raise TypeError(field + " is not a string")
+    op = request.get('op')
+
+    if op == 'login':
+        success, result = bank.login(request.get('name', ''), request.get('special_code', ''),
+                                     request.get('acc_address', ''), request.get('password', ''))
+        if success:
+            session['acc_address'] = result
+        return success, result
+
+    acc_address = session.get('acc_address')
+    if acc_address is None:
+        return False, "Not logged in!"
+
+    if op == 'balance':
+        return bank.get_balance(acc_address)
+    elif op == 'deposit':
+        return bank.deposit(acc_address, request['amount'])
+    elif op == 'withdraw':
+        return bank.withdraw(acc_address, request['amount'])
+    elif op == 'apply_loan':
+        return bank.apply_loan(acc_address, request['amount'], request['loan_type'],
+                               request['plan'], request['special_code'], request['password'])
+    elif op == 'repay_loan':
+        return bank.repay_loan(acc_address, request['loan_type'], int(request.get('loan_number', 1)),
+                               request['amount'])
+    elif op == 'switch':
+        success, result = bank.switch_account(acc_address, request['target'], request['password'])
+        if success:
+            session['acc_address'] = result
+        return success, result
+    elif op == 'logout':
+        session.pop('acc_address', None)
+        return True, None
+    return False, "Invalid operation!"
+
+
+async def handle_client(reader, writer):
+    """Serve one client session until it disconnects"""
+    session = {}
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("Request is not a JSON object")
+                # Shard calls wait on a pipe, so they leave the event loop too
+                if request.get('op') in PASSWORD_OPS or bank is not services:
+                    success, result = await asyncio.get_running_loop().run_in_executor(
+                        None, handle_request, session, request)
+                else:
+                    success, result = handle_request(session, request)
+            except KeyError as e:
+                success, result = False, "Missing field: " + str(e.args[0])
+            except (ValueError, TypeError):
+                success, result = False, "Invalid request!"
+            writer.write(json.dumps({'ok': success, 'result': result}).encode() + b'\n')
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def start_server(port=PORT):
+    """Start listening on the local machine and return the asyncio server"""
+    return await asyncio.start_server(handle_client, HOST, port, limit=2 ** 16, backlog=4096)
+
+
+async def open_client(port=PORT):
+    """Connect to a running server and return the (reader, writer) pair"""
+    return await asyncio.open_connection(HOST, port)
+
+
+async def send_request(client, op, **fields):
+    """Send one request over a client connection and return (success, result)"""
+    reader, writer = client
+    fields['op'] = op
+    writer.write(json.dumps(fields).encode() + b'\n')
+    await writer.drain()
+    response = json.loads(await reader.readline())
+    return response['ok'], response['result']
+
+
+async def serve_forever(port=PORT, shards=0):
+    """Run the server until interrupted, over shards worker processes when shards is given"""
+    global bank
+    if shards:
+        from sharding import ShardedBank
+        bank = ShardedBank(shards, '.')
+    else:
+        journal.open_journal()
+        passwords.start_pool()
+    server = await start_server(port)
+    print("Banking server listening on " + HOST + ":" + str(port))
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(serve_forever(int(sys.argv[1]) if len(sys.argv) > 1 else PORT,
+                                  int(sys.argv[2]) if len(sys.argv) > 2 else 0))
+    except KeyboardInterrupt:
+        print("\nServer stopped.")
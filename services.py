@@ -0,0 +1,486 @@
+"""Account and loan operations without any input() or print()
+
+Every operation returns a (success, result) tuple. On failure result is the
+error message to show the user, on success it is the operation's result.
+Amounts, balances and loan figures are whole cents (see money.py).
+The interactive menus and any batch or server driver are thin wrappers
+around these functions.
+"""
+import datetime
+import os
+import secrets
+import time
+import journal
+import metrics
+import money
+import passwords
+from allocator import Allocator
+from data_storage import accounts, locked_accounts, meta
+from loan_engine import installment_due_day
+from lockout import LockoutManager
+from transactions import account_transaction
+from validation import validate_date, validate_home_address, validate_phone, validate_password
+from validation import validate_dates, validate_home_addresses, validate_phones, validate_passwords
+
+INTEREST_RATE = 0.05  # 5%
+
+LOAN_TYPES = {
+    '1': 'Home Loan',
+    '2': 'Car Loan',
+    '3': 'Education Loan',
+    '4': 'Personal Loan',
+    '5': 'Gold Loan'
+}
+
+PAYMENT_PLANS = {
+    '1': ('Weekly', 0.25),
+    '2': ('Monthly', 1),
+    '3': ('Quarterly', 3),
+    '4': ('Half Yearly', 6),
+    '5': ('Yearly', 12)
+}
+
+# Installments in the one-year term of each payment plan, keyed by interval in months
+PLAN_INSTALLMENTS = {
+    0.25: 52,  # 1 year in weeks
+    1: 12,
+    3: 4,
+    6: 2,
+    12: 1
+}
+
+# Account addresses have ADDRESS_DIGITS digits (6 unless BANK_ADDRESS_DIGITS says otherwise)
+ADDRESS_DIGITS = int(os.environ.get('BANK_ADDRESS_DIGITS', '6'))
+address_allocator = Allocator(meta, 'account_address', 10 ** (ADDRESS_DIGITS - 1), 10 ** ADDRESS_DIGITS)
+special_code_allocator = Allocator(meta, 'special_code', 100000, 1000000)
+
+# Set to "index/count" by sharding.py in each shard worker: the shard only hands out the addresses and
+# special codes whose number is index modulo count, so shards never hand out the same one
+SHARD_INDEX, SHARD_COUNT = [int(part) for part in os.environ.get('BANK_SHARD', '0/1').split('/')]
+
+MAX_LOGIN_ATTEMPTS = 3
+LOCKOUT_SECONDS = 60
+
+# Failed attempts are only kept in memory; lockouts are also saved in locked_accounts
+lockouts = LockoutManager(MAX_LOGIN_ATTEMPTS, LOCKOUT_SECONDS)
+
+
+def restore_lockouts():
+    """Reload unexpired lockouts saved by a previous run and delete the expired ones"""
+    expired = []
+    for acc_address, lock_time in locked_accounts.items():
+        if lock_time + LOCKOUT_SECONDS > time.time():
+            lockouts.lock_until(acc_address, lock_time + LOCKOUT_SECONDS)
+        else:
+            expired.append(acc_address)
+    for acc_address in expired:
+        del locked_accounts[acc_address]
+
+
+def owns_number(number):
+    """Check whether this process (or shard) may hand out an address or special code"""
+    return number % SHARD_COUNT == SHARD_INDEX
+
+
+def generate_account_address():
+    """Draw the next account address from the allocator (None once every address is used)"""
+    number = address_allocator.allocate()
+    while number is not None and not owns_number(number):
+        number = address_allocator.allocate()
+    return None if number is None else str(number)
+
+
+def generate_special_code():
+    """Draw a special code no existing account uses (None once every code is used)"""
+    number = special_code_allocator.allocate()
+    # Codes handed out before the allocator existed were random, skip those
+    while number is not None and (not owns_number(number) or find_linked_accounts(str(number))):
+        number = special_code_allocator.allocate()
+    return None if number is None else str(number)
+
+
+def generate_branch_id():
+    """Pick a branch for a new account"""
+    return 'BR' + str(1000 + secrets.randbelow(9000))
+
+
+def find_matching_account(name, dob, home_address, phone_no, gender):
+    """Find if an account with same personal details exists"""
+    matches = accounts.find('identity', (name, dob, home_address, phone_no, gender))
+    if matches:
+        return matches[0], accounts[matches[0]]['special_code']
+    return None, None
+
+
+def find_linked_accounts(special_code):
+    """Return the addresses of all accounts sharing a special code"""
+    return accounts.find('special_code', (special_code,))
+
+
+def find_free_account_address(taken=()):
+    """Generate an account address that is not in use (nor in taken); None once every address is used"""
+    acc_address = generate_account_address()
+    # Addresses handed out before the allocator existed were random, skip those
+    while acc_address is not None and (acc_address in taken or acc_address in accounts):
+        acc_address = generate_account_address()
+    return acc_address
+
+
+def check_account_details(dob, home_address, country, phone_no, gender, password):
+    """Validate the details of a new account and return (success, error message)"""
+    return first_detail_error(validate_date(dob), validate_home_address(home_address),
+                              validate_phone(phone_no, country=country), gender, validate_password(password))
+
+
+def check_many_account_details(details):
+    """Validate a list of new account detail dictionaries column by column, one (success, message) each"""
+    dobs = validate_dates([fields['dob'] for fields in details])
+    addresses = validate_home_addresses([fields['home_address'] for fields in details])
+    phones = validate_phones([fields['phone_no'] for fields in details], [fields['country'] for fields in details])
+    passwords_ok = validate_passwords([fields['password'] for fields in details])
+    return [first_detail_error(dobs[i], addresses[i], phones[i], details[i]['gender'], passwords_ok[i])
+            for i in range(len(details))]
+
+
+def first_detail_error(dob_ok, address_ok, phone_ok, gender, password_ok):
+    """Turn validation results into (success, message for the first failed check)"""
+    if not dob_ok:
+        return False, "Invalid date format! Please enter in DD/MM/YYYY format."
+    if not address_ok:
+        return False, "Invalid address!"
+    if not phone_ok:
+        return False, "Invalid phone number!"
+    if gender not in ('Male', 'Female'):
+        return False, "Invalid gender!"
+    if not password_ok:
+        return False, "Invalid password! Must be at least 8 characters with both numbers and alphabets."
+    return True, None
+
+
+def new_account_record(name, dob, home_address, country, phone_no, gender, password_hash, special_code):
+    """Build the stored record of a new account with an empty balance"""
+    return {
+        'name': name,
+        'dob': dob,
+        'home_address': home_address,
+        'phone_no': phone_no,
+        'password': password_hash,
+        'gender': gender,
+        'country': country,
+        'special_code': special_code,
+        'branch_id': generate_branch_id(),
+        'balance': 0,
+        'loans': {}
+    }
+
+
+@metrics.timed('create_account')
+def create_account(name, dob, home_address, country, phone_no, gender, password, special_code=None):
+    """Create an account, linking it to a matching account when its special code is given"""
+    name = name.capitalize()
+    success, message = check_account_details(dob, home_address, country, phone_no, gender, password)
+    if not success:
+        return False, message
+
+    if special_code is not None:
+        existing_acc_addr, existing_special_code = find_matching_account(name, dob, home_address, phone_no, gender)
+        if existing_acc_addr is None:
+            return False, "No account with matching personal details to link!"
+        if special_code != existing_special_code:
+            return False, "Incorrect special code!"
+    else:
+        special_code = generate_special_code()
+        if special_code is None:
+            return False, "No free special codes left!"
+
+    acc_address = find_free_account_address()
+    if acc_address is None:
+        return False, "No free account addresses left!"
+    accounts[acc_address] = new_account_record(name, dob, home_address, country, phone_no, gender,
+                                               passwords.hash_password(password), special_code)
+    journal.record('create', acc_address, account=accounts[acc_address])
+    return True, (acc_address, special_code)
+
+
+def check_account_locked(acc_address):
+    """Check if account is locked and return lock status"""
+    return lockouts.check(acc_address)
+
+
+@metrics.timed('find_login_account')
+def find_login_account(name, special_code, acc_address):
+    """Check that the account exists and matches the name and special code"""
+    if acc_address in accounts:
+        account = accounts[acc_address]
+        if account['name'] == name.capitalize() and account['special_code'] == special_code:
+            return True, acc_address
+    return False, "Account not found or details don't exist!"
+
+
+@metrics.timed('attempt_password')
+def attempt_password(acc_address, password):
+    """Check one password attempt, locking the account after too many failures
+
+    The password is hashed before the account lock is taken, so a slow hash
+    never holds up deposits or transfers on the same account; the lockout
+    and the stored password are checked again under the lock.
+    """
+    while True:
+        is_locked, remaining = check_account_locked(acc_address)
+        if is_locked:
+            return False, "Account locked! Time remaining: " + str(remaining) + " seconds"
+        stored = accounts[acc_address]['password']
+        correct = passwords.verify_password(password, stored, use_cache=False)
+        new_hash = None
+        if correct and passwords.needs_rehash(stored):
+            # Plain text from before hashing, or an old cost setting
+            new_hash = passwords.hash_password(password)
+
+        with account_transaction(acc_address):
+            if accounts[acc_address]['password'] != stored:
+                # Rehashed by another login meanwhile: check against the new form
+                continue
+            is_locked, remaining = check_account_locked(acc_address)
+            if is_locked:
+                return False, "Account locked! Time remaining: " + str(remaining) + " seconds"
+
+            if correct:
+                # Successful login - reset attempts
+                lockouts.record_success(acc_address)
+                if new_hash is not None:
+                    accounts[acc_address]['password'] = new_hash
+                    accounts.save(acc_address)
+                    journal.record('password', acc_address, password=new_hash)
+                return True, acc_address
+
+            attempts_left = lockouts.record_failure(acc_address)
+            if attempts_left > 0:
+                return False, "Incorrect password! " + str(attempts_left) + " attempt(s) remaining."
+
+            # Account is now locked; save it so a restart does not lift the lockout
+            locked_accounts[acc_address] = time.time()
+            return False, "Too many wrong attempts! Account locked for " + str(LOCKOUT_SECONDS) + " seconds."
+
+
+@metrics.timed('login')
+def login(name, special_code, acc_address, password):
+    """Log in with account details and password in one call"""
+    success, result = find_login_account(name, special_code, acc_address)
+    if not success:
+        return success, result
+    return attempt_password(acc_address, password)
+
+
+def check_switch_target(current_acc_address, target_acc_address):
+    """Check that the target account exists and is linked to the current one"""
+    if target_acc_address not in accounts:
+        return False, "Account not found!"
+    if accounts[target_acc_address]['special_code'] != accounts[current_acc_address]['special_code']:
+        return False, "This account does not belong to you!"
+    return True, target_acc_address
+
+
+@metrics.timed('switch_account')
+def switch_account(current_acc_address, target_acc_address, password):
+    """Switch to a linked account after checking its password"""
+    success, result = check_switch_target(current_acc_address, target_acc_address)
+    if not success:
+        return success, result
+    if not passwords.verify_password(password, accounts[target_acc_address]['password']):
+        return False, "Incorrect password!"
+    return True, target_acc_address
+
+
+@metrics.timed('deposit')
+def deposit(acc_address, amount):
+    """Add money to an account and return the new balance"""
+    if type(amount) is not int:
+        return False, "Amount must be a whole number of cents!"
+    if amount <= 0:
+        return False, "Amount must be greater than zero!"
+
+    with account_transaction(acc_address):
+        accounts[acc_address]['balance'] += amount
+        accounts.save(acc_address)
+        journal.record('deposit', acc_address, amount=amount, balance=accounts[acc_address]['balance'])
+        return True, accounts[acc_address]['balance']
+
+
+@metrics.timed('withdraw')
+def withdraw(acc_address, amount):
+    """Take money from an account and return the new balance"""
+    if type(amount) is not int:
+        return False, "Amount must be a whole number of cents!"
+    if amount <= 0:
+        return False, "Amount must be greater than zero!"
+    with account_transaction(acc_address):
+        if accounts[acc_address]['balance'] < amount:
+            return False, "Insufficient balance!"
+
+        accounts[acc_address]['balance'] -= amount
+        accounts.save(acc_address)
+        journal.record('withdraw', acc_address, amount=amount, balance=accounts[acc_address]['balance'])
+        return True, accounts[acc_address]['balance']
+
+
+@metrics.timed('transfer')
+def transfer(acc_address, target_acc_address, amount):
+    """Move money to another account and return the new balance"""
+    if type(amount) is not int:
+        return False, "Amount must be a whole number of cents!"
+    if amount <= 0:
+        return False, "Amount must be greater than zero!"
+    if target_acc_address == acc_address:
+        return False, "Cannot transfer to the same account!"
+    if target_acc_address not in accounts:
+        return False, "Account not found!"
+
+    with account_transaction(acc_address, target_acc_address):
+        if accounts[acc_address]['balance'] < amount:
+            return False, "Insufficient balance!"
+
+        accounts[acc_address]['balance'] -= amount
+        accounts[target_acc_address]['balance'] += amount
+        accounts.save_many([acc_address, target_acc_address])
+        journal.record('transfer', acc_address, to=target_acc_address, amount=amount,
+                       balance=accounts[acc_address]['balance'],
+                       to_balance=accounts[target_acc_address]['balance'])
+        return True, accounts[acc_address]['balance']
+
+
+@metrics.timed('get_balance')
+def get_balance(acc_address):
+    """Return the current balance"""
+    return True, accounts[acc_address]['balance']
+
+
+def find_payment_plan(plan_name):
+    """Return the installment interval in months for a payment plan name"""
+    for name, interval_months in PAYMENT_PLANS.values():
+        if name == plan_name:
+            return interval_months
+    return None
+
+
+@metrics.timed('apply_loan')
+def apply_loan(acc_address, amount, loan_type, plan_name, special_code, password):
+    """Approve a loan after verifying the special code and password"""
+    account = accounts[acc_address]
+
+    if type(amount) is not int:
+        return False, "Amount must be a whole number of cents!"
+    if amount <= 0:
+        return False, "Invalid amount! Amount must be greater than zero."
+    if loan_type not in LOAN_TYPES.values():
+        return False, "Invalid loan type!"
+    interval_months = find_payment_plan(plan_name)
+    if interval_months is None:
+        return False, "Invalid payment plan!"
+    if special_code != account['special_code']:
+        return False, "Incorrect special code! Authentication failed."
+    if not passwords.verify_password(password, account['password']):
+        return False, "Incorrect password! Authentication failed."
+
+    # Calculate loan details
+    interest_amount = money.apply_rate(amount, INTEREST_RATE)
+    total_payable = amount + interest_amount
+
+    # Calculate installment amount based on payment plan (rounded up to the cent)
+    total_installments = PLAN_INSTALLMENTS[interval_months]
+    installment_amount = money.installment(total_payable, total_installments)
+
+    loan = {
+        'principal': amount,
+        'interest_rate': INTEREST_RATE,
+        'interest_amount': interest_amount,
+        'total_payable': total_payable,
+        'paid_amount': 0,
+        'remaining_amount': total_payable,
+        'payment_plan': plan_name,
+        'installment_interval_months': interval_months,
+        'suggested_installment': installment_amount,
+        'total_installments': total_installments,
+        'installments_paid': 0,
+        'start_date': time.strftime("%d/%m/%Y", time.localtime()),
+        'last_payment_date': None
+    }
+
+    # Imported here: scoring uses loan_book, which imports this module
+    import scoring
+
+    with account_transaction(acc_address):
+        approved, score, reason = scoring.evaluate(acc_address, total_payable, loan_type)
+        if not approved:
+            return False, "Loan declined! " + reason
+        # Read again under the lock: the cache may have dropped and reloaded the record since
+        account = accounts[acc_address]
+        if 'loans' not in account:
+            account['loans'] = {}
+        if loan_type not in account['loans']:
+            account['loans'][loan_type] = []
+        account['loans'][loan_type].append(loan)
+        # Let the nightly loan batch pick the account up when the first installment falls due
+        first_due_day = installment_due_day(datetime.date.today().toordinal(), 1, total_installments)
+        if account.get('loan_due_day') is None or first_due_day < account['loan_due_day']:
+            account['loan_due_day'] = first_due_day
+        accounts.save(acc_address)
+        journal.record('apply_loan', acc_address, loan_type=loan_type, loans=account['loans'][loan_type],
+                       loan_due_day=account['loan_due_day'])
+        return True, loan
+
+
+def get_active_loans(acc_address, loan_type):
+    """Return the loans of one type that still have an amount remaining"""
+    loans = accounts[acc_address].get('loans', {}).get(loan_type, [])
+    return [loan for loan in loans if loan['remaining_amount'] > 0]
+
+
+@metrics.timed('repay_loan')
+def repay_loan(acc_address, loan_type, loan_number, amount):
+    """Pay amount towards the loan_number-th active loan of a type"""
+    with account_transaction(acc_address):
+        account = accounts[acc_address]
+        active_loans = get_active_loans(acc_address, loan_type)
+        if not active_loans:
+            return False, "No active loans under this category."
+        if loan_number < 1 or loan_number > len(active_loans):
+            return False, "Invalid selection!"
+        loan = active_loans[loan_number - 1]
+
+        if type(amount) is not int:
+            return False, "Amount must be a whole number of cents!"
+        if amount <= 0:
+            return False, "Invalid amount! Amount must be greater than zero."
+        if account['balance'] < amount:
+            return False, "Insufficient balance!"
+        if amount > loan['remaining_amount']:
+            return False, "Amount exceeds remaining loan balance!"
+
+        # Process payment
+        account['balance'] -= amount
+        loan['paid_amount'] += amount
+        loan['remaining_amount'] -= amount
+        loan['installments_paid'] += 1
+        loan['last_payment_date'] = time.strftime("%d/%m/%Y", time.localtime())
+
+        fully_repaid = loan['remaining_amount'] <= 0
+        if fully_repaid:
+            # Remove fully paid loan from list
+            original_loans = account['loans'][loan_type]
+            for i, l in enumerate(original_loans):
+                if l is loan:
+                    original_loans.pop(i)
+                    break
+
+        accounts.save(acc_address)
+        journal.record('repay_loan', acc_address, loan_type=loan_type, amount=amount,
+                       balance=account['balance'], loans=account['loans'][loan_type])
+        return True, {
+            'amount': amount,
+            'balance': account['balance'],
+            'loan': loan,
+            'fully_repaid': fully_repaid
+        }
+
+
+restore_lockouts()
@@ -0,0 +1,120 @@
+"""Bulk settlement of transfer instructions
+
+Instructions are CSV lines of the form
+    from_address,to_address,amount
+with the amount in dollars (e.g. 12.50), and are settled in batches. Within a batch every instruction is checked in
+order against running balances; accepted instructions are netted into one
+new balance per account, and the batch is applied under the locks of all
+accounts it touches and written in a single storage transaction.
+
+Usage: python settlement.py <instructions.csv> [rejects.csv]
+"""
+import sys
+import journal
+from money import to_cents
+from data_storage import accounts
+from transactions import account_transaction
+
+BATCH_SIZE = 100000
+
+
+def parse_instruction(line):
+    """Parse one instruction line into (from_address, to_address, amount in cents)"""
+    parts = [part.strip() for part in line.split(',')]
+    if len(parts) != 3:
+        return False, "Expected from_address,to_address,amount"
+    from_address, to_address, amount = parts
+    try:
+        amount = to_cents(amount)
+    except ValueError:
+        return False, "Invalid amount!"
+    if amount <= 0:
+        return False, "Amount must be greater than zero!"
+    if from_address == to_address:
+        return False, "Cannot transfer to the same account!"
+    return True, (from_address, to_address, amount)
+
+
+def settle_batch(batch):
+    """Settle a list of (line_no, line) pairs and return (accepted_count, rejects)"""
+    rejects = []
+    instructions = []
+    addresses = set()
+    for line_no, line in batch:
+        success, result = parse_instruction(line)
+        if not success:
+            rejects.append((line_no, line, result))
+            continue
+        instructions.append((line_no, line, result))
+        addresses.update(result[:2])
+
+    missing = set(acc_address for acc_address in addresses if acc_address not in accounts)
+    addresses -= missing
+
+    accepted = 0
+    with account_transaction(*addresses):
+        balances = dict((acc_address, accounts[acc_address]['balance']) for acc_address in addresses)
+        for line_no, line, (from_address, to_address, amount) in instructions:
+            if from_address in missing or to_address in missing:
+                rejects.append((line_no, line, "Account not found!"))
+            elif balances[from_address] < amount:
+                rejects.append((line_no, line, "Insufficient balance!"))
+            else:
+                balances[from_address] -= amount
+                balances[to_address] += amount
+                accepted += 1
+
+        changed = [acc_address for acc_address in addresses
+                   if balances[acc_address] != accounts[acc_address]['balance']]
+        for acc_address in changed:
+            accounts[acc_address]['balance'] = balances[acc_address]
+        accounts.save_many(changed)
+        if changed:
+            journal.record('settle', None, balances=dict((acc_address, balances[acc_address]) for acc_address in changed))
+
+    return accepted, rejects
+
+
+def settle_into_summary(batch, summary, rejects_file):
+    """Settle one batch, add its counts to summary and record its rejected lines"""
+    accepted, rejects = settle_batch(batch)
+    summary['accepted'] += accepted
+    summary['rejected'] += len(rejects)
+    if rejects_file is not None:
+        for line_no, line, reason in sorted(rejects):
+            rejects_file.write(str(line_no) + "," + line + "," + reason + "\n")
+
+
+def settle_lines(lines, rejects_file=None, batch_size=BATCH_SIZE):
+    """Settle an iterable of instruction lines and return a summary dictionary"""
+    summary = {'accepted': 0, 'rejected': 0}
+    batch = []
+    for line_no, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        batch.append((line_no, line))
+        if len(batch) >= batch_size:
+            settle_into_summary(batch, summary, rejects_file)
+            batch = []
+    if batch:
+        settle_into_summary(batch, summary, rejects_file)
+    return summary
+
+
+def settle_file(path, rejects_path=None, batch_size=BATCH_SIZE):
+    """Settle every instruction in a file, writing rejected lines to rejects_path"""
+    with open(path) as lines:
+        if rejects_path is None:
+            return settle_lines(lines, None, batch_size)
+        with open(rejects_path, 'w') as rejects_file:
+            return settle_lines(lines, rejects_file, batch_size)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python settlement.py <instructions.csv> [rejects.csv]")
+        sys.exit(1)
+    summary = settle_file(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
+    print("Accepted: " + str(summary['accepted']))
+    print("Rejected: " + str(summary['rejected']))
@@ -0,0 +1,186 @@
+"""Operations run inside one shard worker process of sharding.py
+
+A shard is an ordinary copy of the bank (services, data_storage, journal)
+over its own database, holding only the accounts whose address it owns.
+Besides the services operations it runs the shard's side of cross-shard
+transfers, which sharding.py drives as a two-phase commit:
+    prepare_credit  - target shard: the account exists, note the transfer
+    prepare_debit   - source shard: take the money out into a hold
+    commit_credit   - target shard: add the money (the transfer is now done)
+    finalize_debit  - source shard: drop the hold
+    forget_credit   - target shard: drop the note
+or, when a prepare fails, abort_debit / abort_credit. Holds and notes are
+kept in the account records (pending_transfers / incoming_transfers), so
+each step is one atomic write, and the transfers table lists the
+accounts holding them so recover() can finish them after a crash.
+"""
+import journal
+import services
+from data_storage import DEFAULT_ACCOUNTS, PersistentDict, accounts, connection, storage_lock
+from transactions import account_transaction
+
+# Transfer id -> {'acc', 'role', 'to'} for every transfer this shard has prepared and not yet cleaned
+# up; written before the account record so no prepared transfer can be missed by recovery
+transfers = PersistentDict(connection, 'transfers', storage_lock)
+
+
+def start_shard():
+    """Keep the default accounts only in the shard that owns their address"""
+    for acc_address in DEFAULT_ACCOUNTS:
+        if not services.owns_number(int(acc_address)) and acc_address in accounts:
+            del accounts[acc_address]
+
+
+def has_account(acc_address):
+    """Check whether an account exists in this shard"""
+    return True, acc_address in accounts
+
+
+def record_transfer_state(op, acc_address):
+    """Save an account after a transfer step and journal its balance, holds and notes"""
+    account = accounts[acc_address]
+    for field in ('pending_transfers', 'incoming_transfers'):
+        if field in account and not account[field]:
+            del account[field]
+    accounts.save(acc_address)
+    journal.record(op, acc_address, balance=account['balance'],
+                   pending_transfers=account.get('pending_transfers'),
+                   incoming_transfers=account.get('incoming_transfers'))
+
+
+def prepare_credit(transfer_id, acc_address, amount):
+    """Phase one on the target shard: check the account and note the incoming transfer"""
+    if acc_address not in accounts:
+        return False, "Account not found!"
+    with account_transaction(acc_address):
+        transfers[transfer_id] = {'acc': acc_address, 'role': 'credit', 'to': acc_address}
+        accounts[acc_address].setdefault('incoming_transfers', {})[transfer_id] = {'amount': amount,
+                                                                                   'state': 'prepared'}
+        record_transfer_state('transfer_prepare', acc_address)
+        return True, acc_address
+
+
+def prepare_debit(transfer_id, acc_address, target_acc_address, amount):
+    """Phase one on the source shard: move the amount out of the balance into a hold"""
+    with account_transaction(acc_address):
+        account = accounts[acc_address]
+        if account['balance'] < amount:
+            return False, "Insufficient balance!"
+        transfers[transfer_id] = {'acc': acc_address, 'role': 'debit', 'to': target_acc_address}
+        account['balance'] -= amount
+        account.setdefault('pending_transfers', {})[transfer_id] = {'to': target_acc_address, 'amount': amount}
+        record_transfer_state('transfer_prepare', acc_address)
+        return True, account['balance']
+
+
+def commit_credit(transfer_id, acc_address):
+    """Phase two on the target shard: add the amount; once this is saved the transfer has happened"""
+    with account_transaction(acc_address):
+        account = accounts[acc_address]
+        incoming = account.get('incoming_transfers', {}).get(transfer_id)
+        if incoming is not None and incoming['state'] == 'prepared':
+            account['balance'] += incoming['amount']
+            incoming['state'] = 'committed'
+            record_transfer_state('transfer_commit', acc_address)
+        return True, account['balance']
+
+
+def credit_state(transfer_id, acc_address):
+    """'prepared', 'committed' or None for a transfer into an account of this shard"""
+    if acc_address not in accounts:
+        return True, None
+    incoming = accounts[acc_address].get('incoming_transfers', {}).get(transfer_id)
+    return True, None if incoming is None else incoming['state']
+
+
+def finish(transfer_id, acc_address, field, refund):
+    """Drop a hold or note, giving a hold's amount back when refund is set"""
+    with account_transaction(acc_address):
+        if acc_address in accounts:
+            account = accounts[acc_address]
+            entry = account.get(field, {}).pop(transfer_id, None)
+            if entry is not None:
+                if refund:
+                    account['balance'] += entry['amount']
+                record_transfer_state('transfer_finish', acc_address)
+        transfers.pop(transfer_id, None)
+        return True, None
+
+
+def finalize_debit(transfer_id, acc_address):
+    """Phase two on the source shard: the credit is committed, drop the hold"""
+    return finish(transfer_id, acc_address, 'pending_transfers', False)
+
+
+def abort_debit(transfer_id, acc_address):
+    """Give a held amount back to the source account"""
+    return finish(transfer_id, acc_address, 'pending_transfers', True)
+
+
+def forget_credit(transfer_id, acc_address):
+    """Drop the note of a committed transfer once the source has dropped its hold"""
+    return finish(transfer_id, acc_address, 'incoming_transfers', False)
+
+
+def abort_credit(transfer_id, acc_address):
+    """Drop the note of a transfer that was never committed"""
+    if credit_state(transfer_id, acc_address)[1] == 'committed':
+        return False, "Transfer already committed!"
+    return finish(transfer_id, acc_address, 'incoming_transfers', False)
+
+
+def find_matching_account(name, dob, home_address, phone_no, gender):
+    """services.find_matching_account as a (success, result) operation"""
+    return True, services.find_matching_account(name, dob, home_address, phone_no, gender)
+
+
+def in_doubt():
+    """List (transfer_id, acc_address, role, to) for every transfer this shard has not cleaned up"""
+    return True, [(transfer_id, entry['acc'], entry['role'], entry['to']) for transfer_id, entry in transfers.items()]
+
+
+OPERATIONS = {
+    'create_account': services.create_account,
+    'login': services.login,
+    'switch_account': services.switch_account,
+    'deposit': services.deposit,
+    'withdraw': services.withdraw,
+    'transfer': services.transfer,
+    'get_balance': services.get_balance,
+    'apply_loan': services.apply_loan,
+    'repay_loan': services.repay_loan,
+    'find_matching_account': find_matching_account,
+    'has_account': has_account,
+    'prepare_credit': prepare_credit,
+    'prepare_debit': prepare_debit,
+    'commit_credit': commit_credit,
+    'credit_state': credit_state,
+    'finalize_debit': finalize_debit,
+    'abort_debit': abort_debit,
+    'forget_credit': forget_credit,
+    'abort_credit': abort_credit,
+    'in_doubt': in_doubt
+}
+
+
+def serve(conn):
+    """Run batches of (operation, args) received on a pipe until None arrives
+
+    Each batch is answered with one (raised, result) pair per request; raised
+    is True when the operation raised result as an exception.
+    """
+    start_shard()
+    journal.open_journal()
+    while True:
+        batch = conn.recv()
+        if batch is None:
+            break
+        results = []
+        for op, args in batch:
+            try:
+                results.append((False, OPERATIONS[op](*args)))
+            except Exception as e:
+                results.append((True, e))
+        conn.send(results)
+    journal.close_journal()
+    conn.close()
@@ -0,0 +1,245 @@
+"""Account store split across worker processes by account address
+
+ShardedBank starts N worker processes (shards). Each runs the usual
+services over its own database (shard<k>.db) and journal, and owns the
+accounts whose address is k modulo N; it also only hands out addresses
+and special codes that are k modulo N, so every shard can create
+accounts without asking the others. ShardedBank has the same operations
+as services, returning the same (success, result) tuples, and sends each
+one to the shard that owns the account:
+- a new account goes to the shard of the account it is linked to, or to
+  the next shard in turn, so linked accounts always share a shard
+- a transfer between two shards is a two-phase commit (see
+  shard_worker): the target shard notes it, the source shard holds the
+  money, and the transfer happens when the target shard commits the
+  credit. recover() finishes or undoes transfers that a crash left half
+  done, and runs when a ShardedBank starts.
+
+Requests travel over one pipe per shard; call_many() sends a whole batch
+of requests to every shard at once and the shards work in parallel.
+
+Usage: python sharding.py <shards> <directory>  (start the shards once, recovering in-doubt transfers)
+"""
+import multiprocessing
+import os
+import sys
+import threading
+import uuid
+
+
+def shard_of(acc_address, count):
+    """The shard owning an account address"""
+    return int(acc_address) % count
+
+
+def shard_environment(index, count, directory):
+    """Environment variables pointing a worker at one shard's database and journal"""
+    return {
+        'BANK_DB': os.path.join(directory, 'shard' + str(index) + '.db'),
+        'BANK_JOURNAL': os.path.join(directory, 'shard' + str(index) + '_journal.log'),
+        'BANK_SHARD': str(index) + '/' + str(count)
+    }
+
+
+def run_shard(conn):
+    """Worker process entry point"""
+    import shard_worker
+    shard_worker.serve(conn)
+
+
+class ShardedBank:
+    """Routes banking operations to the worker process owning each account"""
+
+    def __init__(self, count, directory):
+        self.count = count
+        # Spawned, not forked, so no worker inherits this process's open database
+        context = multiprocessing.get_context('spawn')
+        self.pipes = []
+        self.locks = []
+        self.processes = []
+        saved = dict((name, os.environ.get(name)) for name in ('BANK_DB', 'BANK_JOURNAL', 'BANK_SHARD'))
+        for index in range(count):
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(target=run_shard, args=(child_conn,), daemon=True)
+            # A spawned worker gets the environment as it is at start(), before it imports anything (even
+            # the parent's main module, which may import data_storage)
+            os.environ.update(shard_environment(index, count, directory))
+            process.start()
+            self.pipes.append(parent_conn)
+            self.locks.append(threading.Lock())
+            self.processes.append(process)
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        self.next_shard = 0
+        self.recover()
+
+    def call_many(self, requests):
+        """Run (shard, op, args) requests, each shard's in order and the shards in parallel; returns the results"""
+        batches = {}
+        for position, (shard, op, args) in enumerate(requests):
+            batches.setdefault(shard, []).append((position, op, args))
+        shards = sorted(batches)
+        for shard in shards:
+            self.locks[shard].acquire()
+        try:
+            for shard in shards:
+                self.pipes[shard].send([(op, args) for position, op, args in batches[shard]])
+            results = [None] * len(requests)
+            error = None
+            # Every shard's reply is read before raising, or it would be taken as the reply to a later call
+            for shard in shards:
+                for (position, op, args), (raised, result) in zip(batches[shard], self.pipes[shard].recv()):
+                    if raised:
+                        error = error or result
+                    else:
+                        results[position] = result
+            if error is not None:
+                raise error
+            return results
+        finally:
+            for shard in shards:
+                self.locks[shard].release()
+
+    def call(self, shard, op, *args):
+        """Run one operation on one shard"""
+        return self.call_many([(shard, op, args)])[0]
+
+    def call_account(self, op, acc_address, *args):
+        """Run an operation on the shard owning acc_address"""
+        return self.call(shard_of(acc_address, self.count), op, acc_address, *args)
+
+    def create_account(self, name, dob, home_address, country, phone_no, gender, password, special_code=None):
+        """services.create_account on the shard of the linked account, or the next shard in turn"""
+        if special_code is not None:
+            details = (name.capitalize(), dob, home_address, phone_no, gender)
+            for shard, (success, (acc_address, code)) in enumerate(
+                    self.call_many([(shard, 'find_matching_account', details) for shard in range(self.count)])):
+                if acc_address is not None:
+                    return self.call(shard, 'create_account', name, dob, home_address, country, phone_no, gender,
+                                     password, special_code)
+        with self.locks[0]:
+            shard = self.next_shard
+            self.next_shard = (shard + 1) % self.count
+        return self.call(shard, 'create_account', name, dob, home_address, country, phone_no, gender, password,
+                         special_code)
+
+    def login(self, name, special_code, acc_address, password):
+        try:
+            shard = shard_of(acc_address, self.count)
+        except ValueError:
+            return False, "Account not found or details don't exist!"
+        return self.call(shard, 'login', name, special_code, acc_address, password)
+
+    def switch_account(self, current_acc_address, target_acc_address, password):
+        try:
+            target = shard_of(target_acc_address, self.count)
+        except ValueError:
+            return False, "Account not found!"
+        if target != shard_of(current_acc_address, self.count):
+            # Linked accounts share a shard, so an account on another shard is never linked
+            if self.call_account('has_account', target_acc_address)[1]:
+                return False, "This account does not belong to you!"
+            return False, "Account not found!"
+        return self.call_account('switch_account', current_acc_address, target_acc_address, password)
+
+    def deposit(self, acc_address, amount):
+        return self.call_account('deposit', acc_address, amount)
+
+    def withdraw(self, acc_address, amount):
+        return self.call_account('withdraw', acc_address, amount)
+
+    def get_balance(self, acc_address):
+        return self.call_account('get_balance', acc_address)
+
+    def apply_loan(self, acc_address, amount, loan_type, plan_name, special_code, password):
+        return self.call_account('apply_loan', acc_address, amount, loan_type, plan_name, special_code, password)
+
+    def repay_loan(self, acc_address, loan_type, loan_number, amount):
+        return self.call_account('repay_loan', acc_address, loan_type, loan_number, amount)
+
+    def transfer(self, acc_address, target_acc_address, amount):
+        """services.transfer, as a two-phase commit when the accounts are on different shards"""
+        source = shard_of(acc_address, self.count)
+        try:
+            target = shard_of(target_acc_address, self.count)
+        except ValueError:
+            return False, "Account not found!"
+        if source == target:
+            return self.call(source, 'transfer', acc_address, target_acc_address, amount)
+        if type(amount) is not int:
+            return False, "Amount must be a whole number of cents!"
+        if amount <= 0:
+            return False, "Amount must be greater than zero!"
+
+        transfer_id = uuid.uuid4().hex
+        success, result = self.call(target, 'prepare_credit', transfer_id, target_acc_address, amount)
+        if not success:
+            return success, result
+        success, balance = self.call(source, 'prepare_debit', transfer_id, acc_address, target_acc_address, amount)
+        if not success:
+            self.call(target, 'abort_credit', transfer_id, target_acc_address)
+            return success, balance
+        self.call(target, 'commit_credit', transfer_id, target_acc_address)
+        self.call(source, 'finalize_debit', transfer_id, acc_address)
+        self.call(target, 'forget_credit', transfer_id, target_acc_address)
+        return True, balance
+
+    def recover(self):
+        """Finish or undo every transfer left half done; returns (finished, undone) counts
+
+        A transfer has happened exactly when its target shard committed the
+        credit, so a hold is dropped if the credit is committed and given back
+        otherwise. Only call this while no transfers are running.
+        """
+        finished = 0
+        undone = 0
+        debits = {}
+        credits = {}
+        for success, entries in self.call_many([(shard, 'in_doubt', ()) for shard in range(self.count)]):
+            for transfer_id, acc_address, role, target_acc_address in entries:
+                if role == 'debit':
+                    debits[transfer_id] = (acc_address, target_acc_address)
+                else:
+                    credits[transfer_id] = acc_address
+
+        for transfer_id, (acc_address, target_acc_address) in debits.items():
+            source = shard_of(acc_address, self.count)
+            success, state = self.call(shard_of(target_acc_address, self.count), 'credit_state', transfer_id,
+                                       target_acc_address)
+            if state == 'committed':
+                self.call(source, 'finalize_debit', transfer_id, acc_address)
+                finished += 1
+            else:
+                self.call(source, 'abort_debit', transfer_id, acc_address)
+                undone += 1
+        for transfer_id, acc_address in credits.items():
+            target = shard_of(acc_address, self.count)
+            success, state = self.call(target, 'credit_state', transfer_id, acc_address)
+            if state == 'committed':
+                self.call(target, 'forget_credit', transfer_id, acc_address)
+            else:
+                self.call(target, 'abort_credit', transfer_id, acc_address)
+                if transfer_id not in debits:
+                    undone += 1
+        return finished, undone
+
+    def close(self):
+        """Stop every shard after it finishes its current batch"""
+        for pipe, lock, process in zip(self.pipes, self.locks, self.processes):
+            with lock:
+                pipe.send(None)
+            process.join()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python sharding.py <shards> <directory>")
+        sys.exit(1)
+    # Starting the shards runs recover(); running it again reports anything still left
+    bank = ShardedBank(int(sys.argv[1]), sys.argv[2])
+    finished, undone = bank.recover()
+    print("Shards started: " + str(bank.count) + ", transfers still in doubt: " + str(finished + undone))
+    bank.close()
@@ -0,0 +1,250 @@
+"""Binary snapshots of the accounts for fast cold starts
+
+A snapshot file holds every account record as compact JSON, followed by
+a fixed-width index sorted by account address and the small tables:
+    header  - magic, version, record count, journal offset, index offset,
+              tables offset
+    records - one JSON record after another
+    index   - (address, record offset, record length) per account
+    tables  - one JSON object holding the rows of meta (the allocators, the
+              money format) and locked_accounts
+Opening a snapshot only memory-maps the file and reads the header, so it
+takes milliseconds at any size. A record is found by binary search over
+the index and decoded the first time it is asked for.
+
+The journal offset is the size of the journal when the snapshot was
+taken; entries after it (the tail) are replayed on top of the snapshot.
+Journal entries hold values after the change, so an entry that is both
+in the snapshot and in the tail is harmless. The small tables are not
+journaled and are restored as they were when the snapshot was taken.
+
+Usage: python snapshot.py write <snapshot_path>  (snapshot the BANK_DB database)
+       python snapshot.py restore <snapshot_path> <journal_path> <db_path>
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+from collections.abc import MutableMapping
+import journal
+
+MAGIC = b'BANKSNAP'
+VERSION = 2
+HEADER = struct.Struct('<8sIQQQQ')  # magic, version, count, journal offset, index offset, tables offset
+ENTRY = struct.Struct('<16sQI')     # address (padded with zero bytes), record offset, record length
+KEY_BYTES = 16
+BATCH_SIZE = 10000
+# Tables besides accounts carried in a snapshot
+TABLES = ('meta', 'locked_accounts')
+
+
+def write_snapshot(path, rows, journal_offset=0, tables=None):
+    """Write (address, record) rows, sorted by address, to a snapshot file; returns the record count
+
+    Records may be dictionaries or JSON text. tables maps a table name to
+    its (key, JSON text) rows, read after the records. The file is written
+    next to path and renamed over it once complete, so a crash never
+    leaves half a snapshot behind.
+    """
+    index = bytearray()
+    previous = None
+    count = 0
+    with open(path + '.tmp', 'wb') as output:
+        output.write(HEADER.pack(MAGIC, VERSION, 0, journal_offset, 0, 0))
+        offset = HEADER.size
+        for key, record in rows:
+            key_bytes = key.encode()
+            if len(key_bytes) > KEY_BYTES:
+                raise ValueError("Account address too long for a snapshot: " + key)
+            if previous is not None and key_bytes <= previous:
+                raise ValueError("Snapshot rows must be sorted by account address")
+            if not isinstance(record, str):
+                record = json.dumps(record, separators=(',', ':'))
+            data = record.encode()
+            output.write(data)
+            index += ENTRY.pack(key_bytes, offset, len(data))
+            offset += len(data)
+            previous = key_bytes
+            count += 1
+        output.write(index)
+        tables_offset = offset + len(index)
+        output.write(json.dumps(dict((name, [list(row) for row in table])
+                                     for name, table in (tables or {}).items())).encode())
+        # Fill in the real header now the count and positions are known
+        output.seek(0)
+        output.write(HEADER.pack(MAGIC, VERSION, count, journal_offset, offset, tables_offset))
+        output.flush()
+        os.fsync(output.fileno())
+    os.replace(path + '.tmp', path)
+    return count
+
+
+def table_rows(conn, lock, table='accounts', batch_size=BATCH_SIZE):
+    """Yield (key, JSON text) for every row of a PersistentDict table in key order"""
+    with lock:
+        cursor = conn.execute("SELECT key, value FROM " + table + " ORDER BY key")
+    while True:
+        with lock:
+            rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        for row in rows:
+            yield row
+
+
+def take_snapshot(path, conn, lock, journal_path=journal.JOURNAL_PATH):
+    """Snapshot the accounts table and the small tables of a database; returns the record count"""
+    # Every change is saved before it is journaled, so anything the scan
+    # below misses is journaled after this offset
+    journal.flush()
+    journal_offset = os.path.getsize(journal_path) if os.path.exists(journal_path) else 0
+    # Read after the accounts, so the allocators are at least as far on as the accounts snapshotted
+    tables = dict((name, table_rows(conn, lock, name)) for name in TABLES)
+    return write_snapshot(path, table_rows(conn, lock), journal_offset, tables)
+
+
+class Snapshot(MutableMapping):
+    """Accounts read from a snapshot file, each record decoded on first access
+
+    Records changed or added after opening (e.g. by replaying the journal
+    tail) are kept in memory on top of the file.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version = HEADER.unpack_from(self.map, 0)[:2]
+        if magic != MAGIC:
+            raise ValueError(path + " is not a snapshot file")
+        if version != VERSION:
+            raise ValueError(path + " is an old snapshot version, take a new snapshot")
+        self.count, self.journal_offset, self.index_offset, self.tables_offset = HEADER.unpack_from(self.map, 0)[2:]
+        self.cache = {}
+        self.added = []
+
+    def entry(self, i):
+        """The (address, record offset, record length) of the i-th index entry"""
+        key, offset, length = ENTRY.unpack_from(self.map, self.index_offset + i * ENTRY.size)
+        return key.rstrip(b'\0').decode(), offset, length
+
+    def locate(self, key):
+        """Binary search the index for an address; returns (record offset, record length) or None"""
+        target = key.encode().ljust(KEY_BYTES, b'\0')
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            position = self.index_offset + middle * ENTRY.size
+            found = self.map[position:position + KEY_BYTES]
+            if found < target:
+                low = middle + 1
+            elif found > target:
+                high = middle
+            else:
+                return ENTRY.unpack_from(self.map, position)[1:]
+        return None
+
+    def __getitem__(self, key):
+        if key in self.cache:
+            return self.cache[key]
+        location = self.locate(key)
+        if location is None:
+            raise KeyError(key)
+        offset, length = location
+        record = json.loads(self.map[offset:offset + length])
+        self.cache[key] = record
+        return record
+
+    def __setitem__(self, key, value):
+        if key not in self.cache and self.locate(key) is None:
+            self.added.append(key)
+        self.cache[key] = value
+
+    def __delitem__(self, key):
+        raise TypeError("Accounts cannot be deleted from a snapshot")
+
+    def __contains__(self, key):
+        return key in self.cache or self.locate(key) is not None
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self.entry(i)[0]
+        for key in self.added:
+            yield key
+
+    def __len__(self):
+        return self.count + len(self.added)
+
+    def iter_json(self):
+        """Yield (address, JSON text) for every record, only encoding the ones changed in memory"""
+        for i in range(self.count):
+            key, offset, length = self.entry(i)
+            if key in self.cache:
+                yield key, json.dumps(self.cache[key])
+            else:
+                yield key, self.map[offset:offset + length].decode()
+        for key in self.added:
+            yield key, json.dumps(self.cache[key])
+
+    def tables(self):
+        """The rows of the small tables: {table name: [(key, JSON text), ...]}"""
+        return dict((name, [tuple(row) for row in rows])
+                    for name, rows in json.loads(self.map[self.tables_offset:]).items())
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+def open_accounts(snapshot_path, journal_path=None):
+    """Open a snapshot and replay the journal entries written after it; returns (accounts, tail entries)"""
+    snapshot = Snapshot(snapshot_path)
+    if journal_path is None or not os.path.exists(journal_path):
+        return snapshot, 0
+    if os.path.getsize(journal_path) < snapshot.journal_offset:
+        snapshot.close()
+        raise ValueError(journal_path + " is older than the snapshot")
+    return snapshot, journal.replay(journal_path, snapshot, start=snapshot.journal_offset)
+
+
+def restore(snapshot, store, batch_size=BATCH_SIZE, tables=None):
+    """Copy every record of an opened snapshot into a PersistentDict; returns the record count
+
+    tables maps the names of the small tables to the PersistentDicts to
+    restore them into.
+    """
+    for name, rows in snapshot.tables().items():
+        if tables is not None and name in tables:
+            tables[name].write_json(rows)
+    count = 0
+    batch = []
+    for row in snapshot.iter_json():
+        batch.append(row)
+        if len(batch) >= batch_size:
+            store.write_json(batch)
+            count += len(batch)
+            batch = []
+    store.write_json(batch)
+    return count + len(batch)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == 'write':
+        from data_storage import connection, storage_lock
+        print("Wrote " + str(take_snapshot(sys.argv[2], connection, storage_lock)) + " accounts to " + sys.argv[2])
+    elif len(sys.argv) == 5 and sys.argv[1] == 'restore':
+        if os.path.exists(sys.argv[4]):
+            print("Refusing to overwrite existing database " + sys.argv[4])
+            sys.exit(1)
+        os.environ['BANK_DB'] = ':memory:'
+        from data_storage import PersistentDict, open_connection
+        snapshot, tail = open_accounts(sys.argv[2], sys.argv[3])
+        connection = open_connection(sys.argv[4])
+        count = restore(snapshot, PersistentDict(connection, 'accounts'),
+                        tables=dict((name, PersistentDict(connection, name)) for name in TABLES))
+        print("Restored " + str(count) + " accounts (" + str(tail) + " journal entries after the snapshot) into " +
+              sys.argv[4])
+    else:
+        print("Usage: python snapshot.py write <snapshot_path>")
+        print("       python snapshot.py restore <snapshot_path> <journal_path> <db_path>")
+        sys.exit(1)
@@ -0,0 +1,55 @@
+"""Per-account locks so concurrent drivers cannot interleave updates to an account
+
+Every balance or loan change runs inside account_transaction(). Locks are
+taken in sorted address order, so operations touching several accounts
+cannot deadlock, and operations on different accounts run in parallel.
+held_accounts lists the accounts currently inside a transaction, so the
+accounts cache never drops a record that may not be saved yet, and the
+on_hold hooks run when a transaction first takes hold of accounts.
+"""
+import threading
+from contextlib import contextmanager
+
+account_locks = {}
+_account_locks_guard = threading.Lock()
+# acc_address -> how many account_transaction blocks hold it (only the thread holding its lock changes an entry)
+held_accounts = {}
+# Called with the accounts a transaction has just taken hold of, before its block runs
+# (data_storage re-reads there what other processes changed)
+on_hold = []
+
+
+def get_account_lock(acc_address):
+    """Return the lock for one account, creating it on first use"""
+    lock = account_locks.get(acc_address)
+    if lock is None:
+        with _account_locks_guard:
+            lock = account_locks.setdefault(acc_address, threading.RLock())
+    return lock
+
+
+@contextmanager
+def account_transaction(*acc_addresses):
+    """Hold the locks of all given accounts for the duration of the block"""
+    addresses = sorted(set(acc_addresses))
+    locks = [get_account_lock(acc_address) for acc_address in addresses]
+    for lock in locks:
+        lock.acquire()
+    taken = []
+    for acc_address in addresses:
+        depth = held_accounts.get(acc_address, 0)
+        held_accounts[acc_address] = depth + 1
+        if depth == 0:
+            taken.append(acc_address)
+    try:
+        for hook in on_hold:
+            hook(taken)
+        yield
+    finally:
+        for acc_address in addresses:
+            if held_accounts[acc_address] == 1:
+                del held_accounts[acc_address]
+            else:
+                held_accounts[acc_address] -= 1
+        for lock in reversed(locks):
+            lock.release()
@@ -1,73 +1,123 @@
-import re
-
-def validate_date(date_str):
-    """Validate date format dd/mm/yyyy with any separator"""
-    try:
-        # Replace any separator with /
-        date_normalized = re.sub(r'[.,-/\s]', '/', date_str)
-        parts = date_normalized.split('/')
-        
-        if len(parts) != 3:
-            return False
-        
-        day = int(parts[0])
-        month = int(parts[1])
-        year = int(parts[2])
-        
-        # Check valid ranges
-        if day < 1 or day > 31:
-            return False
-        if month < 1 or month > 12:
-            return False
-        if year < 1900 or year > 2100:
-            return False
-        
-        return True
-    except:
-        return False
-
-def validate_home_address(address):
-    """Check if address contains only valid characters and is more than 5 characters"""
-    if len(address) <= 5:
-        return False
-    
-    has_alphabet = False
-    
-    # Check for valid characters only (letters, numbers, spaces, hyphens, commas)
-    for char in address:
-        if char.isalpha():
-            has_alphabet = True
-        elif not (char.isdigit() or char in ' ,-./'):
-            return False
-    
-    return has_alphabet
-
-def validate_phone(phone, min_digits=7, max_digits=15):
-    """Check if phone number is valid based on country standards"""
-    # Remove spaces and dashes
-    phone_clean = phone.replace(' ', '').replace('-', '')
-    
-    if len(phone_clean) < min_digits or len(phone_clean) > max_digits:
-        return False
-    
-    for char in phone_clean:
-        if not char.isdigit():
-            return False
-    
-    return True
-
-def validate_password(password):
-    """Check if password has minimum 8 characters, contains numbers and alphabets"""
-    if len(password) < 8:
-        return False
-    
-    has_number = False
-    has_alphabet = False
-    
-    for char in password:
-        if char.isdigit():
-            has_number = True
-        if char.isalpha():
-            has_alphabet = True
-    
-    return has_number and has_alphabet
\ No newline at end of file
+import re
+
+# Compiled once at import; the validators below only run these patterns
+DATE_PATTERN = re.compile(r'(\d+)[.,\-/\s](\d+)[.,\-/\s](\d+)')
+ADDRESS_PATTERN = re.compile(r'[\w ,\-./]+')
+LETTER_PATTERN = re.compile(r'[^\W\d_]')
+DIGIT_PATTERN = re.compile(r'\d')
+
+DAYS_IN_MONTH = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+# Digits in a phone number (without spaces or dashes) per country, any other country gets 7-15
+PHONE_DIGITS = {
+    'india': (10, 10),
+    'united states': (10, 10),
+    'usa': (10, 10),
+    'canada': (10, 10),
+    'united kingdom': (10, 11),
+    'uk': (10, 11),
+    'australia': (9, 10),
+    'germany': (10, 12),
+    'france': (9, 10),
+    'singapore': (8, 8),
+    'japan': (10, 11),
+    'china': (11, 11)
+}
+PHONE_PATTERNS = dict((country, re.compile(r'\d{' + str(low) + ',' + str(high) + '}'))
+                      for country, (low, high) in PHONE_DIGITS.items())
+DEFAULT_PHONE_PATTERN = re.compile(r'\d{7,15}')
+
+def is_leap_year(year):
+    """Check for a leap year in the Gregorian calendar"""
+    return year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+
+def check_calendar(day, month, year):
+    """Check that day/month/year is a real date between 1900 and 2100"""
+    if year < 1900 or year > 2100 or month < 1 or month > 12 or day < 1:
+        return False
+    if month == 2 and is_leap_year(year):
+        return day <= 29
+    return day <= DAYS_IN_MONTH[month - 1]
+
+def validate_date(date_str):
+    """Validate date format dd/mm/yyyy with any separator, and that the date exists"""
+    match = DATE_PATTERN.fullmatch(date_str)
+    if match is None:
+        return False
+    day, month, year = match.groups()
+    return check_calendar(int(day), int(month), int(year))
+
+def validate_home_address(address):
+    """Check if address contains only valid characters and is more than 5 characters"""
+    # Letters, numbers, spaces, hyphens, commas, dots and slashes (\w also allows _), with at least one letter
+    return (len(address) > 5 and ADDRESS_PATTERN.fullmatch(address) is not None and '_' not in address
+            and LETTER_PATTERN.search(address) is not None)
+
+def phone_pattern(country=None, min_digits=7, max_digits=15):
+    """Return the compiled phone pattern for a country (or for the given digit range)"""
+    if country is not None:
+        pattern = PHONE_PATTERNS.get(country.strip().lower())
+        if pattern is not None:
+            return pattern
+    if (min_digits, max_digits) == (7, 15):
+        return DEFAULT_PHONE_PATTERN
+    return re.compile(r'\d{' + str(min_digits) + ',' + str(max_digits) + '}')
+
+def validate_phone(phone, min_digits=7, max_digits=15, country=None):
+    """Check if phone number is valid based on country standards"""
+    # Remove spaces and dashes
+    phone_clean = phone.replace(' ', '').replace('-', '')
+    if country is None and min_digits == 7 and max_digits == 15:
+        return DEFAULT_PHONE_PATTERN.fullmatch(phone_clean) is not None
+    return phone_pattern(country, min_digits, max_digits).fullmatch(phone_clean) is not None
+
+def validate_password(password):
+    """Check if password has minimum 8 characters, contains numbers and alphabets"""
+    return (len(password) >= 8 and DIGIT_PATTERN.search(password) is not None
+            and LETTER_PATTERN.search(password) is not None)
+
+# Batch versions: validate a whole column of values in one call, returning one bool per value. Each value
+# goes through one compiled pattern or string method called from C (map), not a Python-level call per value
+
+# Whole-value versions of the checks above, for the batch validators
+ADDRESS_CHECK = re.compile(r'(?=[\W\d_]*[^\W\d_])(?!.*_)[\w ,\-./]{6,}', re.DOTALL)
+PASSWORD_CHECK = re.compile(r'(?=\D*\d)(?=[\W\d_]*[^\W\d_]).{8,}', re.DOTALL)
+# Day, month and year without leading zeros, so they can be looked up as text in the sets below
+DATE_CHECK = re.compile(r'0*([0-9]{1,2})[.,\-/\s]0*([0-9]{1,2})[.,\-/\s]0*([0-9]{4})')
+CALENDAR_YEARS = set(str(year) for year in range(1900, 2101))
+LEAP_YEARS = set(year for year in CALENDAR_YEARS if is_leap_year(int(year)))
+# (day, month) of every day of a leap year
+DAYS_OF_YEAR = set((str(day), str(month)) for month in range(1, 13)
+                   for day in range(1, (29 if month == 2 else DAYS_IN_MONTH[month - 1]) + 1))
+
+def validate_dates(dates):
+    """Validate a list of dates"""
+    if not "".join(dates).isascii():
+        # \d in validate_date also takes the digits of other scripts
+        return [validate_date(date_str) for date_str in dates]
+    return [parts is not None and parts[3] in CALENDAR_YEARS and (parts[1], parts[2]) in DAYS_OF_YEAR
+            and (parts[2] != '2' or parts[1] != '29' or parts[3] in LEAP_YEARS)
+            for parts in map(DATE_CHECK.fullmatch, dates)]
+
+def validate_home_addresses(addresses):
+    """Validate a list of home addresses"""
+    return list(map(bool, map(ADDRESS_CHECK.fullmatch, addresses)))
+
+def validate_phones(phones, countries=None):
+    """Validate a list of phone numbers, each against the rules of its country when countries is given"""
+    # Spaces and dashes go in one pass over the joined batch; a valid number is then only digits (as \d)
+    cleaned = "\n".join(phones).replace(' ', '').replace('-', '').split("\n")
+    if len(cleaned) != len(phones):
+        # A value held a line break (or the batch is empty)
+        cleaned = [phone.replace(' ', '').replace('-', '') for phone in phones]
+    digits_only = map(str.isdecimal, cleaned)
+    if countries is None:
+        return [only and 7 <= length <= 15 for only, length in zip(digits_only, map(len, cleaned))]
+    # Each country's digit range is looked up once per batch
+    ranges = dict((country, PHONE_DIGITS.get(country.strip().lower(), (7, 15))) for country in set(countries))
+    return [only and ranges[country][0] <= length <= ranges[country][1]
+            for only, length, country in zip(digits_only, map(len, cleaned), countries)]
+
+def validate_passwords(passwords):
+    """Validate a list of passwords"""
+    return list(map(bool, map(PASSWORD_CHECK.match, passwords)))
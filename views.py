@@ -0,0 +1,174 @@
+"""Rendered account screens, cached until the account changes
+
+show_account_info and check_loans draw the same text again and again
+while nothing about the account has changed. The text is kept here per
+account (the loan screen per loan type) and dropped when the event bus
+reports a change to that account: any balance change drops the account
+information screen, and a loan change drops only the block of its loan
+type. A screen is then put together from the cached pieces and written
+in one call.
+
+Other processes (the nightly loan batch) change accounts without any
+event here, so a screen is only served from the cache after
+reload_accounts has checked the account against the database; a
+'reload' event drops every screen of the account.
+"""
+import sys
+from data_storage import accounts, reload_accounts
+from events import bus
+from money import format_amount
+from services import LOAN_TYPES
+import reporting
+
+MAX_CACHED_ACCOUNTS = 10000   # accounts with cached screens; the cache is emptied when it fills up
+
+# acc_address -> text of the account information screen
+info_views = {}
+# acc_address -> {loan_type: text of that loan type's block of the loan screen}
+loan_views = {}
+# acc_address -> the whole loan screen, put together from the blocks
+loan_screens = {}
+
+
+def forget(acc_address):
+    """Drop every cached screen of an account"""
+    info_views.pop(acc_address, None)
+    loan_views.pop(acc_address, None)
+    loan_screens.pop(acc_address, None)
+
+
+def on_change(event):
+    """Event bus handler: drop the cached screens a change makes out of date"""
+    fields = event.fields
+    if event.op == 'settle':
+        for acc_address in fields['balances']:
+            info_views.pop(acc_address, None)
+        return
+    if event.op in ('create', 'reload'):
+        forget(event.acc_address)
+        return
+    if event.op == 'transfer':
+        info_views.pop(fields['to'], None)
+    # Every other change can move the balance or the active loan count
+    info_views.pop(event.acc_address, None)
+    loan_type = fields.get('loan_type')
+    if loan_type is not None:
+        loan_screens.pop(event.acc_address, None)
+        blocks = loan_views.get(event.acc_address)
+        if blocks is not None:
+            blocks.pop(loan_type, None)
+
+
+subscription = bus.subscribe(on_change, ops=('create', 'deposit', 'withdraw', 'transfer', 'settle', 'apply_loan',
+                                             'repay_loan', 'loan_batch', 'reload'))
+
+
+def make_room():
+    """Keep the cache from growing without limit in a long-running process"""
+    if len(info_views) >= MAX_CACHED_ACCOUNTS:
+        info_views.clear()
+    if len(loan_views) >= MAX_CACHED_ACCOUNTS:
+        loan_views.clear()
+        loan_screens.clear()
+
+
+def render_account_info(acc_address):
+    """Text of the account information screen"""
+    account = accounts[acc_address]
+    summary = reporting.account_summary(acc_address)
+    lines = [
+        "\n" + "="*50,
+        "ACCOUNT INFORMATION",
+        "="*50,
+        "Name: " + account['name'],
+        "Branch ID: " + account['branch_id'],
+        "Account Address: " + acc_address,
+        "Balance: $" + format_amount(summary['balance']),
+        "Active Loans: " + str(summary['active_loans']),
+        "="*50
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def account_info_view(acc_address):
+    """The account information screen, from the cache when the account has not changed"""
+    reload_accounts([acc_address])
+    text = info_views.get(acc_address)
+    if text is None:
+        make_room()
+        text = info_views[acc_address] = render_account_info(acc_address)
+    return text
+
+
+def render_loan(lines, i, loan):
+    """Add the lines of one loan to lines"""
+    lines.append("\n  Loan #" + str(i) + ":")
+    lines.append("    Principal Amount: $" + format_amount(loan['principal']))
+    lines.append("    Interest Rate: " + str(int(loan['interest_rate'] * 100)) + "%")
+    lines.append("    Total Payable: $" + format_amount(loan['total_payable']))
+    lines.append("    Amount Paid: $" + format_amount(loan['paid_amount']))
+    lines.append("    Amount Remaining: $" + format_amount(loan['remaining_amount']))
+    lines.append("    Payment Plan: " + loan['payment_plan'])
+    lines.append("    Suggested Installment: $" + format_amount(loan['suggested_installment']))
+    lines.append("    Installments Paid: " + str(loan['installments_paid']) + "/" + str(loan['total_installments']))
+    lines.append("    Start Date: " + loan['start_date'])
+
+    if loan['last_payment_date']:
+        lines.append("    Last Payment: " + loan['last_payment_date'])
+    else:
+        lines.append("    Last Payment: No payments yet")
+
+    # Filled in by the nightly loan batch
+    if loan.get('next_due_date'):
+        lines.append("    Next Due Date: " + loan['next_due_date'])
+    if loan.get('penalty_amount'):
+        lines.append("    Late Fees and Interest: $" + format_amount(loan['penalty_amount']))
+
+    if loan['remaining_amount'] <= 0:
+        lines.append("    Status: FULLY PAID")
+    else:
+        completion = (loan['paid_amount'] / loan['total_payable']) * 100
+        lines.append("    Completion: " + str(round(completion, 1)) + "%")
+
+
+def render_loan_type(loan_type_name, loan_list):
+    """Text of one loan type's block of the loan screen"""
+    lines = ["\n" + loan_type_name + ":"]
+    if not loan_list:
+        lines.append("  No loan pending")
+    else:
+        for i, loan in enumerate(loan_list, start=1):
+            render_loan(lines, i, loan)
+    return "\n".join(lines) + "\n"
+
+
+def loans_view(acc_address):
+    """The loan screen, re-rendering only the loan types that changed since it was last drawn"""
+    reload_accounts([acc_address])
+    text = loan_screens.get(acc_address)
+    if text is not None:
+        return text
+    account = accounts[acc_address]
+    loans = account.get('loans', {})
+    blocks = loan_views.get(acc_address)
+    if blocks is None:
+        make_room()
+        blocks = loan_views[acc_address] = {}
+
+    parts = ["\n" + "="*50 + "\nLOAN STATUS\n" + "="*50 + "\nAccount Holder: " + account['name'] +
+             "\nAccount Address: " + acc_address + "\n" + "="*50 + "\n"]
+    for loan_type_name in LOAN_TYPES.values():
+        block = blocks.get(loan_type_name)
+        if block is None:
+            block = blocks[loan_type_name] = render_loan_type(loan_type_name, loans.get(loan_type_name))
+        parts.append(block)
+    parts.append("\n" + "="*50 + "\n")
+    text = loan_screens[acc_address] = "".join(parts)
+    return text
+
+
+def write_screen(text, out=None):
+    """Write a whole screen in one call"""
+    out = out or sys.stdout
+    out.write(text)
+    out.flush()
@@ -0,0 +1,356 @@
+"""Seeded synthetic workloads and a harness that replays them and records the results
+
+A workload is a JSON lines file: a header line with the seed and settings,
+then one operation per line:
+    {"op": "deposit", "user": 17, "amount": 25000}
+with amounts in cents. Users are numbered in the order they sign up; the harness learns each
+user's account address and special code from their signup, so a workload
+does not depend on which addresses a run hands out. The first `users`
+operations sign up the starting population (the setup phase), the rest
+follow MIX. Busy users are picked more often than quiet ones, and the
+generator keeps a rough copy of every balance and loan so withdrawals and
+repayments are mostly ones that can succeed, and loan applications ones
+the credit score approves. The same seed always gives
+the same workload.
+
+The harness replays a workload against a fresh store, through services
+or (with --shards) a sharding.ShardedBank, and writes a JSON results file
+with the throughput, latency percentiles per operation, failures and the
+peak resident memory. With --compare it prints the change against an
+earlier results file.
+
+Usage: python workload.py generate <workload_path> [ops] [users] [seed]
+       python workload.py run <workload_path> <results_path> [--shards N] [--compare old_results_path]
+"""
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import money
+
+# Share of each operation after the setup phase
+MIX = {
+    'signup': 0.03,
+    'login': 0.12,
+    'deposit': 0.30,
+    'withdraw': 0.22,
+    'balance': 0.15,
+    'apply_loan': 0.05,
+    'repay_loan': 0.13
+}
+WRONG_PASSWORD_RATE = 0.02   # logins with a mistyped password
+SKEW = 2.0                   # higher picks the busiest users more often
+PASSWORD = 'Passw0rd'
+# As in services, copied so that generating a workload opens no database
+LOAN_TYPES = ('Home Loan', 'Car Loan', 'Education Loan', 'Personal Loan', 'Gold Loan')
+PLANS = ('Weekly', 'Monthly', 'Quarterly', 'Half Yearly', 'Yearly')
+INTEREST_RATE = 0.05
+# Kept within scoring.py's rules: owing at most DEBT_RATIO times the balance, and at most the smallest limit per type
+DEBT_RATIO = 5
+LOAN_TYPE_LIMIT = 100000 * money.CENTS_PER_DOLLAR
+REGRESSION_THRESHOLD = 0.10  # changes larger than 10% are flagged by --compare
+
+
+def signup(rng, user):
+    """Details of a new user that pass every validation rule"""
+    return {
+        'op': 'signup',
+        'user': user,
+        'name': 'User' + str(user),
+        'dob': str(rng.randint(1, 28)).zfill(2) + '/' + str(rng.randint(1, 12)).zfill(2) + '/' +
+               str(rng.randint(1950, 2005)),
+        'home_address': str(rng.randint(1, 999)) + ' Market Street',
+        'country': 'India',
+        'phone_no': '9' + str(rng.randint(0, 999999999)).zfill(9),
+        'gender': rng.choice(('Male', 'Female'))
+    }
+
+
+def amount(rng, typical):
+    """A money amount in cents around typical dollars, most small and a few large"""
+    return round(rng.lognormvariate(0, 0.8) * typical * money.CENTS_PER_DOLLAR)
+
+
+def generate(ops=100000, users=1000, seed=42, mix=MIX):
+    """Build a workload: a header and a list of operations"""
+    rng = random.Random(seed)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    operations = [signup(rng, user) for user in range(users)]
+    balances = [0] * users
+    # (user, loan_type) -> amount the generator expects still to be owed, and the keys in a list to pick from
+    loans = {}
+    loan_keys = []
+    count = users
+
+    for i in range(ops):
+        op = rng.choices(names, weights)[0]
+        user = int(count * rng.random() ** SKEW)
+        if op == 'signup':
+            operations.append(signup(rng, count))
+            balances.append(0)
+            count += 1
+        elif op == 'login':
+            operations.append({'op': 'login', 'user': user, 'wrong_password': rng.random() < WRONG_PASSWORD_RATE})
+        elif op == 'withdraw' and balances[user] >= money.CENTS_PER_DOLLAR:
+            value = min(amount(rng, 100), balances[user])
+            balances[user] -= value
+            operations.append({'op': 'withdraw', 'user': user, 'amount': value})
+        elif op == 'balance':
+            operations.append({'op': 'balance', 'user': user})
+        elif op == 'apply_loan':
+            loan_type = rng.choice(LOAN_TYPES)
+            value = amount(rng, 5000)
+            due = value + money.apply_rate(value, INTEREST_RATE)
+            if loans.get((user, loan_type), 0) + due > LOAN_TYPE_LIMIT:
+                # Over what the credit score lets one account owe on a loan type: save the money instead
+                balances[user] += value
+                operations.append({'op': 'deposit', 'user': user, 'amount': value})
+                continue
+            owed = sum(loans.get((user, name), 0) for name in LOAN_TYPES) + due
+            if owed > balances[user] * DEBT_RATIO:
+                # Top the balance up first, so the credit score approves the loan
+                top_up = -(-owed // DEBT_RATIO) - balances[user]
+                operations.append({'op': 'deposit', 'user': user, 'amount': top_up})
+                balances[user] += top_up
+            if (user, loan_type) not in loans:
+                loan_keys.append((user, loan_type))
+            loans[(user, loan_type)] = loans.get((user, loan_type), 0) + due
+            operations.append({'op': 'apply_loan', 'user': user, 'amount': value, 'loan_type': loan_type,
+                               'plan': rng.choice(PLANS)})
+        elif op == 'repay_loan' and loan_keys:
+            position = rng.randrange(len(loan_keys))
+            user, loan_type = loan_keys[position]
+            value = min(amount(rng, 300), loans[(user, loan_type)])
+            if balances[user] < value:
+                # Top the balance up first, as a customer would
+                operations.append({'op': 'deposit', 'user': user, 'amount': value})
+                balances[user] += value
+            balances[user] -= value
+            loans[(user, loan_type)] -= value
+            if loans[(user, loan_type)] <= 0:
+                del loans[(user, loan_type)]
+                loan_keys[position] = loan_keys[-1]
+                loan_keys.pop()
+            operations.append({'op': 'repay_loan', 'user': user, 'loan_type': loan_type, 'amount': value})
+        else:
+            # Deposits, and withdrawals or repayments with nothing to take them from
+            value = amount(rng, 200)
+            balances[user] += value
+            operations.append({'op': 'deposit', 'user': user, 'amount': value})
+
+    header = {'seed': seed, 'ops': ops, 'users': users, 'mix': mix, 'setup': users, 'amounts': 'cents'}
+    return header, operations
+
+
+def write_workload(path, header, operations):
+    """Save a workload as JSON lines"""
+    with open(path, 'w') as f:
+        f.write(json.dumps(header) + '\n')
+        for operation in operations:
+            f.write(json.dumps(operation) + '\n')
+
+
+def read_workload(path):
+    """Load a workload saved by write_workload (amounts of workloads from before cents become cents)"""
+    with open(path) as f:
+        header = json.loads(f.readline())
+        operations = [json.loads(line) for line in f if line.strip()]
+    if header.get('amounts') != 'cents':
+        for operation in operations:
+            if 'amount' in operation:
+                operation['amount'] = money.to_cents(operation['amount'])
+        header['amounts'] = 'cents'
+    return header, operations
+
+
+def run_operation(bank, operation, users):
+    """Run one workload operation; returns (success, result)"""
+    op = operation['op']
+    if op == 'signup':
+        success, result = bank.create_account(operation['name'], operation['dob'], operation['home_address'],
+                                              operation['country'], operation['phone_no'], operation['gender'],
+                                              PASSWORD)
+        if success:
+            users[operation['user']] = result
+        return success, result
+
+    if operation['user'] not in users:
+        return False, "User never signed up!"
+    acc_address, special_code = users[operation['user']]
+    if op == 'login':
+        password = PASSWORD + 'x' if operation['wrong_password'] else PASSWORD
+        return bank.login('User' + str(operation['user']), special_code, acc_address, password)
+    elif op == 'deposit':
+        return bank.deposit(acc_address, operation['amount'])
+    elif op == 'withdraw':
+        return bank.withdraw(acc_address, operation['amount'])
+    elif op == 'balance':
+        return bank.get_balance(acc_address)
+    elif op == 'apply_loan':
+        return bank.apply_loan(acc_address, operation['amount'], operation['loan_type'], operation['plan'],
+                               special_code, PASSWORD)
+    elif op == 'repay_loan':
+        return bank.repay_loan(acc_address, operation['loan_type'], 1, operation['amount'])
+    return False, "Unknown operation: " + op
+
+
+def replay(bank, header, operations):
+    """Run a workload against bank and return the results dictionary"""
+    from metrics import PERCENTILES, Histogram
+
+    users = {}
+    setup = header.get('setup', 0)
+    setup_start = time.perf_counter()
+    for operation in operations[:setup]:
+        run_operation(bank, operation, users)
+    setup_elapsed = time.perf_counter() - setup_start
+
+    latencies = {}
+    failures = {}
+    start = time.perf_counter()
+    for operation in operations[setup:]:
+        op = operation['op']
+        op_start = time.perf_counter_ns()
+        success, result = run_operation(bank, operation, users)
+        elapsed = time.perf_counter_ns() - op_start
+        if op not in latencies:
+            latencies[op] = Histogram()
+            failures[op] = 0
+        latencies[op].record(elapsed // 1000)
+        if not success:
+            failures[op] += 1
+    elapsed = time.perf_counter() - start
+
+    measured = len(operations) - setup
+    results = {
+        'seed': header.get('seed'),
+        'ops': measured,
+        'setup_ops': setup,
+        'setup_seconds': round(setup_elapsed, 3),
+        'seconds': round(elapsed, 3),
+        'ops_per_sec': round(measured / elapsed, 1) if elapsed else None,
+        'operations': {}
+    }
+    for op in sorted(latencies):
+        histogram = latencies[op]
+        entry = {
+            'count': histogram.count,
+            'failures': failures[op],
+            'mean_us': round(histogram.mean(), 1),
+            'max_us': histogram.max
+        }
+        for fraction in PERCENTILES:
+            entry['p' + str(fraction * 100).rstrip('0').rstrip('.') + '_us'] = histogram.percentile(fraction)
+        results['operations'][op] = entry
+    return results
+
+
+def peak_rss_kb(children=False):
+    """Peak resident memory in KB of this process (or of its finished child processes)"""
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # Linux reports KB, macOS bytes
+    return usage.ru_maxrss // 1024 if sys.platform == 'darwin' else usage.ru_maxrss
+
+
+def run_workload(workload_path, results_path, shards=0, directory=None):
+    """Replay a workload file against a fresh store and write the results file; returns the results
+
+    The store lives in directory (a new temporary one by default). Without
+    shards the services module is used, so BANK_DB and BANK_JOURNAL must
+    already point there before this is called for the first time.
+    """
+    header, operations = read_workload(workload_path)
+    if shards:
+        from sharding import ShardedBank
+        bank = ShardedBank(shards, directory or tempfile.mkdtemp())
+    else:
+        import journal
+        import services
+        journal.open_journal()
+        bank = services
+    try:
+        results = replay(bank, header, operations)
+    finally:
+        if shards:
+            bank.close()
+        else:
+            journal.close_journal()
+
+    results['workload'] = workload_path
+    results['shards'] = shards
+    results['peak_rss_kb'] = peak_rss_kb()
+    if shards:
+        results['peak_shard_rss_kb'] = peak_rss_kb(children=True)
+    results['hash_iterations'] = int(os.environ.get('BANK_HASH_ITERATIONS', '0')) or None
+    results['python'] = sys.version.split()[0]
+    results['finished'] = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+    with open(results_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    return results
+
+
+def change(old, new):
+    """Relative change from old to new, or None when there is nothing to compare"""
+    if not old or new is None:
+        return None
+    return (new - old) / old
+
+
+def compare(old, new, threshold=REGRESSION_THRESHOLD):
+    """Lines describing how new results differ from old ones; regressions are marked"""
+    lines = []
+    rows = [('total', 'ops_per_sec', old.get('ops_per_sec'), new.get('ops_per_sec'), True)]
+    for op in sorted(new['operations']):
+        before = old['operations'].get(op, {})
+        after = new['operations'][op]
+        rows.append((op, 'p50_us', before.get('p50_us'), after['p50_us'], False))
+        rows.append((op, 'p99_us', before.get('p99_us'), after['p99_us'], False))
+    rows.append(('total', 'peak_rss_kb', old.get('peak_rss_kb'), new.get('peak_rss_kb'), False))
+    for name, field, before, after, higher_is_better in rows:
+        difference = change(before, after)
+        if difference is None:
+            lines.append(name + " " + field + ": " + str(after) + " (no earlier result)")
+            continue
+        worse = -difference if higher_is_better else difference
+        mark = "  REGRESSION" if worse > threshold else ""
+        lines.append(name + " " + field + ": " + str(before) + " -> " + str(after) + " (" +
+                     ("+" if difference >= 0 else "") + str(round(difference * 100, 1)) + "%)" + mark)
+    return lines
+
+
+def print_results(results):
+    """Print a results dictionary as a short table"""
+    print("Replayed " + str(results['ops']) + " operations in " + str(results['seconds']) + "s (" +
+          str(results['ops_per_sec']) + " ops/sec), peak RSS " + str(results['peak_rss_kb'] // 1024) + " MB")
+    for op, entry in results['operations'].items():
+        print("  " + op + ": " + str(entry['count']) + " ops, " + str(entry['failures']) + " failed, p50 " +
+              str(entry['p50_us']) + "us, p99 " + str(entry['p99_us']) + "us, max " + str(entry['max_us']) + "us")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 3 and sys.argv[1] == 'generate':
+        numbers = [int(arg) for arg in sys.argv[3:]]
+        header, operations = generate(*numbers)
+        write_workload(sys.argv[2], header, operations)
+        print("Wrote " + str(len(operations)) + " operations (" + str(header['setup']) + " setup) to " + sys.argv[2])
+    elif len(sys.argv) >= 4 and sys.argv[1] == 'run':
+        shards = int(sys.argv[sys.argv.index('--shards') + 1]) if '--shards' in sys.argv else 0
+        directory = tempfile.mkdtemp()
+        # A fresh store for every run, so runs of the same workload can be compared
+        os.environ.setdefault('BANK_DB', os.path.join(directory, 'bank.db'))
+        os.environ.setdefault('BANK_JOURNAL', os.path.join(directory, 'bank_journal.log'))
+        results = run_workload(sys.argv[2], sys.argv[3], shards, directory)
+        print_results(results)
+        if '--compare' in sys.argv:
+            with open(sys.argv[sys.argv.index('--compare') + 1]) as f:
+                old = json.load(f)
+            for line in compare(old, results):
+                print(line)
+    else:
+        print("Usage: python workload.py generate <workload_path> [ops] [users] [seed]")
+        print("       python workload.py run <workload_path> <results_path> [--shards N] [--compare old_results_path]")
+        sys.exit(1)